@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Conversión de una carpeta de fotos: N requests a /api/convert (de a uno o con
+--clients en paralelo, como hace la vista cola) contra un solo /api/batch.
+
+Levanta uvicorn con el rate limit desactivado. Cada ronda usa otra calidad
+para que ninguna pasada salga del caché de resultados.
+
+Uso:
+  python bench/bench_batch.py [--files 40] [--mp 3] [--clients 2] [--rounds 3]
+Stdlib + Pillow.
+"""
+from __future__ import annotations
+import argparse
+import http.client
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+import zipfile
+from pathlib import Path
+
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent.parent
+PORT = 8767
+
+
+def wait_up(timeout: float = 30):
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{PORT}/healthz", timeout=1).read()
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError("el servidor no levantó")
+
+
+def multipart(fields: dict, files: list) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for k, v in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode())
+    for field, name, data in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{name}"\r\n'
+                     f'Content-Type: image/jpeg\r\n\r\n'.encode() + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def post(conn: http.client.HTTPConnection, path: str, fields: dict, files: list) -> bytes:
+    body, ctype = multipart(fields, files)
+    conn.request("POST", path, body=body, headers={"Content-Type": ctype})
+    r = conn.getresponse()
+    data = r.read()
+    if r.status != 200:
+        raise RuntimeError(f"{path}: {r.status} {data[:200]!r}")
+    return data
+
+
+def make_photos(n: int, mp: float) -> list:
+    w = int((mp * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    out = []
+    for i in range(n):
+        # cada foto distinta: con fotos repetidas el caché esconde el costo real
+        b = io.BytesIO()
+        Image.effect_noise((w, h), 20 + i % 40).convert("RGB").save(b, format="JPEG", quality=88)
+        out.append((f"foto-{i:03d}.jpg", b.getvalue()))
+    return out
+
+
+def one_by_one(photos: list, quality: int, clients: int) -> float:
+    queue = list(photos)
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=120)
+        while True:
+            with lock:
+                if not queue:
+                    break
+                name, data = queue.pop()
+            post(conn, "/api/convert", {"target": "webp", "quality": quality}, [("file", name, data)])
+        conn.close()
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0
+
+
+def batch(photos: list, quality: int) -> float:
+    conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=300)
+    t0 = time.perf_counter()
+    data = post(conn, "/api/batch", {"target": "webp", "quality": quality},
+                [("files", name, d) for name, d in photos])
+    dt = time.perf_counter() - t0
+    conn.close()
+    n = len(zipfile.ZipFile(io.BytesIO(data)).namelist())
+    if n != len(photos):
+        raise RuntimeError(f"el ZIP tiene {n} entradas, se esperaban {len(photos)}")
+    return dt
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=40)
+    ap.add_argument("--mp", type=float, default=3.0)
+    ap.add_argument("--clients", type=int, default=2)
+    ap.add_argument("--rounds", type=int, default=3)
+    args = ap.parse_args()
+
+    photos = make_photos(args.files, args.mp)
+    mb = sum(len(d) for _, d in photos) / 1e6
+    env = dict(os.environ, ZC_RATE_HEAVY_PER_MIN="0", ZC_RATE_CHEAP_PER_MIN="0", ZC_BATCH_MAX_MB="1024")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--log-level", "warning"],
+        cwd=str(ROOT), env=env,
+    )
+    try:
+        wait_up()
+        print(f"{args.files} fotos de {args.mp} MP ({mb:.1f} MB) -> webp")
+        for r in range(args.rounds):
+            q = 70 + 2 * r   # calidad distinta por ronda y modo: nunca hay hit de caché
+            single = one_by_one(photos, q, args.clients)
+            multi = batch(photos, q + 1)
+            print(f"ronda {r + 1}: /api/convert x{args.files} ({args.clients} clientes) {single:6.2f} s"
+                  f"   /api/batch {multi:6.2f} s   ({single / multi:.1f}x)")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
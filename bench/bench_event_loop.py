@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Latencia de GET / mientras /api/convert satura el pool de conversiones.
+
+Levanta uvicorn en un subproceso (o usa --url contra uno ya corriendo), mide
+p50/p99 de GET / en reposo y luego con N clientes subiendo imágenes grandes
+en loop. Sin scheduler, cada conversión bloquea el event loop y el p99 de /
+pasa a ser el tiempo de una conversión completa.
+
+Uso:
+  python bench/bench_event_loop.py [--clients 8] [--seconds 15] [--url http://127.0.0.1:8000]
+Solo stdlib + Pillow (para generar la imagen de prueba).
+"""
+from __future__ import annotations
+import argparse
+import io
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def make_payload(mp: float = 12.0) -> bytes:
+    w = int((mp * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    im = Image.effect_noise((w, h), 64).convert("RGB")
+    out = io.BytesIO()
+    im.save(out, format="WEBP", quality=90)
+    return out.getvalue()
+
+
+def multipart(fields: dict, filename: str, content: bytes) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for k, v in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n".encode() + content + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def percentile(xs, p):
+    xs = sorted(xs)
+    if not xs:
+        return float("nan")
+    k = min(len(xs) - 1, int(round(p / 100.0 * (len(xs) - 1))))
+    return xs[k]
+
+
+def probe_latency(url: str, seconds: float) -> list[float]:
+    lat = []
+    end = time.time() + seconds
+    while time.time() < end:
+        t0 = time.perf_counter()
+        try:
+            urllib.request.urlopen(url + "/", timeout=120).read()
+        except urllib.error.URLError:
+            continue
+        lat.append((time.perf_counter() - t0) * 1000)
+        time.sleep(0.05)
+    return lat
+
+
+def wait_up(url: str, timeout: float = 30):
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            urllib.request.urlopen(url + "/healthz", timeout=1).read()
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError("el servidor no levantó")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="")
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--seconds", type=float, default=15)
+    ap.add_argument("--mp", type=float, default=12.0, help="megapíxeles de la imagen de prueba")
+    args = ap.parse_args()
+
+    proc = None
+    url = args.url.rstrip("/")
+    if not url:
+        url = "http://127.0.0.1:8765"
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", "8765", "--log-level", "warning"],
+            cwd=str(ROOT),
+        )
+    try:
+        wait_up(url)
+        payload = make_payload(args.mp)
+        body, ctype = multipart({"target": "jpg", "quality": "85"}, "bench.webp", payload)
+
+        idle = probe_latency(url, min(5.0, args.seconds))
+
+        stop = threading.Event()
+        codes: dict[int, int] = {}
+
+        def hammer():
+            while not stop.is_set():
+                req = urllib.request.Request(url + "/api/convert", data=body,
+                                             headers={"Content-Type": ctype})
+                try:
+                    with urllib.request.urlopen(req, timeout=300) as r:
+                        r.read()
+                        code = r.status
+                except urllib.error.HTTPError as e:
+                    code = e.code
+                    if code == 503:
+                        time.sleep(float(e.headers.get("Retry-After") or 1))
+                except urllib.error.URLError:
+                    code = 0
+                codes[code] = codes.get(code, 0) + 1
+
+        threads = [threading.Thread(target=hammer, daemon=True) for _ in range(args.clients)]
+        for t in threads:
+            t.start()
+        time.sleep(1.0)
+        loaded = probe_latency(url, args.seconds)
+        stop.set()
+
+        print(f"payload: {len(payload)/1e6:.1f} MB WEBP ({args.mp:g} MP), clientes: {args.clients}")
+        for label, xs in (("idle", idle), ("saturado", loaded)):
+            print(f"GET /  {label:9s} n={len(xs):4d}  p50={percentile(xs, 50):8.1f} ms  "
+                  f"p99={percentile(xs, 99):8.1f} ms  max={max(xs or [0]):8.1f} ms")
+        print("respuestas /api/convert:", dict(sorted(codes.items())))
+        if idle and loaded:
+            print(f"media idle {statistics.mean(idle):.1f} ms vs saturado {statistics.mean(loaded):.1f} ms")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("PYTHONUNBUFFERED", "1")
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+max_bytes: búsqueda de calidad con un solo decode (binaria con --threads 1,
+k-aria en paralelo con más) contra lo que hacía el usuario a mano: reintentar
+convert_image bajando la calidad de a 10, decodificando cada vez.
+
+Reporta tiempo, encodes y calidad elegida por presupuesto. En una máquina de
+un solo core los hilos no ganan tiempo (sí rondas).
+
+Uso:
+  python bench/bench_fit.py [--mp 12] [--budgets 200,500,1000] [--threads 1,3,4]
+Stdlib + Pillow.
+"""
+from __future__ import annotations
+import argparse
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageFilter  # noqa: E402
+from engines.image_engine import FIT_MIN_QUALITY, convert_image, convert_image_fit  # noqa: E402
+
+
+def make_photo(mp: float) -> bytes:
+    w = int((mp * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    bands = [Image.effect_noise((w, h), s).filter(ImageFilter.GaussianBlur(1)) for s in (20, 40, 60)]
+    b = BytesIO()
+    Image.merge("RGB", bands).save(b, format="JPEG", quality=95)
+    return b.getvalue()
+
+
+def by_hand(src: bytes, max_bytes: int):
+    """Reintentos de a 10 puntos de calidad, cada uno con su decode."""
+    tries = 0
+    for q in range(90, FIT_MIN_QUALITY - 1, -10):
+        tries += 1
+        data, _ = convert_image(src, ".jpg", "jpg", quality=q)
+        if len(data) <= max_bytes:
+            return q, tries
+    return None, tries
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mp", type=float, default=12.0)
+    ap.add_argument("--budgets", default="200,500,1000", help="KB")
+    ap.add_argument("--threads", default="1,3,4")
+    args = ap.parse_args()
+
+    src = make_photo(args.mp)
+    print(f"foto de {args.mp} MP ({len(src) / 1024:.0f} KB) -> jpg")
+    print(f"{'KB máx':>7} {'modo':>12} {'s':>7} {'encodes':>8} {'rondas':>7} {'calidad':>8}")
+    for kb in (int(x) for x in args.budgets.split(",")):
+        t0 = time.perf_counter()
+        q, tries = by_hand(src, kb * 1024)
+        print(f"{kb:7d} {'a mano':>12} {time.perf_counter() - t0:7.2f} {tries:8d} {tries:7d} {str(q):>8}")
+        for n in (int(x) for x in args.threads.split(",")):
+            t0 = time.perf_counter()
+            _, _, fit = convert_image_fit(src, ".jpg", "jpg", kb * 1024, threads=n)
+            dt = time.perf_counter() - t0
+            scaled = f" ({fit.size[0]}x{fit.size[1]})" if fit.scaled else ""
+            print(f"{kb:7d} {f'{n} hilos':>12} {dt:7.2f} {fit.encodes:8d} {fit.rounds:7d} {fit.quality!s:>8}{scaled}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Animaciones de 10 / 100 / 1000 frames: convert_image (de a un frame, ver
+iter_frames en engines/image_engine.py) contra la conversión ingenua que
+decodifica todos los frames a una lista y después llama a save_all.
+
+Cada medición corre en un proceso aparte para que el pico de memoria
+(ru_maxrss) sea solo el de esa conversión; "pico" es lo que crece sobre el
+proceso recién arrancado con la entrada ya leída.
+
+Uso:
+  python bench/bench_frames.py [--frames 10,100,1000] [--size 480x360] [--targets webp,gif,pdf]
+Stdlib + Pillow.
+"""
+from __future__ import annotations
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+
+def make_gif(path: str, n: int, size: tuple) -> None:
+    # una pelota que cruza un fondo con gradiente; se escribe de a tandas para
+    # que armar la entrada de 1000 frames no sea lo que se mide
+    w, h = size
+    bg = Image.merge("RGB", [Image.linear_gradient("L").resize(size)] * 3)
+
+    def frames():
+        for i in range(n):
+            im = bg.copy()
+            x = int((w - 60) * (i % 50) / 49)
+            ImageDraw.Draw(im).ellipse((x, h // 3, x + 60, h // 3 + 60), fill=(220, 40, 40))
+            yield im.quantize(64)
+
+    it = frames()
+    first = next(it)
+    first.save(path, format="GIF", save_all=True, append_images=it, duration=40, loop=0)
+
+
+def rss_mb() -> float:
+    # Linux: KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(mode: str, path: str, target: str) -> None:
+    from engines.image_engine import convert_image, encoder_settings
+    with open(path, "rb") as f:
+        src = f.read()
+    base = rss_mb()
+    t0 = time.perf_counter()
+    if mode == "stream":
+        data, _ = convert_image(src, ".gif", target, 80)
+    else:
+        im = Image.open(BytesIO(src))
+        frames, durations = [], []
+        for i in range(im.n_frames):
+            im.seek(i)
+            frames.append(im.convert("RGB"))
+            durations.append(im.info.get("duration", 100))
+        out = BytesIO()
+        # mismo esfuerzo de encoder que convert_image (perfil por defecto)
+        params = encoder_settings(target)
+        if target == "webp":
+            params["quality"] = 80
+        frames[0].save(out, format=target.upper(), save_all=True, append_images=frames[1:],
+                       duration=durations, **params)
+        data = out.getvalue()
+    dt = time.perf_counter() - t0
+    print(f"{dt:.3f} {rss_mb() - base:.1f} {len(data)}")
+
+
+def measure(mode: str, path: str, target: str) -> tuple:
+    out = subprocess.run([sys.executable, __file__, "--child", mode, path, target],
+                         capture_output=True, text=True, check=True).stdout.splitlines()[-1].split()
+    return float(out[0]), float(out[1]), int(out[2])
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(*sys.argv[2:5])
+        return
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", default="10,100,1000")
+    ap.add_argument("--size", default="480x360")
+    ap.add_argument("--targets", default="webp,gif,pdf")
+    args = ap.parse_args()
+    size = tuple(int(v) for v in args.size.split("x"))
+    frame_mb = size[0] * size[1] * 4 / 1e6
+
+    print(f"GIF {size[0]}x{size[1]} (un frame RGBA = {frame_mb:.1f} MB)")
+    print(f"{'frames':>6} {'destino':>7} {'modo':>7} {'s':>8} {'pico MB':>8} {'KB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in (int(v) for v in args.frames.split(",")):
+            path = os.path.join(tmp, f"anim-{n}.gif")
+            make_gif(path, n, size)
+            for target in args.targets.split(","):
+                for mode in ("stream", "naive"):
+                    dt, peak, nbytes = measure(mode, path, target)
+                    print(f"{n:6d} {target:>7} {mode:>7} {dt:8.2f} {peak:8.1f} {nbytes / 1024:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
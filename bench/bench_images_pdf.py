@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Varias imágenes -> un PDF: approach viejo (todas decodificadas en una lista +
+Pillow save_all) contra image_engine.images_to_pdf (escritor incremental, JPEG
+embebidos sin decodificar).
+
+Cada caso corre en un proceso aparte para medir el pico de memoria (ru_maxrss).
+Las entradas son fotos JPEG de --mp megapíxeles; con --png-every N, una de cada
+N es PNG (fuerza el camino con decodificación).
+
+Uso:
+  python bench/bench_images_pdf.py [--counts 10,50,200] [--mp 4] [--skip-legacy-over 50]
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CASE = r"""
+import json, os, resource, sys, time
+sys.path.insert(0, {root!r})
+from PIL import Image, ImageOps
+from engines.image_engine import images_to_pdf
+
+mode, out, paths = sys.argv[1], sys.argv[2], sys.argv[3:]
+t0 = time.perf_counter()
+if mode == "legacy":
+    pages = []
+    for p in paths:
+        im = ImageOps.exif_transpose(Image.open(p))
+        if im.mode in ("RGBA", "P"):
+            im = im.convert("RGB")
+        pages.append(im)
+    pages[0].save(out, save_all=True, append_images=pages[1:], format="PDF")
+else:
+    images_to_pdf(paths, out)
+dt = time.perf_counter() - t0
+print(json.dumps({{"secs": dt, "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "bytes": os.path.getsize(out)}}))
+"""
+
+
+def make_inputs(tmp: str, mp: float) -> tuple[str, str]:
+    from PIL import Image
+    w = int((mp * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    im = Image.effect_noise((w, h), 40).convert("RGB")
+    jpg, png = os.path.join(tmp, "photo.jpg"), os.path.join(tmp, "shot.png")
+    im.save(jpg, format="JPEG", quality=90)
+    im.resize((w // 2, h // 2)).save(png, format="PNG")
+    return jpg, png
+
+
+def run(mode: str, out: str, paths: list[str]) -> dict:
+    code = CASE.format(root=str(ROOT))
+    r = subprocess.run([sys.executable, "-c", code, mode, out, *paths], capture_output=True, text=True)
+    if r.returncode != 0:
+        return {"error": (r.stderr.strip().splitlines() or ["?"])[-1]}
+    return json.loads(r.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--counts", default="10,50,200")
+    ap.add_argument("--mp", type=float, default=4.0, help="megapíxeles de cada foto")
+    ap.add_argument("--png-every", type=int, default=0)
+    ap.add_argument("--skip-legacy-over", type=int, default=0, help="cantidad a partir de la cual no correr legacy")
+    args = ap.parse_args()
+
+    print(f"{'imgs':>5} {'modo':>12} {'seg':>8} {'img/s':>8} {'pico MB':>9} {'PDF MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        jpg, png = make_inputs(tmp, args.mp)
+        out = os.path.join(tmp, "out.pdf")
+        for n in (int(x) for x in args.counts.split(",")):
+            paths = [png if args.png_every and i % args.png_every == 0 else jpg for i in range(n)]
+            for mode in ("legacy", "incremental"):
+                if mode == "legacy" and args.skip_legacy_over and n > args.skip_legacy_over:
+                    print(f"{n:5d} {mode:>12} {'(salteado)':>8}")
+                    continue
+                r = run(mode, out, paths)
+                if "error" in r:
+                    print(f"{n:5d} {mode:>12} error: {r['error']}")
+                    continue
+                print(f"{n:5d} {mode:>12} {r['secs']:8.2f} {n / r['secs']:8.1f} "
+                      f"{r['maxrss_mb']:9.0f} {r['bytes'] / 1e6:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Imagen -> PDF: writer PDF de Pillow (decodifica, aplana y re-encodea) contra
+convert_image(target="pdf"), que embebe JPEG como DCTDecode y PNG como
+FlateDecode sin pasar por píxeles.
+
+Reporta tiempo medio y tamaño de salida por caso.
+
+Uso:
+  python bench/bench_pdf_passthrough.py [--mp 12] [--reps 5]
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageDraw, ImageOps  # noqa: E402
+from engines.image_engine import _flatten_to_rgb, convert_image  # noqa: E402
+
+
+def legacy(path: str) -> bytes:
+    im = ImageOps.exif_transpose(Image.open(path))
+    out = BytesIO()
+    _flatten_to_rgb(im, bg=(255, 255, 255)).save(out, format="PDF", optimize=True)
+    return out.getvalue()
+
+
+def make_inputs(tmp: str, mp: float) -> dict:
+    w = int((mp * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    photo = Image.effect_noise((w, h), 40).convert("RGB")
+    # "captura de pantalla": colores planos y texto, donde PNG rinde mucho
+    shot = Image.new("RGB", (w // 2, h // 2), (245, 245, 245))
+    d = ImageDraw.Draw(shot)
+    for y in range(0, shot.height, 24):
+        d.rectangle((0, y, shot.width, y + 10), fill=(40 + y % 200, 90, 160))
+        d.text((8, y + 10), "ZetaConvert " * 20, fill=(0, 0, 0))
+    paths = {
+        "foto.jpg": os.path.join(tmp, "foto.jpg"),
+        "foto.png": os.path.join(tmp, "foto.png"),
+        "captura.png": os.path.join(tmp, "captura.png"),
+    }
+    photo.save(paths["foto.jpg"], format="JPEG", quality=90)
+    photo.resize((w // 2, h // 2)).save(paths["foto.png"], format="PNG")
+    shot.save(paths["captura.png"], format="PNG")
+    return paths
+
+
+def timed(fn, reps: int):
+    best = None
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        best = fn()
+    return (time.perf_counter() - t0) / reps, len(best)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mp", type=float, default=12.0)
+    ap.add_argument("--reps", type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"{'entrada':>12} {'KB in':>8} {'modo':>12} {'ms':>9} {'PDF KB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, path in make_inputs(tmp, args.mp).items():
+            size_in = os.path.getsize(path) / 1024
+            ext = os.path.splitext(path)[1]
+            for mode, fn in (("pillow", lambda: legacy(path)),
+                             ("passthrough", lambda: convert_image(path, ext, "pdf")[0])):
+                dt, size = timed(fn, args.reps)
+                print(f"{name:>12} {size_in:8.0f} {mode:>12} {dt * 1000:9.1f} {size / 1024:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rasterizado PDF -> JPG (ZIP) con pdf_engine.render_pages, en serie y repartido
+entre procesos por chunks de páginas (split_chunks / chunk_size, como el
+scheduler de la app) y armado con ZipStreamWriter. Reporta páginas/segundo
+total y por núcleo usado.
+
+Uso:
+  python bench/bench_pdf_render.py [--sizes 1,10,100,500] [--dpi 144] [--workers 1,2,4]
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fitz  # noqa: E402
+from engines import pdf_engine  # noqa: E402
+from services.zipstream import ZipStreamWriter  # noqa: E402
+
+
+def make_pdf(path: str, n_pages: int):
+    """Páginas A4 con texto y algo de vectorial, parecido a un documento real."""
+    doc = fitz.open()
+    for i in range(n_pages):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 90), f"Página {i + 1}", fontsize=28)
+        for line in range(40):
+            page.insert_text((72, 130 + line * 16), "Lorem ipsum dolor sit amet, consectetur " * 2, fontsize=9)
+        page.draw_rect(fitz.Rect(400, 60, 540, 120), color=(0.9, 0.1, 0.2), fill=(1, 0.9, 0.9))
+    doc.save(path)
+
+
+def render_zip(path: str, dpi: int, workers: int) -> bytes:
+    indices = list(range(pdf_engine.page_count(path)))
+    chunks = pdf_engine.split_chunks(indices, pdf_engine.chunk_size(len(indices), workers))
+    w = ZipStreamWriter()
+    parts = []
+    if workers <= 1 or len(chunks) <= 1:
+        for ch in chunks:
+            parts += [w.add(name, data) for _, name, data in pdf_engine.render_pages(path, ch, "jpg", dpi)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            futs = [ex.submit(pdf_engine.render_pages, path, ch, "jpg", dpi) for ch in chunks]
+            for f in as_completed(futs):
+                parts += [w.add(name, data) for _, name, data in f.result()]
+    return b"".join(parts + [w.close()])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1,10,100,500")
+    ap.add_argument("--dpi", type=int, default=144)
+    ap.add_argument("--workers", default=",".join(str(w) for w in sorted({1, 2, os.cpu_count() or 1})))
+    args = ap.parse_args()
+    sizes = [int(x) for x in args.sizes.split(",")]
+    workers = [int(x) for x in args.workers.split(",")]
+
+    print(f"cpu_count={os.cpu_count()} dpi={args.dpi}")
+    print(f"{'páginas':>8} {'workers':>8} {'seg':>8} {'pág/s':>8} {'pág/s/core':>11} {'zip MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            path = os.path.join(tmp, f"doc-{n}.pdf")
+            make_pdf(path, n)
+            for w in workers:
+                t0 = time.perf_counter()
+                data = render_zip(path, args.dpi, w)
+                dt = time.perf_counter() - t0
+                used = max(1, min(w, n, os.cpu_count() or 1))
+                print(f"{n:8d} {w:8d} {dt:8.2f} {n / dt:8.1f} {n / dt / used:11.1f} {len(data) / 1e6:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copias de tamaño completo en convert_image, antes y después del pipeline de
+_prepare (engines/image_engine.py): decode sin copia, resize antes de orientar
+y aplanar, y aplanado con el alfa como máscara en vez de split().
+
+"antes" es el camino anterior reproducido acá (exif_transpose -> resize ->
+aplanado con split()); "después" es el engine tal cual. Por etapa: ms
+(mediana), imágenes que crea Pillow y MB que pide (Image.core.get_stats(),
+con bloques de 1 MB para que allocated_blocks sea ~MB).
+
+Uso:
+  python bench/bench_pipeline.py [--mp 12] [--reps 3]
+Stdlib + Pillow.
+"""
+from __future__ import annotations
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageFilter, ImageOps  # noqa: E402
+from engines import image_engine, stages  # noqa: E402
+from engines.probe import resize_target  # noqa: E402
+
+# bloques de 1 MB y sin caché de bloques: cada imagen nueva pide sus bloques
+Image.core.set_block_size(1 << 20)
+Image.core.set_blocks_max(0)
+
+_allocs: dict = {}
+
+
+@contextmanager
+def counted(name: str):
+    """stages.stage + cuántas imágenes / MB pidió Pillow adentro (incluye las etapas anidadas)."""
+    s0 = Image.core.get_stats()
+    with stages.stage(name):
+        yield
+    s1 = Image.core.get_stats()
+    n, mb = _allocs.get(name, (0, 0))
+    _allocs[name] = (n + s1["new_count"] - s0["new_count"], mb + s1["allocated_blocks"] - s0["allocated_blocks"])
+
+
+# el engine marca sus etapas con el `stage` que importó: lo cambiamos por el que cuenta
+image_engine.stage = counted
+
+
+def make_inputs(tmp: str, mp: float) -> dict:
+    w = int((mp * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    grad = Image.linear_gradient("L").resize((w, h))
+    noise = Image.effect_noise((w, h), 30).filter(ImageFilter.GaussianBlur(1))
+    rgb = Image.merge("RGB", (grad, noise, grad.transpose(Image.FLIP_LEFT_RIGHT)))
+    rgba = rgb.copy()
+    rgba.putalpha(grad)
+    exif = Image.Exif()
+    exif[0x0112] = 6    # foto de celular "parada"
+    paths = {"jpeg o=6": os.path.join(tmp, "foto.jpg"), "png rgba": os.path.join(tmp, "alfa.png"),
+             "png rgb": os.path.join(tmp, "rgb.png")}
+    rgb.save(paths["jpeg o=6"], quality=90, exif=exif.tobytes())
+    rgba.save(paths["png rgba"], compress_level=1)
+    rgb.save(paths["png rgb"], compress_level=1)
+    return paths
+
+
+def old_flatten(im: Image.Image, bg=(255, 255, 255)) -> Image.Image:
+    if im.mode in ("RGBA", "LA"):
+        bg_im = Image.new("RGB", im.size, bg)
+        bg_im.paste(im, mask=im.split()[-1])
+        return bg_im
+    if im.mode == "P" or im.mode.startswith("CMYK"):
+        return im.convert("RGB")
+    return im
+
+
+def before(path: str, target: str, resize):
+    im = Image.open(path)
+    with counted("decode"):
+        image_engine._plan_decode(im, resize)
+        im = ImageOps.exif_transpose(im)
+        im.load()
+    with counted("resize"):
+        size = resize_target(im.size, resize)
+        if size:
+            im = im.resize(size, Image.LANCZOS, reducing_gap=2.0)
+    with counted("encode"):
+        if target in ("jpg", "webp", "pdf"):
+            im = old_flatten(im)
+    if target == "pdf":
+        return image_engine._encode_pdf_pixels(im, im.format in image_engine._LOSSY_FORMATS)
+    return image_engine._encode_image(im, target, 85, True, image_engine.encoder_settings(target))
+
+
+def after(path: str, target: str, resize):
+    if target == "pdf":
+        return image_engine._pdf_image_stream(path, resize)
+    return image_engine.convert_image(path, os.path.splitext(path)[1], target, 85, resize, True)
+
+
+def run(fn, path: str, target: str, resize, reps: int):
+    times: dict = {}
+    for _ in range(reps):
+        _allocs.clear()
+        s0 = Image.core.get_stats()
+        _, timings = stages.collect(fn, path, target, resize)
+        s1 = Image.core.get_stats()
+        for k, v in timings.items():
+            times.setdefault(k, []).append(v * 1000)
+    allocs = dict(_allocs)
+    allocs["total"] = (s1["new_count"] - s0["new_count"], s1["allocated_blocks"] - s0["allocated_blocks"])
+    return {k: (statistics.median(v), *allocs.get(k, (0, 0))) for k, v in times.items()}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mp", type=float, default=12.0)
+    ap.add_argument("--reps", type=int, default=3)
+    args = ap.parse_args()
+
+    cases = [("jpeg o=6", "jpg", 0.5), ("jpeg o=6", "jpg", 1), ("png rgba", "jpg", 1),
+             ("png rgba", "webp", 0.5), ("png rgb", "png", 1), ("png rgba", "pdf", 1)]
+    print(f"{args.mp} MP, mediana de {args.reps}; imágenes / MB que pide Pillow por etapa")
+    print(f"{'entrada':>9} {'destino':>7} {'escala':>6} {'etapa':>7} "
+          f"{'antes ms':>9} {'img':>4} {'MB':>6} {'después ms':>11} {'img':>4} {'MB':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_inputs(tmp, args.mp)
+        for name, target, scale in cases:
+            w = Image.open(paths[name]).width
+            # el ancho pedido es sobre la imagen orientada (la foto o=6 queda parada)
+            shown_w = Image.open(paths[name]).height if name.startswith("jpeg") else w
+            resize = (int(shown_w * scale), 0) if scale != 1 else None
+            old = run(before, paths[name], target, resize, args.reps)
+            new = run(after, paths[name], target, resize, args.reps)
+            for st in ("decode", "resize", "encode", "total"):
+                o, n = old.get(st, (0, 0, 0)), new.get(st, (0, 0, 0))
+                print(f"{name:>9} {target:>7} {scale:6.2f} {st:>7} {o[0]:9.1f} {o[1]:4d} {o[2]:6d} "
+                      f"{n[0]:11.1f} {n[1]:4d} {n[2]:6d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Matriz de perfiles de encoder (fast / balanced / max) por formato destino:
+ms de la etapa encode (mediana) y bytes de salida, sobre una "foto" y una
+"captura de pantalla" sintéticas. Es de donde salen los settings de
+_ENCODER_PROFILES y los defaults por endpoint en main.py.
+
+Uso:
+  python bench/bench_profiles.py [--mp 3] [--reps 5] [--targets jpg,webp,png]
+Stdlib + Pillow.
+"""
+from __future__ import annotations
+import argparse
+import statistics
+import sys
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageDraw, ImageFilter  # noqa: E402
+from engines import stages  # noqa: E402
+from engines.image_engine import PROFILES, convert_image  # noqa: E402
+
+
+def make_inputs(mp: float) -> dict:
+    w = int((mp * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    # "foto": gradiente suave + grano + blur (el ruido puro no se parece a nada real)
+    grad = Image.linear_gradient("L").resize((w, h))
+    noise = Image.effect_noise((w, h), 30)
+    photo = Image.merge("RGB", (grad, noise, grad.transpose(Image.FLIP_LEFT_RIGHT)))
+    photo = photo.filter(ImageFilter.GaussianBlur(2))
+    # "captura": colores planos, cajas y texto
+    shot = Image.new("RGB", (w, h), (245, 245, 245))
+    d = ImageDraw.Draw(shot)
+    for y in range(0, h, 48):
+        d.rectangle((16, y + 8, w - 16, y + 40), fill=(255, 255, 255), outline=(210, 210, 210))
+        d.text((28, y + 18), "ZetaConvert · fila %d · lorem ipsum dolor sit amet" % (y // 48), fill=(40, 40, 40))
+    out = {}
+    for name, im in (("foto", photo), ("captura", shot)):
+        b = BytesIO()
+        im.save(b, format="PNG", compress_level=1)
+        out[name] = b.getvalue()
+    return out
+
+
+def run(src: bytes, target: str, profile: str, reps: int):
+    times, size = [], 0
+    for _ in range(reps):
+        (data, _), timings = stages.collect(convert_image, src, ".png", target, 85, None, True,
+                                            None, profile)
+        times.append(timings.get("encode", 0.0) * 1000)
+        size = len(data)
+    return statistics.median(times), size
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mp", type=float, default=3.0)
+    ap.add_argument("--reps", type=int, default=5)
+    ap.add_argument("--targets", default="jpg,webp,png")
+    args = ap.parse_args()
+
+    inputs = make_inputs(args.mp)
+    print(f"{args.mp} MP, calidad 85, mediana de {args.reps}")
+    print(f"{'entrada':>8} {'destino':>7} {'perfil':>9} {'encode ms':>10} {'KB':>9} {'vs max':>7}")
+    for name, src in inputs.items():
+        for target in args.targets.split(","):
+            rows = [(p, *run(src, target, p, args.reps)) for p in PROFILES]
+            best = rows[-1][2]
+            for p, ms, size in rows:
+                print(f"{name:>8} {target:>7} {p:>9} {ms:10.1f} {size / 1024:9.1f} {size / best:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
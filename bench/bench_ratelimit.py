@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memoria del rate limiter con millones de IPs sintéticas.
+
+Compara el dict global viejo ((ip, minuto) -> contador, nunca se poda) contra
+services.ratelimit.MemoryBackend con un reloj simulado: --rate requests/segundo,
+cada uno de una IP distinta. Cada --every requests imprime claves vivas y RSS
+actual del proceso; con el backend nuevo las dos se estabilizan en cuanto las
+claves empiezan a expirar (o a chocar con max_keys), con el dict viejo crecen
+lineal. Con --sqlite mide además el backend SQLite (tamaño del archivo).
+
+Uso:
+  python bench/bench_ratelimit.py [--ips 2000000] [--rate 5000] [--sqlite]
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.ratelimit import Budget, MemoryBackend, SQLiteBackend  # noqa: E402
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def ip(i: int) -> str:
+    return f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}:{i >> 24}"
+
+
+def run_legacy(args):
+    bucket = {}
+    for i in range(args.ips):
+        now = i / args.rate
+        key = (ip(i), int(now // 60))
+        bucket[key] = bucket.get(key, 0) + 1
+        if (i + 1) % args.every == 0:
+            print(f"{'dict viejo':>12} {i + 1:>10} {len(bucket):>10} {rss_mb():>9.0f}")
+
+
+def run_backend(name, backend, args, size_fn=None):
+    b = Budget(args.per_min, burst=int(args.per_min))
+    t0 = time.perf_counter()
+    for i in range(args.ips):
+        backend.take(ip(i), b, now=i / args.rate)
+        if (i + 1) % args.every == 0:
+            extra = f" {size_fn():>9.1f}" if size_fn else ""
+            print(f"{name:>12} {i + 1:>10} {len(backend):>10} {rss_mb():>9.0f}{extra}")
+    dt = time.perf_counter() - t0
+    print(f"{name:>12} {args.ips / dt:,.0f} take()/s")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ips", type=int, default=2_000_000)
+    ap.add_argument("--rate", type=float, default=5000, help="requests/segundo simulados (todas IPs nuevas)")
+    ap.add_argument("--per-min", type=float, default=60)
+    ap.add_argument("--max-keys", type=int, default=100_000)
+    ap.add_argument("--every", type=int, default=250_000)
+    ap.add_argument("--mode", choices=("legacy", "memory", "all"), default="all")
+    ap.add_argument("--sqlite", action="store_true")
+    args = ap.parse_args()
+
+    print(f"{'backend':>12} {'requests':>10} {'claves':>10} {'RSS MB':>9}")
+    if args.mode in ("memory", "all"):
+        run_backend("memoria", MemoryBackend(max_keys=args.max_keys), args)
+    if args.sqlite:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "rl.sqlite3")
+            run_backend("sqlite", SQLiteBackend(path), args,
+                        size_fn=lambda: sum(os.path.getsize(p) for p in Path(tmp).iterdir()) / 1e6)
+    # el viejo al final: su RSS no vuelve a bajar y ensuciaría las otras mediciones
+    if args.mode in ("legacy", "all"):
+        run_legacy(args)
+
+
+if __name__ == "__main__":
+    main()
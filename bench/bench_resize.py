@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+"Achicar y convertir": decodificación completa + resize por defecto (approach
+viejo) contra convert_image con decodificación planificada (draft DCT en JPEG,
+reduce() + LANCZOS en el resto). Un caso por proceso para medir el pico de RSS.
+
+Uso:
+  python bench/bench_resize.py [--mp 24] [--width 400] [--formats jpg,png,webp,tiff]
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CASE = r"""
+import io, json, resource, sys, time
+sys.path.insert(0, {root!r})
+from PIL import Image, ImageOps
+from engines.image_engine import convert_image
+
+mode, path, ext, width = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+t0 = time.perf_counter()
+if mode == "full":
+    im = ImageOps.exif_transpose(Image.open(path))
+    w, h = im.size
+    im = im.resize((width, max(1, int(h * width / w)))).convert("RGB")
+    out = io.BytesIO()
+    im.save(out, format="JPEG", quality=85)
+    size = out.tell()
+else:
+    data, _ = convert_image(path, ext, "jpg", quality=85, resize=(width, 0), strip=False)
+    size = len(data)
+dt = time.perf_counter() - t0
+print(json.dumps({{"secs": dt, "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "bytes": size}}))
+"""
+
+SAVE_AS = {"jpg": "JPEG", "png": "PNG", "webp": "WEBP", "tiff": "TIFF"}
+
+
+def make_source(path: str, fmt: str, mp: float):
+    from PIL import Image
+    w = int((mp * 1e6 * 3 / 2) ** 0.5)
+    h = int(w * 2 / 3)
+    # gradiente + ruido suave: comprime como una foto, no como ruido puro
+    im = Image.merge("RGB", [Image.linear_gradient("L").resize((w, h)),
+                             Image.effect_noise((w, h), 20),
+                             Image.linear_gradient("L").rotate(90).resize((w, h))])
+    im.save(path, format=SAVE_AS[fmt], **({"quality": 90} if fmt in ("jpg", "webp") else {}))
+
+
+def run(mode: str, path: str, ext: str, width: int) -> dict:
+    out = subprocess.run([sys.executable, "-c", CASE.format(root=str(ROOT)), mode, path, ext, str(width)],
+                         capture_output=True, text=True)
+    if out.returncode != 0:
+        return {"error": (out.stderr.strip().splitlines() or ["?"])[-1]}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mp", type=float, default=24)
+    ap.add_argument("--width", type=int, default=400)
+    ap.add_argument("--formats", default="jpg,png,webp,tiff")
+    args = ap.parse_args()
+
+    print(f"origen {args.mp:g} MP -> ancho {args.width}px JPEG")
+    print(f"{'formato':>8} {'modo':>9} {'seg':>8} {'pico MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in args.formats.split(","):
+            path = os.path.join(tmp, f"src.{fmt}")
+            make_source(path, fmt, args.mp)
+            for mode in ("full", "planned"):
+                r = run(mode, path, "." + fmt, args.width)
+                if "error" in r:
+                    print(f"{fmt:>8} {mode:>9} error: {r['error']}")
+                    continue
+                print(f"{fmt:>8} {mode:>9} {r['secs']:8.2f} {r['maxrss_mb']:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
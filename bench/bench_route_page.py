@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Requests/segundo de GET /r/{slug} (y /formats.json) contra uvicorn.
+
+Levanta el árbol actual y, con --rev, también una revisión anterior del repo
+(extraída con git archive a un directorio temporal) para comparar antes/después
+del índice de rutas precalculado. Cada cliente usa una conexión keep-alive y
+recorre todos los slugs.
+
+Uso:
+  python bench/bench_route_page.py [--rev HEAD~1] [--clients 4] [--seconds 10]
+Solo stdlib.
+"""
+from __future__ import annotations
+import argparse
+import http.client
+import io
+import os
+import re
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PORT = 8766
+
+
+def checkout(rev: str, dest: str):
+    tar = subprocess.run(["git", "archive", rev], cwd=str(ROOT), capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(tar)) as tf:
+        tf.extractall(dest)
+
+
+def wait_up(url: str, timeout: float = 30):
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            urllib.request.urlopen(url + "/healthz", timeout=1).read()
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError("el servidor no levantó")
+
+
+def slugs(url: str) -> list[str]:
+    html = urllib.request.urlopen(url + "/sitemap.xml", timeout=10).read().decode()
+    return sorted(set(re.findall(r"/r/([a-z0-9-]+)", html)))
+
+
+def hammer(paths: list[str], seconds: float, clients: int) -> tuple[int, int]:
+    ok, bad = [0] * clients, [0] * clients
+
+    def worker(n):
+        conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=30)
+        end = time.time() + seconds
+        i = n
+        while time.time() < end:
+            conn.request("GET", paths[i % len(paths)])
+            r = conn.getresponse()
+            r.read()
+            if r.status == 200:
+                ok[n] += 1
+            else:
+                bad[n] += 1
+            i += 1
+        conn.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(ok), sum(bad)
+
+
+def run_tree(label: str, cwd: str, args) -> None:
+    url = f"http://127.0.0.1:{PORT}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--log-level", "warning"],
+        cwd=cwd,
+    )
+    try:
+        wait_up(url)
+        route_paths = [f"/r/{s}" for s in slugs(url)]
+        for name, paths in (("/r/{slug}", route_paths), ("/formats.json", ["/formats.json"])):
+            hammer(paths, 1.0, args.clients)  # calentamiento
+            ok, bad = hammer(paths, args.seconds, args.clients)
+            print(f"{label:>10} {name:>14} {ok / args.seconds:10.0f} req/s  (errores: {bad})")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rev", default="", help="revisión git para comparar (p. ej. HEAD~1)")
+    ap.add_argument("--clients", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=10)
+    args = ap.parse_args()
+
+    if args.rev:
+        with tempfile.TemporaryDirectory() as tmp:
+            checkout(args.rev, tmp)
+            run_tree(args.rev, tmp, args)
+    run_tree("actual", str(ROOT), args)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("PYTHONUNBUFFERED", "1")
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Quitar metadatos: approach viejo (Image.new + putdata(list(getdata()))) contra
+el strip a nivel encoder de convert_image y el passthrough JPEG->JPEG.
+
+Cada caso corre en un proceso aparte para medir el pico de memoria (ru_maxrss)
+sin arrastrar lo que dejó el caso anterior.
+
+Uso:
+  python bench/bench_strip.py [--sizes 1,12,24,48]
+(el caso "putdata" con 48 MP necesita varios GB de RAM; se puede saltear con --skip-legacy-over 24)
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CASE = r"""
+import io, json, resource, sys, time
+sys.path.insert(0, {root!r})
+from PIL import Image, ImageOps
+from engines.image_engine import convert_image
+
+mode, path = sys.argv[1], sys.argv[2]
+t0 = time.perf_counter()
+if mode == "putdata":
+    im = ImageOps.exif_transpose(Image.open(path))
+    data_only = Image.new(im.mode, im.size)
+    data_only.putdata(list(im.getdata()))
+    out = io.BytesIO()
+    data_only.save(out, format="JPEG", quality=85, subsampling=2, optimize=True)
+    size = out.tell()
+elif mode == "encoder":
+    data, _ = convert_image(path, ".jpg", "jpg", quality=85, strip=True)
+    size = len(data)
+else:  # passthrough
+    data, _ = convert_image(path, ".jpg", "jpg", quality=90, strip=True)
+    size = len(data)
+dt = time.perf_counter() - t0
+print(json.dumps({{"secs": dt, "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "bytes": size}}))
+"""
+
+
+def make_jpeg(path: str, mp: float):
+    from PIL import Image
+    w = int((mp * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    im = Image.effect_noise((w, h), 40).convert("RGB")
+    exif = Image.Exif()
+    exif[0x010F] = "ZetaCam"
+    exif[0x0112] = 1
+    im.save(path, format="JPEG", quality=92, exif=exif.tobytes(), comment=b"bench")
+
+
+def run(mode: str, path: str) -> dict:
+    code = CASE.format(root=str(ROOT))
+    out = subprocess.run([sys.executable, "-c", code, mode, path], capture_output=True, text=True)
+    if out.returncode != 0:
+        return {"error": (out.stderr.strip().splitlines() or ["?"])[-1]}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1,12,24,48")
+    ap.add_argument("--skip-legacy-over", type=float, default=0, help="MP a partir de los cuales no correr putdata")
+    args = ap.parse_args()
+
+    print(f"{'MP':>4} {'modo':>12} {'seg':>8} {'pico MB':>9} {'salida KB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mp in (float(x) for x in args.sizes.split(",")):
+            path = os.path.join(tmp, f"in-{mp:g}.jpg")
+            make_jpeg(path, mp)
+            for mode in ("putdata", "encoder", "passthrough"):
+                if mode == "putdata" and args.skip_legacy_over and mp > args.skip_legacy_over:
+                    print(f"{mp:4g} {mode:>12} {'(salteado)':>8}")
+                    continue
+                r = run(mode, path)
+                if "error" in r:
+                    print(f"{mp:4g} {mode:>12} error: {r['error']}")
+                    continue
+                print(f"{mp:4g} {mode:>12} {r['secs']:8.2f} {r['maxrss_mb']:9.0f} {r['bytes'] / 1024:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Imágenes muy grandes: convert_image por franjas (convert_image_bands, ver
+engines/bands.py) contra el camino de siempre (load() de la imagen entera,
+resize y encode), forzando uno u otro con image_engine.BAND_MIN_PIXELS.
+
+Cada medición corre en un proceso aparte; "pico" es cuánto crece el pico de
+memoria (VmHWM, reseteado con /proc/self/clear_refs) sobre el proceso con
+la entrada ya leída. Fuera de Linux cae a ru_maxrss, que incluye los imports.
+
+Uso:
+  python bench/bench_strips.py [--mp 40] [--sources png,tiff] [--targets png,tiff,jpg] [--resize 0.5]
+Stdlib + Pillow.
+"""
+from __future__ import annotations
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageFilter  # noqa: E402
+
+
+def make_source(path: str, fmt: str, mp: float) -> None:
+    # "foto" sintética: gradientes + grano suavizado, armada de a bloques
+    # chicos y repetida (generar 40 MP de ruido no es lo que se mide)
+    w = int((mp * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    tile = Image.effect_noise((512, 512), 40).filter(ImageFilter.GaussianBlur(1.5))
+    grain = Image.new("L", (w, h))
+    for y in range(0, h, 512):
+        for x in range(0, w, 512):
+            grain.paste(tile, (x, y))
+    grad = Image.linear_gradient("L").resize((w, h))
+    im = Image.merge("RGB", (grad, grain, grad.transpose(Image.FLIP_LEFT_RIGHT)))
+    del grain, grad
+    if fmt == "png":
+        im.save(path, format="PNG", compress_level=1)
+    else:
+        im.save(path, format="TIFF", compression="raw")
+
+
+def _status_mb(key: str) -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(key + ":"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def reset_peak() -> float:
+    # Linux: "5" en clear_refs vuelve VmHWM a lo que ocupa ahora el proceso (los
+    # imports suben más que eso y taparían el pico de una conversión chica)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return _status_mb("VmRSS")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def peak_mb() -> float:
+    return _status_mb("VmHWM") or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(mode: str, path: str, target: str, scale: str) -> None:
+    from engines import image_engine
+    image_engine.BAND_MIN_PIXELS = 1 if mode == "bands" else 10 ** 12
+    ext = os.path.splitext(path)[1]
+    with open(path, "rb") as f:
+        src = f.read()
+    w = Image.open(path).width
+    resize = (int(w * float(scale)), 0) if float(scale) != 1 else None
+    base = reset_peak()
+    t0 = time.perf_counter()
+    data, _ = image_engine.convert_image(src, ext, target, 85, resize)
+    dt = time.perf_counter() - t0
+    print(f"{dt:.3f} {peak_mb() - base:.1f} {len(data)}")
+
+
+def measure(mode: str, path: str, target: str, scale: float) -> tuple:
+    out = subprocess.run([sys.executable, __file__, "--child", mode, path, target, str(scale)],
+                         capture_output=True, text=True, check=True).stdout.splitlines()[-1].split()
+    return float(out[0]), float(out[1]), int(out[2])
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(*sys.argv[2:6])
+        return
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mp", type=float, default=40.0)
+    ap.add_argument("--sources", default="png,tiff")
+    ap.add_argument("--targets", default="png,tiff,jpg")
+    ap.add_argument("--resize", default="1,0.5", help="factores de ancho, separados por coma")
+    args = ap.parse_args()
+
+    print(f"{args.mp} MP RGB (entera decodificada = {args.mp * 3:.0f} MB)")
+    print(f"{'origen':>6} {'destino':>7} {'escala':>6} {'modo':>6} {'s':>7} {'pico MB':>8} {'MB':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in args.sources.split(","):
+            path = os.path.join(tmp, f"big.{fmt}")
+            make_source(path, fmt, args.mp)
+            for target in args.targets.split(","):
+                for scale in (float(v) for v in args.resize.split(",")):
+                    for mode in ("bands", "whole"):
+                        dt, peak, nbytes = measure(mode, path, target, scale)
+                        print(f"{fmt:>6} {target:>7} {scale:6.2f} {mode:>6} {dt:7.2f} {peak:8.1f} {nbytes / 1e6:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
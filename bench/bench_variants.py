@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Imagen responsive (srcset de varios anchos x varios formatos): una llamada a
+convert_image por salida (cada una decodifica, orienta y achica desde el
+original) contra convert_image_many (un decode, cascada de tamaños, encodes
+en paralelo).
+
+Uso:
+  python bench/bench_variants.py [--mp 12] [--widths 1600,1200,800,400] [--targets webp,jpg] [--reps 3]
+Stdlib + Pillow.
+"""
+from __future__ import annotations
+import argparse
+import statistics
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageFilter  # noqa: E402
+from engines.image_engine import convert_image, convert_image_many  # noqa: E402
+
+
+def make_photo(mp: float) -> bytes:
+    w = int((mp * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    bands = [Image.effect_noise((w, h), s).filter(ImageFilter.GaussianBlur(1)) for s in (20, 40, 60)]
+    exif = Image.Exif()
+    exif[0x0112] = 6   # foto de celular en vertical: hay que rotar
+    b = BytesIO()
+    Image.merge("RGB", bands).save(b, format="JPEG", quality=92, exif=exif.tobytes())
+    return b.getvalue()
+
+
+def one_by_one(src: bytes, specs: list) -> int:
+    return sum(len(convert_image(src, ".jpg", t, quality=q, resize=r, strip=True)[0]) for t, r, q in specs)
+
+
+def fan_out(src: bytes, specs: list, threads: int) -> int:
+    return sum(len(d) for d, _, _ in convert_image_many(src, ".jpg", specs, strip=True, threads=threads))
+
+
+def timed(fn, reps: int):
+    times, size = [], 0
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        size = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), size
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mp", type=float, default=12.0)
+    ap.add_argument("--widths", default="1600,1200,800,400")
+    ap.add_argument("--targets", default="webp,jpg")
+    ap.add_argument("--reps", type=int, default=3)
+    args = ap.parse_args()
+
+    src = make_photo(args.mp)
+    specs = [(t, (int(w), 0), 80) for t in args.targets.split(",") for w in args.widths.split(",")]
+    print(f"foto de {args.mp} MP -> {len(specs)} salidas ({args.targets} x {args.widths})")
+    base, size = timed(lambda: one_by_one(src, specs), args.reps)
+    print(f"{'convert_image x' + str(len(specs)):>22} {base:7.2f} s  {size / 1024:8.0f} KB")
+    for threads in (1, 3):
+        dt, size = timed(lambda: fan_out(src, specs, threads), args.reps)
+        print(f"{f'convert_image_many/{threads}':>22} {dt:7.2f} s  {size / 1024:8.0f} KB  ({base / dt:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,456 @@
+# bands.py
+"""
+Imágenes muy grandes por franjas horizontales: leer, achicar y escribir de a
+N filas, sin tener nunca la imagen entera decodificada ni las copias de
+tamaño completo del resize y del aplanado. El pipeline está en
+image_engine.convert_image_bands; acá van las piezas:
+
+- lectura: PNG de 8 bits no entrelazado (el stream zlib se consume de a
+  franja) y TIFF por strips (cada franja es un TIFF chico con esos strips;
+  sin compresión, con esas filas).
+  El resto (JPEG ya con draft, BMP, TIFF comprimido en un solo strip...) se decodifica
+  entero y se recorre en franjas
+- BandResizer: el resize(LANCZOS, reducing_gap=2.0) de Pillow alimentado por
+  franjas, con el mismo resultado que sobre la imagen entera (salvo redondeo)
+- escritura: PngBandWriter y TiffBandWriter escriben a medida que llegan
+  las franjas; para el resto de los formatos el encoder necesita la imagen
+  entera (queda una sola, del tamaño de salida)
+
+Todo con Pillow + zlib: cada franja se decodifica/encodea armando un PNG o
+TIFF chico en memoria, así los filtros y los codecs son los de Pillow.
+"""
+from __future__ import annotations
+import math
+import zlib
+from contextlib import contextmanager
+from io import BytesIO
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from PIL import Image, TiffImagePlugin, TiffTags
+
+# Igual que _apply_resize en image_engine
+REDUCING_GAP = 2.0
+# Soporte del filtro LANCZOS (a=3) en píxeles de origen, a escala 1
+_LANCZOS_SUPPORT = 3.0
+# resize() trabaja con alfa premultiplicado; por franjas hay que hacer lo mismo
+# una sola vez, no en cada reduce/resize
+_PREMULTIPLIED = {"RGBA": "RGBa", "LA": "La"}
+
+_PNG_SIG = b"\x89PNG\r\n\x1a\n"
+# color type -> canales (8 bits): gris, RGB, paleta, gris+alfa, RGBA
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# modo -> (color type, bits, canales) al escribir
+_PNG_FORMAT = {"1": (0, 1, 1), "L": (0, 8, 1), "P": (3, 8, 1), "RGB": (2, 8, 3), "LA": (4, 8, 2), "RGBA": (6, 8, 4)}
+
+# Tags que hacen falta para decodificar los strips (EXIF, GPS, SubIFDs... no)
+_TIFF_DECODE_TAGS = (256, 258, 259, 262, 266, 277, 284, 317, 320, 338, 339, 347, 529, 530, 531, 532)
+_TIFF_PHOTOMETRIC = {"1": 1, "L": 1, "LA": 1, "RGB": 2, "RGBA": 2, "CMYK": 5}
+# Tamaño de strip al escribir: el mismo que usa Pillow
+_TIFF_STRIP_BYTES = 65536
+
+
+@contextmanager
+def _open_src(src):
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        yield BytesIO(src)
+    else:
+        with open(src, "rb") as f:
+            yield f
+
+
+def vstack(bands: List[Image.Image]) -> Image.Image:
+    """Franjas del mismo ancho y modo, una abajo de la otra."""
+    if len(bands) == 1:
+        return bands[0]
+    out = Image.new(bands[0].mode, (bands[0].width, sum(b.height for b in bands)))
+    y = 0
+    for b in bands:
+        out.paste(b, (0, y))
+        y += b.height
+    return out
+
+
+# ===== Lectura =====
+def _png_chunks(fp: BinaryIO) -> Iterator[Tuple[bytes, bytes]]:
+    if fp.read(8) != _PNG_SIG:
+        raise ValueError("no es un PNG")
+    while True:
+        head = fp.read(8)
+        if len(head) < 8:
+            return
+        body = fp.read(int.from_bytes(head[:4], "big"))
+        fp.read(4)   # CRC
+        yield head[4:], body
+        if head[4:] == b"IEND":
+            return
+
+
+def _chunk(ctype: bytes, body: bytes) -> bytes:
+    crc = zlib.crc32(body, zlib.crc32(ctype))
+    return len(body).to_bytes(4, "big") + ctype + body + crc.to_bytes(4, "big")
+
+
+def _png_header(src) -> Optional[bytes]:
+    with _open_src(src) as fp:
+        head = fp.read(33)
+    if head[:8] != _PNG_SIG or head[12:16] != b"IHDR":
+        return None
+    return head[16:29]
+
+
+def png_streamable(src) -> bool:
+    """PNG de 8 bits por canal y no entrelazado: se puede leer de a filas."""
+    ihdr = _png_header(src)
+    return ihdr is not None and ihdr[8] == 8 and ihdr[9] in _PNG_CHANNELS and ihdr[12] == 0
+
+
+def png_bands(src, rows: int) -> Iterator[Image.Image]:
+    """
+    Franjas de `rows` filas de un PNG (ver png_streamable). Las filas salen
+    del stream zlib de los IDAT ya filtradas; cada franja se decodifica como
+    un PNG chico con la última fila de la franja anterior adelante, sin
+    filtro, porque los filtros Up/Average/Paeth la necesitan.
+    """
+    with _open_src(src) as fp:
+        chunks = _png_chunks(fp)
+        _, ihdr = next(chunks)
+        w, h, color = int.from_bytes(ihdr[0:4], "big"), int.from_bytes(ihdr[4:8], "big"), ihdr[9]
+        stride = 1 + w * _PNG_CHANNELS[color]
+        extra, compressed = [], b""   # PLTE / tRNS van en cada franja
+        for ctype, body in chunks:
+            if ctype == b"IDAT":
+                compressed = body
+                break
+            if ctype in (b"PLTE", b"tRNS"):
+                extra.append(_chunk(ctype, body))
+
+        def more_idat() -> bytes:
+            for ctype, body in chunks:
+                if ctype == b"IDAT":
+                    return body
+                break   # los IDAT van seguidos: lo que sigue ya no es imagen
+            raise ValueError("PNG truncado")
+
+        inflate = zlib.decompressobj()
+        prev = None
+        for y in range(0, h, rows):
+            n = min(rows, h - y)
+            parts, got = [], 0
+            while got < n * stride:
+                if not compressed:
+                    compressed = more_idat()
+                out = inflate.decompress(compressed, n * stride - got)
+                compressed = inflate.unconsumed_tail
+                if not out and inflate.eof:
+                    raise ValueError("PNG truncado")
+                parts.append(out)
+                got += len(out)
+            if prev is not None:
+                parts.insert(0, b"\x00" + prev)
+            data = b"".join(parts)
+            mini = b"".join([
+                _PNG_SIG,
+                _chunk(b"IHDR", w.to_bytes(4, "big") + (len(data) // stride).to_bytes(4, "big")
+                       + bytes((8, color, 0, 0, 0))),
+                *extra,
+                _chunk(b"IDAT", zlib.compress(data, 0)),
+                _chunk(b"IEND", b""),
+            ])
+            del data, parts
+            band = Image.open(BytesIO(mini))
+            band.load()
+            if prev is not None:
+                band = band.crop((0, 1, w, n + 1))
+            prev = band.crop((0, n - 1, w, n)).tobytes()
+            yield band
+
+
+def tiff_striped(im: Image.Image) -> bool:
+    """
+    TIFF clásico por strips (no tiles) y canales intercalados, con más de un
+    strip o sin compresión (ahí cualquier rango de filas es un rango de bytes).
+    """
+    tags = getattr(im, "tag_v2", None)
+    if im.format != "TIFF" or tags is None or getattr(tags, "_bigtiff", False):
+        return False
+    rps = tags.get(278, im.height)
+    return (322 not in tags and tags.get(284, 1) == 1 and tags.get(259, 1) != 6
+            and 273 in tags and 279 in tags and 0 < rps and (rps < im.height or tags.get(259, 1) == 1))
+
+
+def _tiff_groups(im: Image.Image, rows: int) -> Iterator[Tuple[int, int, List[Tuple[int, int]]]]:
+    """(alto, filas por strip, [(offset, bytes)]) de cada franja: strips enteros,
+    o sin compresión, `rows` filas sacadas de donde estén (queda un solo strip)."""
+    tags = im.tag_v2
+    rps = min(int(tags.get(278, im.height)), im.height)
+    offsets, counts = tags[273], tags[279]
+    if tags.get(259, 1) == 1:
+        stride = (im.width * sum(tags.get(258, (1,) * tags.get(277, 1))) + 7) // 8
+        for y in range(0, im.height, rows):
+            height = min(rows, im.height - y)
+            parts, r = [], y
+            while r < y + height:
+                i, k = divmod(r, rps)
+                n = min(rps - k, y + height - r)
+                parts.append((offsets[i] + k * stride, n * stride))
+                r += n
+            yield height, height, parts
+        return
+    per_band = max(1, rows // rps)
+    for first in range(0, len(offsets), per_band):
+        strips = range(first, min(first + per_band, len(offsets)))
+        height = min(len(strips) * rps, im.height - first * rps)
+        if height <= 0:
+            break
+        yield height, rps, [(offsets[i], counts[i]) for i in strips]
+
+
+def tiff_bands(im: Image.Image, src, rows: int) -> Iterator[Image.Image]:
+    """
+    Franjas de un TIFF por strips (ver tiff_striped), de a strips enteros: los
+    strips son independientes, así que cada franja es un TIFF chico con un
+    IFD propio y esos strips tal cual (el codec lo pone Pillow/libtiff). Sin
+    compresión, las filas de la franja copiadas en un strip.
+    """
+    tags = im.tag_v2
+    raw = tags.get(259, 1) == 1
+    # sin compresión Pillow lee con el decoder "raw": las filas se decodifican
+    # directo con su rawmode, sin armar un TIFF
+    tile = im.tile[0] if raw and len(im.tile) > 0 else None
+    rawmode = tile[3][0] if tile and tile[0] == "raw" and tuple(tile[3][1:]) == (0, 1) else None
+    prefix = tags.prefix
+    order = "little" if prefix == b"II" else "big"
+    with _open_src(src) as fp:
+        for height, rps, parts in _tiff_groups(im, rows):
+            data = []
+            for offset, count in parts:
+                fp.seek(offset)
+                data.append(fp.read(count))
+            if raw:
+                data = [data[0] if len(data) == 1 else b"".join(data)]
+            if rawmode:
+                yield Image.frombytes(im.mode, (im.width, height), data[0], "raw", rawmode)
+                continue
+            new_offsets, pos = [], 0
+            for d in data:
+                new_offsets.append(pos)
+                pos += len(d)
+            ifd = TiffImagePlugin.ImageFileDirectory_v2(prefix=prefix)
+            for tag in _TIFF_DECODE_TAGS:
+                if tag in tags:
+                    ifd[tag] = tags[tag]
+                    ifd.tagtype[tag] = tags.tagtype[tag]
+            ifd[257], ifd[278] = height, rps
+            ifd[273], ifd[279] = tuple(new_offsets), tuple(len(d) for d in data)
+            for tag in (257, 273, 278, 279):
+                ifd.tagtype[tag] = TiffTags.LONG
+            # IFD en el byte 8 y los strips atrás: tobytes() corre StripOffsets al final del IFD
+            mini = prefix + (42).to_bytes(2, order) + (8).to_bytes(4, order) + ifd.tobytes(8) + b"".join(data)
+            del data
+            band = Image.open(BytesIO(mini))
+            band.load()
+            yield band
+
+
+def image_bands(im: Image.Image, rows: int) -> Iterator[Image.Image]:
+    """Cualquier otro formato: se decodifica entero (con el draft que tenga) y se recorre."""
+    im.load()
+    for y in range(0, im.height, rows):
+        yield im.crop((0, y, im.width, min(im.height, y + rows)))
+
+
+def read_bands(im: Image.Image, src, rows: int) -> Iterator[Image.Image]:
+    """Franjas de arriba hacia abajo de `im` (abierta desde `src`, sin load())."""
+    if im.format == "PNG" and png_streamable(src):
+        return png_bands(src, rows)
+    if tiff_striped(im):
+        return tiff_bands(im, src, rows)
+    return image_bands(im, rows)
+
+
+# ===== Resize =====
+class BandResizer:
+    """
+    resized = BandResizer(src_size, size, mode, rows)
+    for band in franjas: yield from resized.feed(band)
+    yield from resized.finish()
+
+    Igual que Image.resize(size, LANCZOS, reducing_gap=2.0): primero reduce()
+    por un factor entero, de a bloques de filas enteros, y después LANCZOS con
+    box= sobre una ventana de filas que cubre el soporte del filtro. Con box=
+    Pillow toma los vecinos de la ventana en vez de cortar en el borde de la
+    franja, así que cada franja de salida es la misma que en el resize entero
+    (±1-2 niveles de redondeo en las costuras).
+    """
+    def __init__(self, src_size: Tuple[int, int], size: Tuple[int, int], mode: str, rows: int):
+        w, h = src_size
+        self.size = size
+        self.mode = mode
+        self._pm = _PREMULTIPLIED.get(mode)
+        # con alfa Pillow premultiplica y llama a resize() sin reducing_gap: sin reduce
+        self._fx = 1 if self._pm else int(w / size[0] / REDUCING_GAP) or 1
+        self._fy = 1 if self._pm else int(h / size[1] / REDUCING_GAP) or 1
+        # box del resize sobre lo ya reducido, como lo calcula Pillow
+        self._box_w, self._box_h = w / self._fx, h / self._fy
+        self._scale = self._box_h / size[1]
+        self._support = _LANCZOS_SUPPORT * max(self._scale, 1.0)
+        self._step = max(1, int(rows / max(self._scale, 1.0)))   # filas de salida por franja
+        self._carry: Optional[Image.Image] = None   # filas que no completan un bloque de reduce
+        self._window: List[Tuple[int, Image.Image]] = []   # (y, franja reducida)
+        self._have = 0
+        self._oy = 0
+
+    def _reduce(self, band: Image.Image) -> Optional[Image.Image]:
+        if self._fx == 1 and self._fy == 1:
+            return band
+        if self._carry is not None:
+            band = vstack([self._carry, band])
+            self._carry = None
+        whole = band.height - band.height % self._fy
+        if whole < band.height:
+            self._carry = band.crop((0, whole, band.width, band.height))
+            band = band.crop((0, 0, band.width, whole))
+        return band.reduce((self._fx, self._fy)) if whole else None
+
+    def _rows(self, lo: int, hi: int) -> Image.Image:
+        parts = []
+        for y, band in self._window:
+            top, bottom = max(lo, y), min(hi, y + band.height)
+            if top < bottom:
+                parts.append(band if (top, bottom) == (y, y + band.height)
+                             else band.crop((0, top - y, band.width, bottom - y)))
+        return vstack(parts)
+
+    def _emit(self, last: bool) -> Iterator[Image.Image]:
+        ow, oh = self.size
+        while self._oy < oh:
+            oy0, oy1 = self._oy, min(oh, self._oy + self._step)
+            lo = max(0, int(oy0 * self._scale - self._support) - 1)
+            hi = int(oy1 * self._scale + self._support) + 2
+            if hi > self._have and not last:
+                return
+            hi = min(hi, self._have)
+            out = self._rows(lo, hi).resize(
+                (ow, oy1 - oy0), Image.LANCZOS,
+                box=(0, oy0 * self._scale - lo, self._box_w, oy1 * self._scale - lo))
+            self._window = [(y, b) for y, b in self._window if y + b.height > lo]
+            self._oy = oy1
+            yield out.convert(self.mode) if self._pm else out
+
+    def feed(self, band: Image.Image) -> Iterator[Image.Image]:
+        if self._pm:
+            band = band.convert(self._pm)
+        reduced = self._reduce(band)
+        if reduced is not None:
+            self._window.append((self._have, reduced))
+            self._have += reduced.height
+        return self._emit(False)
+
+    def finish(self) -> Iterator[Image.Image]:
+        if self._carry is not None:
+            carry, self._carry = self._carry, None
+            self._window.append((self._have, carry.reduce((self._fx, self._fy))))
+            self._have += self._window[-1][1].height
+        return self._emit(True)
+
+
+# ===== Escritura =====
+class PngBandWriter:
+    """
+    w = PngBandWriter(fp, size, "RGB", compress_level=6)
+    w.write(franja)    # de arriba hacia abajo
+    w.close()
+
+    Los filtros de fila los elige Pillow: cada franja (con la última fila de la
+    anterior adelante) se encodea a nivel 0 y se le sacan las filas filtradas;
+    esas van a un único stream zlib, comprimido a `compress_level`.
+    """
+    def __init__(self, fp: BinaryIO, size: Tuple[int, int], mode: str, compress_level: int = 6,
+                 icc_profile: Optional[bytes] = None, palette: Optional[bytes] = None,
+                 transparency=None):
+        w, h = size
+        color, bits, channels = _PNG_FORMAT[mode]
+        if mode == "P":
+            # como Pillow: con paletas chicas, 1/2/4 bits por píxel
+            colors = max(1, min(len(palette) // 3, 256))
+            bits = next(b for b, n in ((1, 2), (2, 4), (4, 16), (8, 256)) if colors <= n)
+            palette = palette[:colors * 3]
+        self.fp = fp
+        self.mode = mode
+        self._bits = bits
+        self._stride = 1 + (w * channels * bits + 7) // 8
+        fp.write(_PNG_SIG + _chunk(b"IHDR", w.to_bytes(4, "big") + h.to_bytes(4, "big")
+                                   + bytes((bits, color, 0, 0, 0))))
+        if icc_profile:
+            fp.write(_chunk(b"iCCP", b"ICC Profile\0\0" + zlib.compress(icc_profile)))
+        if mode == "P":
+            fp.write(_chunk(b"PLTE", palette))
+            if isinstance(transparency, int):
+                # índice transparente -> alfa por entrada de la paleta
+                transparency = b"\xff" * transparency + b"\0"
+            if transparency:
+                fp.write(_chunk(b"tRNS", bytes(transparency)))
+        # mismos parámetros de deflate que el encoder PNG de Pillow: Z_FILTERED
+        # salvo la paleta de 8 bits, que va sin filtro de fila
+        strategy = zlib.Z_DEFAULT_STRATEGY if mode == "P" and bits == 8 else zlib.Z_FILTERED
+        self._deflate = zlib.compressobj(compress_level, zlib.DEFLATED, 15, 9, strategy)
+        self._prev: Optional[Image.Image] = None
+
+    def write(self, band: Image.Image):
+        src = band if self._prev is None else vstack([self._prev, band])
+        buf = BytesIO()
+        # bits fijo: la paleta de una franja sola puede dar otro empaquetado
+        src.save(buf, format="PNG", compress_level=0, **({"bits": self._bits} if self.mode == "P" else {}))
+        buf.seek(0)
+        raw = zlib.decompress(b"".join(body for ctype, body in _png_chunks(buf) if ctype == b"IDAT"))
+        if self._prev is not None:
+            raw = raw[self._stride:]
+        self._idat(self._deflate.compress(raw))
+        self._prev = band.crop((0, band.height - 1, band.width, band.height))
+
+    def _idat(self, data: bytes):
+        if data:
+            self.fp.write(_chunk(b"IDAT", data))
+
+    def close(self):
+        self._idat(self._deflate.flush())
+        self.fp.write(_chunk(b"IEND", b""))
+
+
+class TiffBandWriter:
+    """
+    TIFF sin compresión (lo que guarda Pillow por defecto) escrito de a
+    franjas: header e IFD primero (el tamaño se conoce de antemano) y después
+    los píxeles seguidos, partidos en strips de ~64 KB.
+    """
+    def __init__(self, fp: BinaryIO, size: Tuple[int, int], mode: str, icc_profile: Optional[bytes] = None):
+        self.fp = fp
+        w, h = size
+        bits, bands = (1, 1) if mode == "1" else (8, len(mode))
+        stride = (w * bits + 7) // 8 * bands
+        rps = max(1, _TIFF_STRIP_BYTES // stride)
+        n = math.ceil(h / rps)
+        ifd = TiffImagePlugin.ImageFileDirectory_v2(prefix=b"II")
+        ifd[256], ifd[257] = w, h
+        ifd[258] = (bits,) * bands
+        ifd[259] = 1
+        ifd[262] = _TIFF_PHOTOMETRIC[mode]
+        # relativos al final del IFD: tobytes() les suma dónde termina
+        ifd[273] = tuple(i * rps * stride for i in range(n))
+        ifd[277] = bands
+        ifd[278] = rps
+        ifd[279] = tuple(min(rps, h - i * rps) * stride for i in range(n))
+        ifd[284] = 1
+        for tag in (256, 257, 273, 278, 279):
+            ifd.tagtype[tag] = TiffTags.LONG
+        if mode in ("LA", "RGBA"):
+            ifd[338] = 2   # alfa sin premultiplicar
+        if icc_profile:
+            ifd[34675] = icc_profile
+        fp.write(b"II*\0" + (8).to_bytes(4, "little") + ifd.tobytes(8))
+
+    def write(self, band: Image.Image):
+        self.fp.write(band.tobytes())
+
+    def close(self):
+        pass
@@ -1,8 +1,19 @@
 # image_engine.py
 from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from io import BytesIO
-from typing import Tuple, Optional
-from PIL import Image, ImageOps, features
+import itertools
+import math
+import os
+from typing import Iterator, List, Tuple, Optional, Union
+from PIL import GifImagePlugin, Image, ImageChops, ImageOps, TiffImagePlugin, features
+
+from engines.bands import BandResizer, PngBandWriter, TiffBandWriter, read_bands
+from engines.pdf_writer import ImageStream, PdfWriter
+from engines.probe import (SWAPS_AXES as _SWAPS_AXES, OverBudget, frame_count, orientation as _orientation,
+                           plan_image, resize_target as _resize_target)
+from engines.stages import stage
 
 # =========================
 #  Soporte dinámico por PIL
@@ -37,11 +48,55 @@ _MIME = {
     "pdf": "application/pdf",
 }
 
+# ===== Perfiles de encoder =====
+# Cuánto CPU gasta el encoder para achicar el archivo; la calidad pedida no
+# cambia. fast para tráfico interactivo, max para async/batch (nadie espera
+# mirando). Elegidos con bench/bench_profiles.py (3 MP, foto / captura):
+# - JPEG: optimize (Huffman a medida) cuesta ~2-5 ms y ahorra 8-30%, así que
+#   va en todos; progressive solo en max (-3% en gráficos, +1% en fotos)
+# - WEBP: method 2/4/6 -> 1x / 2.8x / 3.7x de tiempo para -4% / -0.4% de bytes
+# - PNG: nivel 4 es el primero con lazy matching (-15..30% contra 1-3 por
+#   +30..60% de tiempo); 7 es el techo porque 8-9 tardan 8-20x más que 6
+#   por -7..13% (a 100 MP se pasarían de ZC_JOB_TIMEOUT). Las estrategias
+#   Z_RLE/Z_FILTERED no mejoraron nada con niveles >= 4.
+PROFILES = ("fast", "balanced", "max")
+DEFAULT_PROFILE = "balanced"
+_ENCODER_PROFILES = {
+    "jpeg": {
+        "fast": {"optimize": True},
+        "balanced": {"optimize": True},
+        "max": {"optimize": True, "progressive": True},
+    },
+    "webp": {
+        "fast": {"method": 2},
+        "balanced": {"method": 4},
+        "max": {"method": 6},
+    },
+    "png": {
+        "fast": {"compress_level": 4},
+        "balanced": {"compress_level": 6},
+        "max": {"compress_level": 7},
+    },
+}
+
+# Encodes en paralelo dentro de un job (variantes, pruebas de max_bytes):
+# Pillow suelta el GIL mientras encodea
+ENCODE_THREADS = 3
+
+def encoder_settings(target: str, profile: Optional[str] = None) -> dict:
+    """Parámetros de save() del perfil para el formato destino ({} si no aplica)."""
+    profile = profile or DEFAULT_PROFILE
+    if profile not in PROFILES:
+        raise ValueError(f"perfil desconocido: {profile}")
+    fmt = "jpeg" if target in ("jpg", "jpeg") else target
+    return dict(_ENCODER_PROFILES.get(fmt, {}).get(profile, {}))
+
 def _fmt_of_ext(ext: str) -> str:
     """Devuelve el formato PIL (e.g. 'JPEG') a partir de una extensión '.jpg'."""
     return _PIL_EXT_MAP.get(ext.lower(), "").upper() or ext.lstrip(".").upper()
 
-def _mime_of_target(target: str) -> str:
+def mime_of_target(target: str) -> str:
+    """Mime de la salida para una extensión destino ('jpg' -> 'image/jpeg'); fallback image/<ext>."""
     t = target.lower()
     if t in _MIME:
         return _MIME[t]
@@ -52,116 +107,940 @@ def _normalize_ext(e: Optional[str]) -> str:
     e = e.strip().lower()
     return e if e.startswith(".") else f".{e}"
 
+# Fuente: ruta a un archivo spooleado (lo normal) o bytes en memoria
+Source = Union[str, os.PathLike, bytes]
+
+def _open_image(src: Source) -> Image.Image:
+    """Abre desde ruta (PIL lee del disco a demanda) o desde bytes."""
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return Image.open(BytesIO(src))
+    return Image.open(src)
+
 def _flatten_to_rgb(im: Image.Image, bg=(255, 255, 255)) -> Image.Image:
     """
-    Convierte RGBA/P a RGB con fondo sólido (útil para JPG/PDF).
+    Convierte RGBA/P a RGB con fondo sólido y el gris de 16 bits a L (útil para JPG/PDF).
     """
     if im.mode in ("RGBA", "LA"):
         bg_im = Image.new("RGB", im.size, bg)
-        bg_im.paste(im, mask=im.split()[-1])  # usa alfa como máscara
+        # la imagen misma como máscara: paste() usa su alfa sin separarlo
+        # (split() armaría una imagen por canal)
+        bg_im.paste(im, mask=im)
         return bg_im
     if im.mode == "P":
         return im.convert("RGB")
     if im.mode.startswith("CMYK"):
         return im.convert("RGB")
+    if im.mode.startswith("I;16") or im.mode == "I":
+        # gris de 16 bits: convert() recorta a 255 (queda blanco), hay que escalar
+        return im.convert("I").point(lambda v: v / 257).convert("L")
     return im
 
-def _apply_resize(im: Image.Image, resize: Optional[Tuple[int, int]]) -> Image.Image:
-    if not resize:
-        return im
-    w, h = im.size
-    rw, rh = resize
-    if (rw and rw > 0) or (rh and rh > 0):
-        if rw and rh:
-            new_w, new_h = int(rw), int(rh)
-        elif rw:
-            new_w = int(rw)
-            new_h = max(1, int(h * (new_w / float(w))))
-        else:
-            new_h = int(rh)
-            new_w = max(1, int(w * (new_h / float(h))))
-        if new_w > 0 and new_h > 0 and (new_w != w or new_h != h):
-            im = im.resize((new_w, new_h))
+# Orientación EXIF -> transpose (lo mismo que hace ImageOps.exif_transpose)
+_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT, 3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM, 5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270, 7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+def _apply_resize(im: Image.Image, resize: Optional[Tuple[int, int]], orientation: int = 1,
+                  orient=None) -> Image.Image:
+    """
+    Resize pedido (sobre la imagen ya orientada) + la orientación EXIF, en el
+    orden con copias más chicas: si achica, primero el resize y se rota la
+    chica; si agranda, primero la rotación. `orient(im)` aplica la orientación
+    (por defecto un transpose). Sin nada que hacer devuelve `im` tal cual.
+    """
+    method = _TRANSPOSE.get(orientation)
+    swap = orientation in _SWAPS_AXES
+    new_size = _resize_target((im.height, im.width) if swap else im.size, resize)
+    orient = orient or (lambda px: px.transpose(method))
+    if method is not None and new_size and new_size[0] * new_size[1] > im.width * im.height:
+        im, method = orient(im), None
+    if new_size:
+        if method is not None and swap:
+            new_size = (new_size[1], new_size[0])
+        # reducing_gap: primero reduce() por un factor entero (barato, box filter)
+        # y después LANCZOS sobre lo que queda, en vez de LANCZOS sobre todo
+        im = im.resize(new_size, Image.LANCZOS, reducing_gap=2.0)
+    if method is not None:
+        im = orient(im)
     return im
 
+def _orient(px: Image.Image, orientation: int) -> Image.Image:
+    """
+    La orientación EXIF sobre `px` en una imagen nueva, sacándola de los
+    metadatos como ImageOps.exif_transpose (que con orientación no copia de
+    más: la rotación ya es la imagen nueva). Un TIFF la trae en su IFD, que la
+    imagen rotada no lleva: ahí solo se rota (no hay EXIF que corregir).
+    """
+    if px.getexif().get(0x0112, 1) == orientation:
+        return ImageOps.exif_transpose(px)
+    return px.transpose(_TRANSPOSE[orientation])
+
+def _prepare(im: Image.Image, resize: Optional[Tuple[int, int]]) -> Image.Image:
+    """
+    `im` abierta (con _plan_decode ya hecho) -> decodificada, con resize y
+    orientada, con una sola copia por paso que cambia algo:
+    - resize y orientación en el orden de _apply_resize; cada uno devuelve una
+      imagen nueva, ya despegada del archivo (sin el IFD de un TIFF, que su
+      writer volvería a copiar) y que el encode puede modificar
+    - sin ninguno de los dos, esa imagen es un copy() del decode
+    - el aplanado de JPG/WEBP/PDF queda para el final, sobre la ya achicada
+    """
+    with stage("decode"):
+        im.load()
+        orientation = _orientation(im)   # después de load(): un PNG puede traer eXIf al final
+    with stage("resize"):
+        px = _apply_resize(im, resize, orientation, lambda p: _orient(p, orientation))
+        return im.copy() if px is im else px
+
+def _plan_decode(im: Image.Image, resize: Optional[Tuple[int, int]], max_pixels: Optional[int] = None):
+    """
+    Antes de decodificar: si el resize achica y es un JPEG, pedimos al decoder
+    escalado DCT (1/2, 1/4, 1/8) al menor tamaño que siga cubriendo el destino.
+    El resize se calcula sobre la imagen ya orientada, así que si la orientación
+    rota 90° hay que pedir el tamaño con los ejes invertidos.
+    Con max_pixels (ver engines/probe.py) un JPEG que no entra se decodifica
+    achicado; cualquier otra cosa que no entre levanta OverBudget.
+    """
+    need = None
+    if max_pixels:
+        plan = plan_image(im, max_pixels, resize)
+        if plan.scale > 1:
+            need = (math.ceil(im.width / plan.scale), math.ceil(im.height / plan.scale))
+    if im.format != "JPEG" or not resize:
+        if need:
+            im.draft(None, need)
+        return
+    swap = _orientation(im) in _SWAPS_AXES
+    w, h = im.size
+    shown = (h, w) if swap else (w, h)
+    final = _resize_target(shown, resize)
+    if final and final[0] < shown[0] and final[1] < shown[1]:
+        by_resize = (final[1], final[0]) if swap else final
+        # draft() se aplica una sola vez: pedimos el más chico de los dos
+        if need is None or by_resize[0] * by_resize[1] < need[0] * need[1]:
+            need = by_resize
+    if need:
+        im.draft(None, need)
+
+# ===== Metadatos =====
+# Claves de im.info que NO son metadatos y hacen falta para reproducir la imagen
+_KEEP_INFO = {"transparency", "duration", "loop", "background", "dpi", "gamma", "aspect"}
+
+def _strip_metadata(im: Image.Image, save_params: dict):
+    """
+    Quita EXIF/XMP/ICC/comentarios/chunks de texto a nivel encoder, sin tocar
+    los píxeles: los encoders de Pillow solo escriben lo que está en im.info o
+    en los parámetros de save().
+    """
+    for k in list(im.info):
+        if k not in _KEEP_INFO:
+            del im.info[k]
+    save_params.update({"exif": b"", "icc_profile": None})
+
+# Segmentos JPEG que son solo metadatos: APP1 (EXIF/XMP), APP2 (ICC/FlashPix),
+# APP3..APP13 (Meta, IPTC/Photoshop...), APP15 y COM. APP0 (JFIF) y APP14
+# (Adobe, define la transformación de color) se conservan.
+_JPEG_DROP = {0xE1, 0xE2, 0xE3, 0xE4, 0xE5, 0xE6, 0xE7, 0xE8, 0xE9, 0xEA, 0xEB, 0xEC, 0xED, 0xEF, 0xFE}
+
+# JPEG->JPEG sin resize: si la calidad pedida es alta, re-encodear no achica y
+# solo pierde; copiamos el bitstream tal cual sacando los segmentos de metadatos
+JPEG_PASSTHROUGH_MIN_QUALITY = 90
+
+def _read_bytes(src: Source) -> bytes:
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return bytes(src)
+    with open(src, "rb") as f:
+        return f.read()
+
+def _strip_jpeg_segments(src: Source) -> bytes:
+    """Copia un JPEG sin decodificarlo, omitiendo los segmentos de _JPEG_DROP."""
+    data = _read_bytes(src)
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("no es un JPEG")
+    out = [b"\xff\xd8"]
+    i = 2
+    n = len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            raise ValueError("JPEG corrupto")
+        marker = data[i + 1]
+        if marker == 0xFF:          # relleno entre segmentos
+            i += 1
+            continue
+        if marker == 0xDA:          # SOS: el resto es el scan comprimido (+ EOI)
+            out.append(data[i:])
+            return b"".join(out)
+        seg_len = int.from_bytes(data[i + 2:i + 4], "big")
+        end = i + 2 + seg_len
+        if marker not in _JPEG_DROP:
+            out.append(data[i:end])
+        i = end
+    raise ValueError("JPEG sin scan")
+
+def _can_passthrough_jpeg(im: Image.Image, target: str, resize, quality: Optional[int]) -> bool:
+    if im.format != "JPEG" or target not in ("jpg", "jpeg"):
+        return False
+    if _resize_target(im.size, resize):
+        return False
+    if quality is not None and int(quality) < JPEG_PASSTHROUGH_MIN_QUALITY:
+        return False
+    # con Orientation != 1 hay que rotar píxeles: no se puede sin decodificar
+    return im.getexif().get(0x0112, 1) in (0, 1)
+
+def _jpeg_passthrough(im: Image.Image, src: Source, target: str, resize, quality: Optional[int]) -> Optional[bytes]:
+    """El JPEG tal cual sin sus metadatos si _can_passthrough_jpeg; None si no (o si es un JPEG raro)."""
+    if not _can_passthrough_jpeg(im, target, resize, quality):
+        return None
+    try:
+        with stage("passthrough"):
+            return _strip_jpeg_segments(src)
+    except ValueError:
+        return None  # JPEG raro: que siga por el camino normal
+
+def jpeg_passthrough(src: Source, target: str, quality: Optional[int] = None,
+                     resize: Optional[Tuple[int, int]] = None, strip: bool = False) -> Optional[bytes]:
+    """
+    Lo que convert_image devuelve sin re-encodear (JPEG -> JPEG con strip, sin
+    resize y calidad >= JPEG_PASSTHROUGH_MIN_QUALITY), o None. Ahí no pesan ni
+    la calidad ni el perfil: main.py lo usa para avisarlo con X-Passthrough.
+    Solo lee el header y los segmentos, sin decodificar.
+    """
+    if not strip:
+        return None
+    im = _open_image(src)
+    try:
+        return _jpeg_passthrough(im, src, target, resize, quality)
+    finally:
+        im.close()
+
 def convert_image(
-    file_bytes: bytes,
+    src: Source,
     src_ext: str,
     target: str,
     quality: Optional[int] = None,
     resize: Optional[Tuple[int, int]] = None,
-    strip: bool = False
+    strip: bool = False,
+    max_pixels: Optional[int] = None,
+    profile: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+    max_frames: Optional[int] = None
 ) -> Tuple[bytes, str]:
     """
     Conversión simple y genérica de imágenes:
+    - src: ruta al archivo de entrada (o bytes).
     - Abre cualquier formato que soporte PIL (SUPPORTED_FROM).
     - target puede ser: jpg/jpeg/png/webp/tiff/bmp/gif/pdf o cualquier otro que PIL pueda guardar.
     - quality afecta JPG/WEBP (y algunos otros si PIL lo respeta).
     - resize=(w,h) con cualquiera en 0 para mantener proporción.
-    - strip elimina metadatos EXIF básicos.
+    - strip elimina metadatos (EXIF/XMP/ICC/texto) sin tocar píxeles; JPEG->JPEG
+      sin resize ni rotación se copia sin re-encodear.
+    - max_pixels: presupuesto de decodificación (ver engines/probe.py).
+    - profile: esfuerzo del encoder, uno de PROFILES (None = DEFAULT_PROFILE).
+    - max_bytes: solo JPG/WEBP, la mejor calidad que entre (ver convert_image_fit).
+    - Desde BAND_MIN_PIXELS decodificados se procesa por franjas (ver convert_image_bands).
+    - Un origen animado o multipágina hacia FRAME_TARGETS convierte todos los
+      frames, de a uno (ver convert_frames); max_frames es el tope. Hacia el
+      resto de los formatos sale el primer frame.
     Devuelve: (bytes_salida, mime).
     """
+    if max_bytes:
+        data, mime, _ = convert_image_fit(src, src_ext, target, max_bytes, quality, resize, strip,
+                                          max_pixels, profile)
+        return data, mime
     target = (target or "").lower()
+    effort = encoder_settings(target, profile)
     if target not in SUPPORTED_TO:
         # No abortamos: intentamos igual y dejamos que PIL decida (alguno builds soportan AVIF/HEIC)
         SUPPORTED_TO.add(target)
 
-    # Abrir imagen y corregir orientación EXIF
-    im = Image.open(BytesIO(file_bytes))
-    im = ImageOps.exif_transpose(im)
-
-    # Resize opcional
-    im = _apply_resize(im, resize)
-
     # ===== PDF =====
+    # JPEG/PNG se embeben sin decodificar cuando se puede; el resto se aplana a RGB
     if target == "pdf":
-        # PDF no soporta alfa; aplanamos a RGB
-        im_pdf = _flatten_to_rgb(im, bg=(255, 255, 255))
-        out = BytesIO()
-        # Si hay multi-frame y quisieras varias páginas, tendrías que iterar frames (fuera de alcance “simple”)
-        im_pdf.save(out, format="PDF", optimize=True)
-        return out.getvalue(), _mime_of_target("pdf")
+        return image_to_pdf(src, resize, max_pixels, max_frames), mime_of_target("pdf")
 
+    # Abrir imagen (solo header) y corregir orientación EXIF
+    im = _open_image(src)
+    if target in FRAME_TARGETS and frame_count(im) > 1:
+        return convert_frames(im, target, quality, resize, strip, max_pixels, effort, max_frames), \
+            mime_of_target(target)
+    data = _jpeg_passthrough(im, src, target, resize, quality) if strip else None
+    if data is not None:
+        return data, mime_of_target(target)
+    with stage("decode"):
+        _plan_decode(im, resize, max_pixels)
+    if _use_bands(im, target, resize):
+        return convert_image_bands(im, src, target, quality, resize, strip, effort), mime_of_target(target)
+    im = _prepare(im, resize)
+    return _encode_image(im, target, quality, strip, effort), mime_of_target(target)
+
+def _save_quality(quality: Optional[int]) -> int:
+    return int(quality) if (quality is not None and str(quality).isdigit()) else 90
+
+def _encode_image(im: Image.Image, t: str, quality: Optional[int], strip: bool, effort: dict) -> bytes:
+    """Encodea una imagen ya decodificada/orientada al formato `t` (save_params de encoder_settings)."""
     # ===== Imagen =====
     # Normalizamos modo según destino
-    t = target
     fmt = _fmt_of_ext(f".{t}")
 
-    save_params = {}
+    save_params = dict(effort)
     out = BytesIO()
 
     # Manejo de modos: JPG/WEBP suelen requerir RGB sin alfa
     if t in ("jpg", "jpeg", "webp"):
-        im = _flatten_to_rgb(im)
+        with stage("encode"):
+            im = _flatten_to_rgb(im)
 
     # Quality
-    q = int(quality) if (quality is not None and str(quality).isdigit()) else 90
+    q = _save_quality(quality)
     if t in ("jpg", "jpeg"):
-        save_params.update({"quality": q, "subsampling": 2, "optimize": True})
+        save_params.update({"quality": q, "subsampling": 2})
     elif t == "webp":
         # algunos builds soportan lossless=True si querés usar q=100 → simple: calidad fija
-        save_params.update({"quality": q, "method": 6})
+        save_params.update({"quality": q})
 
-    # PNG: compresión por defecto; TIFF/BMP/GIF sin parámetros especiales para mantenerlo simple
-    # Strip metadata: recrear imagen sin EXIF/APP chunks cuando es posible
+    # PNG: nivel de zlib según el perfil; TIFF/BMP/GIF sin parámetros especiales para mantenerlo simple
     if strip:
+        _strip_metadata(im, save_params)
+
+    # Guardar
+    with stage("encode"):
         try:
-            # Forzar recreación sin info extra
-            data_only = Image.new(im.mode, im.size)
-            data_only.putdata(list(im.getdata()))
-            im = data_only
+            im.save(out, format=fmt, **save_params)
         except Exception:
-            # fallback: intentar limpiar exif del info si existe
-            im.info.pop("exif", None)
+            # Fallback: intentar con formato por defecto de PIL
+            fallback_fmt = "JPEG" if t in ("jpg", "jpeg") else (fmt or "PNG")
+            if fallback_fmt in ("JPEG",) and im.mode not in ("RGB",):
+                im = _flatten_to_rgb(im)
+            im.save(out, format=fallback_fmt, **save_params)
 
-    # Guardar
+    return out.getvalue()
+
+# ===== Imágenes muy grandes: por franjas (engines/bands.py) =====
+# Desde cuántos píxeles (ya con el draft de JPEG) conviene: debajo, el camino
+# de siempre es igual de rápido y la memoria no es problema
+BAND_MIN_PIXELS = 32_000_000
+# Tamaño de una franja de origen (contando 4 bytes por píxel): acota el pico de memoria
+BAND_BYTES = 16 * 1024 * 1024
+_BAND_MODES = {"1", "L", "LA", "P", "RGB", "RGBA", "CMYK"}
+
+def _use_bands(im: Image.Image, target: str, resize: Optional[Tuple[int, int]]) -> bool:
+    if im.width * im.height < BAND_MIN_PIXELS or im.mode not in _BAND_MODES or target == "pdf":
+        return False
+    # P y 1 bit Pillow los achica con NEAREST (y ocupan 1 byte por píxel o menos)
+    if im.mode in ("P", "1") and _resize_target(im.size, resize):
+        return False
+    # una orientación EXIF que rota necesita columnas enteras: esas van por el camino normal
+    return _orientation(im) == 1
+
+def _band_out_mode(mode: str, t: str) -> str:
+    """Modo que recibe el writer/encoder: el de _encode_image para ese destino."""
+    if t in ("jpg", "jpeg", "webp"):
+        return "RGB" if mode in ("RGBA", "LA", "P", "CMYK") else mode
+    if t == "png" and mode == "CMYK":
+        return "RGB"
+    return mode
+
+def _raw_palette(im: Image.Image) -> bytes:
+    """Paleta RGB de una imagen sin load() (getpalette() decodifica la imagen entera)."""
+    pal = Image.new("P", (1, 1))
+    pal.putpalette(im.palette.palette, im.palette.rawmode or im.palette.mode)
+    return bytes(pal.getpalette())
+
+class _BandCanvas:
+    """Para los encoders que necesitan la imagen entera: una sola, del tamaño de salida."""
+    def __init__(self, size: Tuple[int, int], mode: str):
+        self.im = Image.new(mode, size)
+        self._y = 0
+
+    def write(self, band: Image.Image):
+        self.im.paste(band, (0, self._y))
+        self._y += band.height
+
+def convert_image_bands(
+    im: Image.Image,
+    src: Source,
+    target: str,
+    quality: Optional[int] = None,
+    resize: Optional[Tuple[int, int]] = None,
+    strip: bool = False,
+    effort: Optional[dict] = None
+) -> bytes:
+    """
+    convert_image por franjas horizontales para imágenes grandes (abiertas, sin
+    load()): decode, resize, aplanado y encode de a BAND_BYTES, sin copias de
+    tamaño completo. PNG y TIFF se escriben de a franja; JPEG, WEBP y el resto
+    necesitan la imagen entera en el encoder, así que se arma una sola, ya del
+    tamaño de salida.
+    """
+    t = target.lower()
+    size = _resize_target(im.size, resize) or im.size
+    mode = im.mode
+    out_mode = _band_out_mode(mode, t)
+    rows = max(16, BAND_BYTES // (4 * im.width))
+    resizer = BandResizer(im.size, size, mode, rows) if size != im.size else None
+    icc = None if strip else im.info.get("icc_profile")
+    palette = _raw_palette(im) if out_mode == "P" else None
+    out = BytesIO()
+    if t == "png":
+        sink = PngBandWriter(out, size, out_mode, (effort or {}).get("compress_level", 6), icc,
+                             palette, im.info.get("transparency"))
+    elif t in ("tif", "tiff") and out_mode != "P" and (strip or im.info.get("compression") in (None, "raw")):
+        # comprimido (LZW, JPEG...) lo guarda _encode_image con la compresión de origen
+        sink = TiffBandWriter(out, size, out_mode, icc)
+    else:
+        sink = _BandCanvas(size, out_mode)
+        if palette:
+            sink.im.putpalette(palette)
+
+    def put(bands: List[Image.Image]):
+        with stage("encode"):
+            for band in bands:
+                if t in ("jpg", "jpeg", "webp"):
+                    band = _flatten_to_rgb(band)
+                sink.write(band if band.mode == out_mode else band.convert(out_mode))
+
+    reader = read_bands(im, src, rows)
+    while True:
+        with stage("decode"):
+            band = next(reader, None)
+            if band is not None and band.mode != mode:
+                band = band.convert(mode)
+        if band is None:
+            break
+        if resizer is None:
+            put([band])
+            continue
+        with stage("resize"):
+            done = list(resizer.feed(band))
+        put(done)
+    if resizer is not None:
+        with stage("resize"):
+            done = list(resizer.finish())
+        put(done)
+
+    if isinstance(sink, _BandCanvas):
+        sink.im.info = dict(im.info)
+        return _encode_image(sink.im, t, quality, strip, effort or {})
+    with stage("encode"):
+        sink.close()
+    return out.getvalue()
+
+# ===== Varias salidas con un decode (variantes) =====
+# Salida pedida: (target, resize (w, h) o None, quality)
+OutputSpec = Tuple[str, Optional[Tuple[int, int]], Optional[int]]
+
+def _same_aspect(a: Tuple[int, int], b: Tuple[int, int]) -> bool:
+    # tolerancia de un píxel de redondeo en cualquiera de los dos ejes
+    return abs(a[0] * b[1] - a[1] * b[0]) <= max(a[0], a[1], b[0], b[1])
+
+def convert_image_many(
+    src: Source,
+    src_ext: str,
+    outputs: List[OutputSpec],
+    strip: bool = False,
+    max_pixels: Optional[int] = None,
+    profile: Optional[str] = None,
+    threads: int = ENCODE_THREADS
+) -> List[Tuple[bytes, str, Tuple[int, int]]]:
+    """
+    Un decode, N salidas (JPG + WEBP, un srcset de varios anchos...):
+    - decodifica y orienta una sola vez, con draft al tamaño de la salida más grande
+    - cada tamaño sale del intermedio más chico que lo cubre y tiene la misma
+      proporción (no del original): 3000 -> 1600 -> 800 -> 400
+    - las salidas se encodean en paralelo en un pool de `threads` hilos
+    Devuelve [(bytes, mime, (w, h))] en el orden de `outputs`.
+    """
+    specs = []
+    for target, resize, quality in outputs:
+        t = (target or "").lower()
+        if t == "pdf":
+            raise ValueError("las variantes no pueden ser PDF")
+        specs.append((t, resize, quality, encoder_settings(t, profile)))
+
+    im = _open_image(src)
+    shown = (im.height, im.width) if _orientation(im) in _SWAPS_AXES else im.size
+    finals = [_resize_target(shown, resize) for _, resize, _, _ in specs]
+    # draft para la más grande; si alguna va en tamaño original, nada de draft por resize
+    biggest = None if any(f is None for f in finals) else max(finals, key=lambda f: f[0] * f[1])
+    with stage("decode"):
+        _plan_decode(im, biggest, max_pixels)
+    im = _prepare(im, None)
+
+    # de mayor a menor, así cada tamaño tiene disponible el intermedio anterior
+    made = {im.size: im}
+    with stage("resize"):
+        for size in sorted({f for f in finals if f}, key=lambda f: -(f[0] * f[1])):
+            if size in made:
+                continue
+            covering = [p for p in made.values() if p.width >= size[0] and p.height >= size[1]
+                        and (p is im or _same_aspect(p.size, size))]
+            parent = min(covering, key=lambda p: p.width * p.height) if covering else im
+            made[size] = parent.resize(size, Image.LANCZOS, reducing_gap=2.0)
+
+    # cada encode con su objeto Image (save() y strip escriben en él): el
+    # primero que usa un tamaño se lleva el de `made`, los demás una copia,
+    # todas hechas antes de arrancar (nadie copia una que otro está modificando)
+    jobs, keys, used = {}, [], set()     # la misma salida pedida dos veces se encodea una
+    for (t, _, quality, effort), final in zip(specs, finals):
+        px = made[final] if final else im
+        k = (t, px.size, quality)
+        if k not in jobs:
+            jobs[k] = (px.copy() if px.size in used else px, t, quality, strip, effort)
+            used.add(px.size)
+        keys.append(k)
+    with ThreadPoolExecutor(max(1, threads)) as pool:
+        same = {k: pool.submit(_encode_image, *args) for k, args in jobs.items()}
+        futures = [same[k] for k in keys]
+        out = []
+        for (t, _, _, _), final, fut in zip(specs, finals, futures):
+            px = made[final] if final else im
+            out.append((fut.result(), mime_of_target(t), px.size))
+    return out
+
+# ===== Tamaño objetivo (max_bytes) =====
+FIT_TARGETS = {"jpg", "jpeg", "webp"}
+# Piso de calidad: por debajo se achica la imagen en vez de seguir bajando
+FIT_MIN_QUALITY = 30
+FIT_MAX_DOWNSCALES = 4
+
+
+class SizeNotReached(ValueError):
+    """Ni a FIT_MIN_QUALITY y achicando FIT_MAX_DOWNSCALES veces entra en max_bytes."""
+
+
+@dataclass(frozen=True)
+class SizeFit:
+    quality: Optional[int]      # None: el original ya entraba (passthrough JPEG)
+    encodes: int                # encodes de prueba en total
+    rounds: int                 # rondas de encodes en paralelo
+    size: Tuple[int, int]       # dimensiones de la salida
+    scaled: bool                # hubo que achicar
+
+
+def _encode_at(im: Image.Image, fmt: str, params: dict, q: int) -> bytes:
+    # save() guarda encoderinfo en la imagen: cada encode de prueba usa su
+    # propia copia (a lo sumo una por hilo a la vez) y `im` queda sin tocar
+    out = BytesIO()
+    im.copy().save(out, format=fmt, quality=q, **params)
+    return out.getvalue()
+
+
+def _fit_qualities(lo: int, hi: int, n: int, first: bool) -> List[int]:
+    """Calidades a probar en una ronda: n puntos repartidos en [lo, hi] (la primera incluye hi)."""
+    if first:
+        return sorted({hi} | set(_fit_qualities(lo, hi - 1, n - 1, False))) if n > 1 and hi > lo else [hi]
+    span = hi - lo + 1
+    return sorted({lo + span * (i + 1) // (n + 1) for i in range(n)})
+
+
+def _search_quality(pool, im: Image.Image, fmt: str, params: dict, max_bytes: int, lo: int, hi: int,
+                    threads: int):
+    """
+    Búsqueda k-aria de la calidad más alta que entra: cada ronda prueba hasta
+    `threads` calidades a la vez y se queda con el tramo entre la mejor que
+    entró y la siguiente que no. Con threads=1 es una búsqueda binaria.
+    Devuelve (calidad, bytes, encodes, rondas, tamaño más chico visto).
+    """
+    best_q, best, encodes, rounds, smallest = None, None, 0, 0, None
+    while lo <= hi:
+        qs = _fit_qualities(lo, hi, threads, rounds == 0)
+        outs = list(pool.map(lambda q: _encode_at(im, fmt, params, q), qs))
+        encodes += len(qs)
+        rounds += 1
+        smallest = min([smallest or len(outs[0])] + [len(o) for o in outs])
+        fits = [(q, o) for q, o in zip(qs, outs) if len(o) <= max_bytes]
+        if fits:
+            best_q, best = fits[-1]
+            above = [q for q in qs if q > best_q]
+            lo, hi = best_q + 1, (above[0] - 1 if above else hi)
+        else:
+            hi = qs[0] - 1
+    return best_q, best, encodes, rounds, smallest
+
+
+def convert_image_fit(
+    src: Source,
+    src_ext: str,
+    target: str,
+    max_bytes: int,
+    quality: Optional[int] = None,
+    resize: Optional[Tuple[int, int]] = None,
+    strip: bool = False,
+    max_pixels: Optional[int] = None,
+    profile: Optional[str] = None,
+    threads: int = ENCODE_THREADS
+) -> Tuple[bytes, str, SizeFit]:
+    """
+    JPG/WEBP con la calidad más alta (<= quality, >= FIT_MIN_QUALITY) cuyo
+    archivo entre en max_bytes. Decodifica una vez y busca la calidad con
+    encodes de prueba en paralelo; si ni el piso entra, achica la imagen según
+    lo que faltó y vuelve a buscar. Devuelve (bytes, mime, SizeFit);
+    SizeNotReached si no hay forma.
+    """
+    t = (target or "").lower()
+    if t not in FIT_TARGETS:
+        raise ValueError(f"max_bytes solo aplica a {', '.join(sorted(FIT_TARGETS))}")
+    params = encoder_settings(t, profile)
+    hi = max(FIT_MIN_QUALITY, min(int(quality) if quality else 90, 95 if t != "webp" else 100))
+
+    im = _open_image(src)
+    data = _jpeg_passthrough(im, src, t, resize, quality) if strip else None
+    if data is not None and len(data) <= max_bytes:
+        return data, mime_of_target(t), SizeFit(None, 0, 0, im.size, False)
+    with stage("decode"):
+        _plan_decode(im, resize, max_pixels)
+    im = _prepare(im, resize)
+    with stage("resize"):
+        im = _flatten_to_rgb(im)
+    if t == "jpg" or t == "jpeg":
+        params["subsampling"] = 2
+    if strip:
+        _strip_metadata(im, params)
+
+    fmt = _fmt_of_ext(f".{t}")
+    encodes = rounds = 0
+    with stage("encode"), ThreadPoolExecutor(max(1, threads)) as pool:
+        for step in range(FIT_MAX_DOWNSCALES + 1):
+            q, data, n, r, smallest = _search_quality(pool, im, fmt, params, max_bytes,
+                                                      FIT_MIN_QUALITY, hi, max(1, threads))
+            encodes, rounds = encodes + n, rounds + r
+            if q is not None:
+                return data, mime_of_target(t), SizeFit(q, encodes, rounds, im.size, step > 0)
+            if step == FIT_MAX_DOWNSCALES:
+                break
+            # los bytes escalan más o menos con los píxeles: achicamos por lo que faltó, con margen
+            k = math.sqrt(max_bytes / smallest) * 0.9
+            size = (max(1, int(im.width * k)), max(1, int(im.height * k)))
+            if size[0] < 16 or size[1] < 16:
+                break
+            with stage("resize"):
+                im = im.resize(size, Image.LANCZOS, reducing_gap=2.0)
+    raise SizeNotReached(f"ni achicando entra en {max_bytes} bytes")
+
+# ===== Animaciones y TIFF multipágina (de a un frame) =====
+# Destinos que guardan varios frames: con un origen animado (GIF/WEBP/APNG) o
+# multipágina (TIFF) se convierten todos, no solo el primero
+FRAME_TARGETS = {"gif", "webp", "tif", "tiff", "pdf"}
+# Duración por frame (ms) si el origen no trae (TIFF -> GIF/WEBP)
+FRAME_DEFAULT_DURATION = 100
+# Modos que pasan tal cual; el resto (P, I;16...) va a RGB/RGBA
+_FRAME_MODES = {"1", "L", "LA", "RGB", "RGBA", "CMYK"}
+def iter_frames(
+    im: Image.Image,
+    resize: Optional[Tuple[int, int]] = None,
+    max_pixels: Optional[int] = None,
+    max_frames: Optional[int] = None
+) -> Iterator[Tuple[Image.Image, int]]:
+    """
+    Recorre los frames de `im` en orden: (frame orientado y con resize, duración en ms).
+    Cada frame es una copia propia que se puede soltar apenas se encodea: en
+    memoria quedan el del decoder y el que se está escribiendo, no la animación.
+    OverBudget si hay más de max_frames, o si un frame se pasa de max_pixels
+    (las páginas de un TIFF no tienen por qué medir lo mismo que la primera).
+    """
+    n = frame_count(im)
+    if max_frames and n > max_frames:
+        raise OverBudget(f"{n} frames supera el máximo de {max_frames}", n, max_frames)
+    orientation = _orientation(im)
+    for i in range(n):
+        with stage("decode"):
+            im.seek(i)
+            if max_pixels and im.width * im.height > max_pixels:
+                raise OverBudget(f"el frame {i + 1} ({im.width}x{im.height}) supera el máximo de "
+                                 f"{max_pixels / 1e6:.0f} MP", im.width * im.height, max_pixels)
+            frame = im
+            if im.mode not in _FRAME_MODES:
+                frame = im.convert("RGBA" if im.has_transparency_data else "RGB")
+        with stage("resize"):
+            frame = _apply_resize(frame, resize, orientation)
+        if frame is im:
+            # el próximo seek() pisa los píxeles del decoder
+            with stage("decode"):
+                frame = im.copy()
+        duration = im.info.get("duration")
+        yield frame, int(duration) if duration is not None else FRAME_DEFAULT_DURATION
+
+class _FrameSequence(Image.Image):
+    """
+    Los frames que siguen al primero, como una imagen multiframe para
+    save(save_all=True, append_images=[...]) de WEBP: no hay otra forma
+    pública de darle frames de a uno a su encoder (un generador en
+    append_images lo pasa a lista, y los frames son Image ya decodificadas).
+    Se apoya en lo que Pillow documenta para append_images con imágenes
+    multiframe (n_frames, y seek(0), seek(1)... antes de leer cada frame) y
+    en lo que documenta para plugins (_mode/_size); tests/test_frames.py lo
+    fija para la versión de requirements.txt. Solo avanza: cada seek trae el
+    próximo frame del iterador. `durations` recibe la duración de cada frame a
+    medida que llega (el writer la lee recién después de agregar el frame).
+    """
+    def __init__(self, frames: Iterator[Tuple[Image.Image, int]], n: int, durations: List[int],
+                 strip: bool = False):
+        super().__init__()
+        self._frames = frames
+        self._durations = durations
+        self._strip = strip
+        self._pos = -1
+        self.n_frames = n
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, frame: int) -> None:
+        if frame == self._pos:
+            return
+        if frame != self._pos + 1:
+            raise EOFError("los frames solo se recorren hacia adelante")
+        cur, duration = next(self._frames)
+        self.im = cur.im
+        self._mode = cur.mode
+        self._size = cur.size
+        self.info = {k: v for k, v in cur.info.items() if k in _KEEP_INFO} if self._strip else cur.info
+        self._durations.append(duration)
+        self._pos = frame
+
+def _gif_frame(frame: Image.Image) -> Tuple[Image.Image, Optional[int]]:
+    """Frame -> P con paleta propia de 255 colores; el índice 255 queda para lo transparente."""
+    if frame.mode not in ("RGB", "RGBA"):
+        frame = frame.convert("RGBA" if frame.has_transparency_data else "RGB")
+    alpha = frame.getchannel("A") if frame.mode == "RGBA" else None
+    p = frame.convert("RGB").quantize(255)
+    if alpha is not None and alpha.getextrema()[0] < 128:
+        p.paste(255, mask=alpha.point(lambda a: 255 if a < 128 else 0))
+        return p, 255
+    return p, None
+
+def _write_gif(out: BytesIO, first: Image.Image, first_duration: int,
+               rest: Iterator[Tuple[Image.Image, int]], loop: Optional[int]):
+    """
+    GIF animado frame por frame (el writer de Pillow junta todos los frames
+    antes de escribir). Cada frame lleva su paleta local. Los opacos solo
+    escriben el rectángulo que cambió respecto del anterior (disposal 1:
+    el resto queda); los que tienen transparencia van enteros con disposal 2.
+    """
+    prev = None
+    for i, (frame, duration) in enumerate(itertools.chain([(first, first_duration)], rest)):
+        with stage("encode"):
+            p, transparency = _gif_frame(frame)
+            if i == 0:
+                info = {"duration": duration} if loop is None else {"duration": duration, "loop": loop}
+                out.write(b"".join(GifImagePlugin.getheader(p.copy(), None, info)[0]))
+            box = (0, 0) + frame.size
+            if transparency is None and prev is not None and prev.size == frame.size:
+                # idéntico al anterior: un píxel, para conservar la duración
+                box = ImageChops.difference(prev, frame.convert("RGB")).getbbox() or (0, 0, 1, 1)
+                p = p.crop(box)
+            params = {"duration": duration, "disposal": 2 if transparency is not None else 1,
+                      "include_color_table": True}
+            if transparency is not None:
+                params["transparency"] = transparency
+            out.write(b"".join(GifImagePlugin.getdata(p, box[:2], **params)))
+            prev = frame.convert("RGB") if transparency is None else None
+    out.write(b";")
+
+def convert_frames(
+    im: Image.Image,
+    target: str,
+    quality: Optional[int] = None,
+    resize: Optional[Tuple[int, int]] = None,
+    strip: bool = False,
+    max_pixels: Optional[int] = None,
+    effort: Optional[dict] = None,
+    max_frames: Optional[int] = None
+) -> bytes:
+    """
+    Animación / multipágina abierta (solo header) -> WEBP o GIF animado, o TIFF
+    multipágina, decodificando y encodeando de a un frame (ver iter_frames).
+    """
+    t = target.lower()
+    n = frame_count(im)
+    loop = im.info.get("loop")
+    frames = iter_frames(im, resize, max_pixels, max_frames)
+    first, first_duration = next(frames)
+    out = BytesIO()
+    if t == "gif":
+        _write_gif(out, first, first_duration, frames, loop)
+        return out.getvalue()
+
+    save_params = dict(effort or {})
+    if t in ("tif", "tiff"):
+        # una página por frame con el mismo writer que usa save_all
+        with stage("encode"), TiffImagePlugin.AppendingTiffWriter(out) as tf:
+            for frame, _ in itertools.chain([(first, first_duration)], frames):
+                if strip:
+                    _strip_metadata(frame, save_params)
+                frame.save(tf, format="TIFF", **save_params)
+                tf.newFrame()
+        return out.getvalue()
+
+    durations = [first_duration]
+    if first.mode not in ("RGB", "RGBA"):
+        first = first.convert("RGBA" if first.has_transparency_data else "RGB")
+    # GIF sin bloque NETSCAPE se reproduce una vez; en WEBP loop=0 es infinito
+    save_params.update({"quality": _save_quality(quality), "duration": durations,
+                        "loop": 1 if loop is None else loop})
+    if strip:
+        _strip_metadata(first, save_params)
+    rest = _FrameSequence(frames, n - 1, durations, strip)
+    with stage("encode"):
+        first.save(out, format="WEBP", save_all=True, append_images=[rest], **save_params)
+    if rest.tell() != n - 2:
+        # un Pillow que ya no recorre append_images con seek(): mejor fallar que perder frames
+        raise RuntimeError(f"el writer WEBP tomó {rest.tell() + 2} de {n} frames")
+    return out.getvalue()
+
+# ===== Imágenes -> PDF (engines/pdf_writer.py) =====
+# JPEG que se embebe tal cual como DCTDecode: modos que el PDF entiende sin
+# transformar (CMYK/YCCK de Adobe suelen venir invertidos: esos se decodifican)
+_PDF_JPEG_COLORSPACE = {"L": "DeviceGray", "RGB": "DeviceRGB"}
+# Para las que sí hay que decodificar: mismo default que el writer PDF de Pillow
+PDF_REENCODE_QUALITY = 75
+# Orígenes con pérdida: si hay que decodificarlos se re-encodean como JPEG; el
+# resto (PNG, GIF, BMP, TIFF...) va sin pérdida como PNG/Flate
+_LOSSY_FORMATS = {"JPEG", "MPO", "WEBP", "HEIF", "AVIF", "JPEG2000"}
+
+_PNG_SIG = b"\x89PNG\r\n\x1a\n"
+
+def _png_image_stream(src: Source) -> Optional[ImageStream]:
+    """
+    Los IDAT de un PNG son un stream zlib con los predictores PNG: el PDF los
+    lee tal cual como FlateDecode + /Predictor 15. Solo para gris/RGB de 8 bits
+    o paleta, sin alfa, sin tRNS y no entrelazados; si no, None.
+    """
+    data = _read_bytes(src)
+    if data[:8] != _PNG_SIG:
+        return None
+    ihdr, plte, idat = None, None, []
+    pos, n = 8, len(data)
+    while pos + 8 <= n:
+        length = int.from_bytes(data[pos:pos + 4], "big")
+        ctype = data[pos + 4:pos + 8]
+        body = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if ctype == b"IHDR":
+            ihdr = body
+        elif ctype == b"PLTE":
+            plte = body
+        elif ctype == b"IDAT":
+            idat.append(body)
+        elif ctype in (b"tRNS", b"acTL"):   # transparencia o APNG: hay que decodificar
+            return None
+        elif ctype == b"IEND":
+            break
+    if not ihdr or len(ihdr) < 13 or not idat:
+        return None
+    w = int.from_bytes(ihdr[0:4], "big")
+    h = int.from_bytes(ihdr[4:8], "big")
+    bits, color_type, interlace = ihdr[8], ihdr[9], ihdr[12]
+    if interlace:
+        return None
+    if color_type == 0 and bits in (1, 2, 4, 8):
+        cs, colors = "DeviceGray", 1
+    elif color_type == 2 and bits == 8:
+        cs, colors = "DeviceRGB", 3
+    elif color_type == 3 and plte:
+        cs, colors = f"[/Indexed /DeviceRGB {len(plte) // 3 - 1} <{plte.hex()}>]", 1
+    else:
+        return None
+    parms = f"<< /Predictor 15 /Colors {colors} /BitsPerComponent {bits} /Columns {w} >>"
+    return ImageStream(w, h, cs, "FlateDecode", b"".join(idat), bits=bits, decode_parms=parms)
+
+def _pdf_image_stream(src: Source, resize: Optional[Tuple[int, int]] = None,
+                      max_pixels: Optional[int] = None) -> ImageStream:
+    """Stream de imagen para una página PDF; decodifica solo si no hay otra."""
+    im = _open_image(src)
     try:
-        im.save(out, format=fmt, **save_params)
-    except Exception:
-        # Fallback: intentar con formato por defecto de PIL
-        fallback_fmt = "JPEG" if t in ("jpg", "jpeg") else (fmt or "PNG")
-        if fallback_fmt in ("JPEG",) and im.mode not in ("RGB",):
-            im = _flatten_to_rgb(im)
-        im.save(out, format=fallback_fmt, **save_params)
+        # sobre el presupuesto no se embebe tal cual: el visor tendría que decodificarlo entero
+        fits = not max_pixels or plan_image(im, max_pixels, resize).scale == 1
+        untouched = fits and not _resize_target(im.size, resize) and _orientation(im) == 1
+        if untouched and im.format == "JPEG" and im.mode in _PDF_JPEG_COLORSPACE:
+            try:
+                # sin los segmentos de metadatos (EXIF/GPS no terminan dentro del PDF)
+                with stage("passthrough"):
+                    return ImageStream(im.width, im.height, _PDF_JPEG_COLORSPACE[im.mode],
+                                       "DCTDecode", _strip_jpeg_segments(src))
+            except ValueError:
+                pass  # JPEG raro: decodificamos
+        if untouched and im.format == "PNG":
+            with stage("passthrough"):
+                stream = _png_image_stream(src)
+            if stream is not None:
+                return stream
+        lossy = im.format in _LOSSY_FORMATS
+        with stage("decode"):
+            _plan_decode(im, resize, max_pixels)
+        return _encode_pdf_pixels(_prepare(im, resize), lossy)
+    finally:
+        im.close()
+
+def _encode_pdf_pixels(px: Image.Image, lossy: bool) -> ImageStream:
+    """Píxeles ya decodificados -> stream: PNG/Flate sin pérdida, o JPEG si el origen ya perdía."""
+    with stage("encode"):
+        px = _flatten_to_rgb(px)
+        if px.mode not in ("RGB", "L"):
+            px = px.convert("RGB")
+        out = BytesIO()
+        if not lossy:
+            px.save(out, format="PNG", compress_level=6)
+            stream = _png_image_stream(out.getvalue())
+            if stream is not None:
+                return stream
+            out = BytesIO()
+        px.save(out, format="JPEG", quality=PDF_REENCODE_QUALITY)
+        return ImageStream(px.width, px.height, _PDF_JPEG_COLORSPACE[px.mode], "DCTDecode", out.getvalue())
+
+def _pdf_image_streams(src: Source, resize: Optional[Tuple[int, int]] = None,
+                       max_pixels: Optional[int] = None,
+                       max_frames: Optional[int] = None) -> Iterator[ImageStream]:
+    """Una página por frame (TIFF multipágina, animaciones), de a una; si hay un solo frame, _pdf_image_stream."""
+    im = _open_image(src)
+    try:
+        n = frame_count(im)
+        if n > 1:
+            lossy = im.format in _LOSSY_FORMATS
+            for frame, _ in iter_frames(im, resize, max_pixels, max_frames):
+                yield _encode_pdf_pixels(frame, lossy)
+    finally:
+        im.close()
+    if n == 1:
+        yield _pdf_image_stream(src, resize, max_pixels)
+
+def image_to_pdf(src: Source, resize: Optional[Tuple[int, int]] = None,
+                 max_pixels: Optional[int] = None, max_frames: Optional[int] = None) -> bytes:
+    """Una imagen -> PDF, una página por frame (ver _pdf_image_streams)."""
+    out = BytesIO()
+    w = PdfWriter(out)
+    for stream in _pdf_image_streams(src, resize, max_pixels, max_frames):
+        w.add_image_page(stream)
+    w.close()
+    return out.getvalue()
 
-    return out.getvalue(), _mime_of_target(t)
+def images_to_pdf(
+    images: List[Source],
+    out_path: str,
+    resize: Optional[Tuple[int, int]] = None,
+    max_pixels: Optional[int] = None,
+    max_frames: Optional[int] = None
+) -> str:
+    """
+    Arma un único PDF (una página por imagen, o por frame si es multipágina) en out_path.
+    Pensado para correr en un worker del scheduler: recibe rutas y devuelve out_path.
+    Las páginas se escriben al archivo de a una, así que en memoria hay como
+    mucho una imagen; los JPEG se embeben sin decodificar.
+    """
+    if not images:
+        raise ValueError("sin imágenes")
+    try:
+        with open(out_path, "wb") as f:
+            w = PdfWriter(f)
+            for src in images:
+                for stream in _pdf_image_streams(src, resize, max_pixels, max_frames):
+                    w.add_image_page(stream)
+            w.close()
+    except BaseException:
+        if os.path.exists(out_path):
+            os.remove(out_path)
+        raise
+    return out_path
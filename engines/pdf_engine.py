@@ -1,19 +1,92 @@
 from io import BytesIO
+import math
+from typing import Iterable, List, Optional, Tuple
+
+from engines.stages import stage
 
 try:
     import fitz  # PyMuPDF
 except Exception:
     fitz = None
 
+_MIME = {"jpg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+
+# Páginas por chunk al repartir entre procesos: chico para que el ZIP reciba
+# páginas apenas se terminan y la memoria quede acotada a pocos chunks
+PAGES_PER_CHUNK = 8
+
 def _ensure_pymupdf():
     if fitz is None:
         raise RuntimeError("PyMuPDF (fitz) no está instalado.")
 
-def pdf_to_images(pdf_bytes: bytes, image_ext: str = "jpg", dpi: int = 144, pages=None):
+def _open_pdf(src):
+    """Abre un PDF desde ruta (lo normal, sin copiarlo a memoria) o desde bytes."""
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=bytes(src), filetype="pdf")
+    return fitz.open(str(src))
+
+def page_count(src) -> int:
+    _ensure_pymupdf()
+    with stage("open"), _open_pdf(src) as doc:
+        return doc.page_count
+
+def resolve_pages(n: int, pages: Optional[Iterable[int]] = None) -> List[int]:
+    """Índices (base 0) válidos para un documento de n páginas; None => todas."""
+    if pages is None:
+        return list(range(n))
+    return sorted({int(i) for i in pages if 0 <= int(i) < n})
+
+def split_chunks(indices: List[int], size: int = PAGES_PER_CHUNK) -> List[List[int]]:
+    """Parte la lista de páginas en rangos contiguos de hasta `size` páginas."""
+    size = max(1, int(size))
+    return [indices[i:i + size] for i in range(0, len(indices), size)]
+
+def chunk_size(n_pages: int, workers: int) -> int:
+    """
+    Reparte parejo entre workers, sin pasar de PAGES_PER_CHUNK por chunk (también
+    con un solo worker: el ZIP avanza por chunk y el timeout es por chunk).
+    """
+    return max(1, min(PAGES_PER_CHUNK, math.ceil(n_pages / max(1, workers))))
+
+def page_name(idx: int, image_ext: str) -> str:
+    return f"page-{idx + 1:03d}.{image_ext}"
+
+def _normalize_ext(image_ext: str) -> str:
+    e = (image_ext or "jpg").lower().lstrip(".")
+    e = "jpg" if e == "jpeg" else e
+    if e not in _MIME:
+        raise ValueError(f"formato de página no soportado: {e}")
+    return e
+
+def _encode_pixmap(pix, image_ext: str, quality: int) -> bytes:
+    if image_ext == "png":
+        return pix.tobytes("png")
+    if image_ext == "jpg":
+        return pix.tobytes("jpeg", jpg_quality=quality)
+    # WEBP: PyMuPDF no lo escribe, pasamos por PIL sin copiar más de un buffer
+    from PIL import Image
+    im = Image.frombuffer("RGB", (pix.width, pix.height), pix.samples, "raw", "RGB", pix.stride, 1)
+    out = BytesIO()
+    im.save(out, format="WEBP", quality=quality, method=4)
+    return out.getvalue()
+
+def render_pages(src, indices: List[int], image_ext: str = "jpg", dpi: int = 144,
+                 quality: int = 90) -> List[Tuple[int, str, bytes]]:
     """
-    Devuelve (zip_bytes, 'application/zip', 'pages.zip') o (img_bytes, mime, filename)
-    según tu implementación actual. Ajustá a tu retorno real.
+    Rasteriza y codifica las páginas `indices` (base 0). Abre el documento por su
+    cuenta, así cada proceso del pool trabaja independiente.
+    Devuelve [(idx, nombre, bytes), ...].
     """
     _ensure_pymupdf()
-    # ... tu implementación existente usando fitz ...
-    # (no la repito porque ya la tenías; solo asegurate de llamar _ensure_pymupdf() antes)
\ No newline at end of file
+    image_ext = _normalize_ext(image_ext)
+    zoom = max(1, int(dpi)) / 72.0
+    mat = fitz.Matrix(zoom, zoom)
+    out = []
+    with _open_pdf(src) as doc:
+        for i in indices:
+            with stage("render"):
+                pix = doc.load_page(i).get_pixmap(matrix=mat, alpha=False)
+            with stage("encode"):
+                out.append((i, page_name(i, image_ext), _encode_pixmap(pix, image_ext, int(quality))))
+            pix = None
+    return out
@@ -0,0 +1,111 @@
+# pdf_writer.py
+"""
+Escritor de PDF incremental: una página por imagen, escrita al archivo apenas
+se agrega. Cada objeto va directo al disco y solo se guardan los offsets para
+la tabla xref del final, así que la memoria no depende de cuántas páginas haya.
+
+Las imágenes se embeben con el stream ya comprimido que reciba (un JPEG tal
+cual como DCTDecode, datos zlib como FlateDecode); decidir qué stream usar es
+cosa de image_engine.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import BinaryIO, List, Optional
+
+_HEADER = b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n"
+_CATALOG, _PAGES = 1, 2
+
+
+@dataclass
+class ImageStream:
+    """XObject de imagen listo para escribir (data ya comprimida con `filter`)."""
+    width: int
+    height: int
+    colorspace: str                  # "DeviceRGB" | "DeviceGray" | "[/Indexed ...]"
+    filter: str                      # "DCTDecode" | "FlateDecode"
+    data: bytes
+    bits: int = 8
+    decode_parms: Optional[str] = None   # p. ej. "<< /Predictor 15 /Colors 3 ... >>"
+    decode: Optional[str] = None         # p. ej. "[1 0 1 0 1 0 1 0]" para CMYK Adobe
+
+
+class PdfWriter:
+    """
+    with open(path, "wb") as f:
+        w = PdfWriter(f)
+        w.add_image_page(ImageStream(...))   # una vez por página
+        w.close()
+    """
+    def __init__(self, fp: BinaryIO):
+        self.fp = fp
+        self._offsets = {}
+        self._next_id = _PAGES + 1
+        self._kids: List[int] = []
+        self._pos = 0
+        self._write(_HEADER)
+
+    def _write(self, b: bytes):
+        self.fp.write(b)
+        self._pos += len(b)
+
+    def _new_id(self) -> int:
+        n = self._next_id
+        self._next_id += 1
+        return n
+
+    def _obj(self, num: int, body: bytes, stream: Optional[bytes] = None):
+        self._offsets[num] = self._pos
+        self._write(b"%d 0 obj\n" % num + body)
+        if stream is not None:
+            self._write(b"\nstream\n")
+            self._write(stream)
+            self._write(b"\nendstream")
+        self._write(b"\nendobj\n")
+
+    @property
+    def page_count(self) -> int:
+        return len(self._kids)
+
+    def add_image_page(self, img: ImageStream, dpi: float = 72.0):
+        """Agrega una página del tamaño de la imagen (a `dpi`) con la imagen entera."""
+        w_pt = img.width * 72.0 / dpi
+        h_pt = img.height * 72.0 / dpi
+        xobj, content, page = self._new_id(), self._new_id(), self._new_id()
+
+        cs = img.colorspace if img.colorspace.startswith("[") else "/" + img.colorspace
+        extra = ""
+        if img.decode_parms:
+            extra += f" /DecodeParms {img.decode_parms}"
+        if img.decode:
+            extra += f" /Decode {img.decode}"
+        self._obj(xobj, (
+            f"<< /Type /XObject /Subtype /Image /Width {img.width} /Height {img.height}"
+            f" /ColorSpace {cs} /BitsPerComponent {img.bits}"
+            f" /Filter /{img.filter}{extra} /Length {len(img.data)} >>"
+        ).encode("ascii"), img.data)
+
+        ops = f"q {w_pt:.4f} 0 0 {h_pt:.4f} 0 0 cm /Im0 Do Q".encode("ascii")
+        self._obj(content, b"<< /Length %d >>" % len(ops), ops)
+
+        self._obj(page, (
+            f"<< /Type /Page /Parent {_PAGES} 0 R /MediaBox [0 0 {w_pt:.4f} {h_pt:.4f}]"
+            f" /Resources << /XObject << /Im0 {xobj} 0 R >> >> /Contents {content} 0 R >>"
+        ).encode("ascii"))
+        self._kids.append(page)
+
+    def close(self):
+        if not self._kids:
+            raise ValueError("PDF sin páginas")
+        kids = " ".join(f"{k} 0 R" for k in self._kids)
+        self._obj(_PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._kids)} >>".encode("ascii"))
+        self._obj(_CATALOG, f"<< /Type /Catalog /Pages {_PAGES} 0 R >>".encode("ascii"))
+
+        xref_at = self._pos
+        size = self._next_id
+        lines = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        for n in range(1, size):
+            lines.append(b"%010d 00000 n \n" % self._offsets[n])
+        self._write(b"".join(lines))
+        self._write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                    % (size, _CATALOG, xref_at))
+        self.fp.flush()
@@ -0,0 +1,205 @@
+# probe.py
+"""
+Pre-flight de un job: cuántos píxeles va a decodificar o rasterizar, leyendo
+solo headers (dimensiones de la imagen; cantidad de páginas y cropbox del PDF).
+
+Con eso main.py rechaza (o achica) antes de gastar un worker, y le pasa el
+costo al scheduler para la admisión. Un PNG de 200 KB que declara 50k x 50k,
+o un PDF de 2000 páginas a 600 dpi, no llegan a decodificarse.
+
+- imagen: sobre `max_pixels`, un JPEG se decodifica con escalado DCT (1/2,
+  1/4, 1/8) al tamaño que entre; cualquier otro formato es OverBudget
+- animaciones / TIFF multipágina: se cuentan los frames (n_frames no
+  decodifica); cada frame se procesa de a uno, así que el costo es el de uno
+- PDF: se baja el dpi hasta que la página más grande entre en `max_page_pixels`
+  y el total en `max_total_pixels`; si hace falta bajar de `min_dpi`, OverBudget
+"""
+from __future__ import annotations
+import math
+from dataclasses import dataclass, replace
+from io import BytesIO
+from typing import Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+from engines.pdf_engine import _ensure_pymupdf, _open_pdf, resolve_pages
+from engines.stages import stage
+
+# Factores de escalado del decoder JPEG (Image.draft)
+_JPEG_SCALES = (1, 2, 4, 8)
+# Orientaciones EXIF que intercambian ancho y alto
+SWAPS_AXES = {5, 6, 7, 8}
+
+
+def set_pillow_limit(max_pixels: int):
+    """
+    Alinea el guard de Pillow (Image.MAX_IMAGE_PIXELS) con el presupuesto, en
+    este proceso. Con el default (~89 MP avisa, ~179 MP corta en Image.open)
+    un presupuesto más alto no tendría efecto; y uno igual al presupuesto
+    cortaría los JPEG que sí entran con escalado DCT. Se deja en lo más grande
+    que jpeg_scale puede achicar: el presupuesto real lo aplica plan_image.
+    """
+    Image.MAX_IMAGE_PIXELS = max(1, int(max_pixels)) * _JPEG_SCALES[-1] ** 2
+
+
+class OverBudget(ValueError):
+    """El job pide más píxeles que el presupuesto y no hay forma barata de achicarlo."""
+    def __init__(self, msg: str, pixels: int = 0, budget: int = 0):
+        super().__init__(msg)
+        self.pixels = pixels
+        self.budget = budget
+
+
+@dataclass(frozen=True)
+class ImagePlan:
+    width: int              # tal cual el header
+    height: int
+    format: str
+    scale: int = 1          # divisor DCT para entrar en el presupuesto (solo JPEG)
+    out_pixels: int = 0     # tamaño pedido por resize (0 = sin resize)
+    frames: int = 1         # frames de una animación / páginas de un TIFF
+
+    @property
+    def decode_pixels(self) -> int:
+        """Píxeles que se van a decodificar (ya con el escalado)."""
+        return math.ceil(self.width / self.scale) * math.ceil(self.height / self.scale)
+
+    @property
+    def pixels(self) -> int:
+        """Costo estimado: el buffer más grande que va a existir."""
+        return max(self.decode_pixels, self.out_pixels)
+
+
+@dataclass(frozen=True)
+class PdfPlan:
+    page_count: int
+    indices: Tuple[int, ...]       # páginas a rasterizar (base 0)
+    dpi: int                       # dpi efectivo (<= el pedido)
+    page_pixels: Tuple[int, ...]   # píxeles por página de `indices`, a `dpi`
+
+    @property
+    def pixels(self) -> int:
+        return sum(self.page_pixels)
+
+
+def resize_target(size: Tuple[int, int], resize: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+    """Tamaño final pedido por resize=(w,h) (0 = proporcional), o None si no cambia nada."""
+    if not resize:
+        return None
+    w, h = size
+    rw, rh = resize
+    if not ((rw and rw > 0) or (rh and rh > 0)):
+        return None
+    if rw and rh:
+        new_w, new_h = int(rw), int(rh)
+    elif rw:
+        new_w = int(rw)
+        new_h = max(1, int(h * (new_w / float(w))))
+    else:
+        new_h = int(rh)
+        new_w = max(1, int(w * (new_h / float(h))))
+    if new_w > 0 and new_h > 0 and (new_w != w or new_h != h):
+        return new_w, new_h
+    return None
+
+
+def jpeg_scale(width: int, height: int, max_pixels: int) -> Optional[int]:
+    """Menor divisor DCT con el que (w/s)*(h/s) entra en max_pixels, o None si ni 1/8 alcanza."""
+    for s in _JPEG_SCALES:
+        if math.ceil(width / s) * math.ceil(height / s) <= max_pixels:
+            return s
+    return None
+
+
+def orientation(im: Image.Image) -> int:
+    # un PNG sin eXIf antes de los píxeles: getexif() haría load() para buscarlo
+    # después de IDAT, y eso es decodificar la imagen entera en el pre-flight
+    if im.format == "PNG" and "exif" not in im.info:
+        return 1
+    try:
+        return int(im.getexif().get(0x0112, 1) or 1)
+    except Exception:
+        return 1
+
+
+def frame_count(im: Image.Image) -> int:
+    """Frames de una animación o páginas de un TIFF (1 si el formato no tiene)."""
+    if im.format == "MPO":
+        return 1    # las dos vistas de una foto estéreo, no una animación
+    try:
+        return max(1, int(getattr(im, "n_frames", 1) or 1))
+    except Exception:
+        return 1
+
+
+def plan_image(im: Image.Image, max_pixels: int, resize: Optional[Tuple[int, int]] = None) -> ImagePlan:
+    """Plan para una imagen ya abierta (solo header, sin load())."""
+    w, h = im.size
+    fmt = im.format or ""
+    # el resize se aplica sobre la imagen ya orientada
+    out = resize_target((h, w) if orientation(im) in SWAPS_AXES else (w, h), resize)
+    out_pixels = out[0] * out[1] if out else 0
+    if out_pixels > max_pixels:
+        raise OverBudget(f"el tamaño pedido supera el máximo de {max_pixels / 1e6:.0f} MP",
+                         out_pixels, max_pixels)
+    if w * h <= max_pixels:
+        return ImagePlan(w, h, fmt, out_pixels=out_pixels)
+    scale = jpeg_scale(w, h, max_pixels) if fmt == "JPEG" else None
+    if scale is None:
+        raise OverBudget(f"{w}x{h} supera el máximo de {max_pixels / 1e6:.0f} MP", w * h, max_pixels)
+    return ImagePlan(w, h, fmt, scale, out_pixels)
+
+
+def probe_image(src, max_pixels: int, resize: Optional[Tuple[int, int]] = None) -> ImagePlan:
+    """Abre el header de `src` (ruta o bytes) y arma el plan; no decodifica píxeles."""
+    with stage("probe"):
+        try:
+            im = Image.open(BytesIO(src) if isinstance(src, (bytes, bytearray)) else src)
+        except Image.DecompressionBombError:
+            # el guard de Pillow corta antes que nosotros cuando es más del doble
+            raise OverBudget(f"supera el máximo de {max_pixels / 1e6:.0f} MP", 0, max_pixels)
+        try:
+            plan = plan_image(im, max_pixels, resize)
+            frames = frame_count(im)
+            return replace(plan, frames=frames) if frames > 1 else plan
+        finally:
+            im.close()
+
+
+def pdf_dpi(areas: List[float], dpi: int, max_page_pixels: int, max_total_pixels: int) -> float:
+    """dpi más alto (<= dpi) con el que ninguna página ni el total se pasan; áreas en pt²."""
+    if not areas:
+        return float(dpi)
+    zoom2 = (dpi / 72.0) ** 2
+    fit = 1.0
+    biggest, total = max(areas), sum(areas)
+    if biggest * zoom2 > max_page_pixels:
+        fit = min(fit, max_page_pixels / (biggest * zoom2))
+    if total * zoom2 > max_total_pixels:
+        fit = min(fit, max_total_pixels / (total * zoom2))
+    return dpi * math.sqrt(fit)
+
+
+def plan_pdf(src, pages: Optional[Iterable[int]], dpi: int, max_page_pixels: int,
+             max_total_pixels: int, min_dpi: int = 72) -> PdfPlan:
+    """
+    Cuenta páginas y mide el cropbox de las pedidas (sin cargar su contenido).
+    Levanta OverBudget si ni a min_dpi entra; si el rango no existe, indices vacío.
+    Corre en el pool: abrir un PDF ajeno no pasa en el proceso de uvicorn.
+    """
+    _ensure_pymupdf()
+    dpi = max(1, int(dpi))
+    with stage("probe"), _open_pdf(src) as doc:
+        n = doc.page_count
+        indices = resolve_pages(n, pages)
+        areas = []
+        for i in indices:
+            r = doc.page_cropbox(i)
+            areas.append(abs(r.width * r.height))
+
+    eff = int(pdf_dpi(areas, dpi, max_page_pixels, max_total_pixels))
+    if areas and eff < min(min_dpi, dpi):
+        raise OverBudget(f"el PDF ({len(indices)} páginas) supera el máximo de píxeles aun a {min_dpi} dpi",
+                         int(sum(areas) * (min_dpi / 72.0) ** 2), max_total_pixels)
+    zoom2 = (eff / 72.0) ** 2
+    return PdfPlan(n, tuple(indices), eff, tuple(int(a * zoom2) for a in areas))
@@ -0,0 +1,54 @@
+# stages.py
+"""
+Tiempos por etapa dentro de un job de engines/ (decode, resize, encode, render...).
+
+Los engines marcan sus etapas con `with stage("decode"):`; fuera de un
+collect() eso no cuesta más que dos perf_counter. El scheduler corre
+collect(fn, ...) en el proceso del pool y devuelve (resultado, tiempos), así
+el proceso de uvicorn los puede publicar en /metrics.
+
+Las etapas se pueden anidar (el writer de animaciones decodifica cada frame
+adentro de su save()): cada una cuenta solo su tiempo propio, sin el de las
+que tiene adentro.
+"""
+from __future__ import annotations
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Un job por proceso a la vez (workers del pool): alcanza con un global
+_current: Optional[Dict[str, float]] = None
+# Por hilo (los encodes en paralelo también marcan etapas): tiempo de las
+# etapas hijas de cada etapa abierta
+_local = threading.local()
+
+
+@contextmanager
+def stage(name: str):
+    inner = _local.__dict__.setdefault("inner", [])
+    inner.append(0.0)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        spent = time.perf_counter() - t0
+        own = spent - inner.pop()
+        if inner:
+            inner[-1] += spent
+        if _current is not None:
+            _current[name] = _current.get(name, 0.0) + own
+
+
+def collect(fn, *args, **kwargs):
+    """Corre fn y devuelve (resultado, {etapa: segundos, "total": segundos})."""
+    global _current
+    prev, _current = _current, {}
+    t0 = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+        timings = _current
+        timings["total"] = time.perf_counter() - t0
+    finally:
+        _current = prev
+    return result, timings
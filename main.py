@@ -1,115 +1,183 @@
-import os, time, hashlib, io
+import os, time, hashlib, hmac, io, shutil, asyncio, base64, logging
 from typing import List, Optional
 from pathlib import Path
 from collections import defaultdict
 import json
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, UploadFile, File, Form, Response, HTTPException
-from fastapi.responses import FileResponse, HTMLResponse, PlainTextResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from starlette.background import BackgroundTask
 from starlette.middleware.cors import CORSMiddleware
 
 from engines.image_engine import convert_image
-from engines import image_engine, pdf_engine
+from engines import image_engine, pdf_engine, probe, stages
+from engines.probe import ImagePlan, OverBudget, PdfPlan
+from services.scheduler import ConversionScheduler, QueueFull, JobTimeout
+from services.ingest import BodySizeLimit, SpooledUpload, UploadTooLarge, spool_upload, cleanup_all
+from services.result_cache import ResultCache, CachedResult, cache_key
+from services.zipstream import ZipStreamWriter
+from services.catalog import FormatCatalog
+from services.route_index import RouteIndex
+from services.page_cache import PageCache, build_page, etag_matches
+from services.assets import AssetFiles, AssetStore
+from services.ratelimit import Budget, RateLimiter, backend_from_env
+from services.storage import JobDir, Storage, StorageFull
+from services.jobs import Job, JobRetry, JobRunner, JobsFull, JobStore
+from services.metrics import MetricsMiddleware, Registry, render
+from services import env_float
 from datetime import datetime
 # ====== Paths & App ======
 BASE_DIR   = Path(__file__).parent.resolve()
 STATIC_DIR = BASE_DIR / "static"
 TEMPL_DIR  = BASE_DIR / "templates"
-CSS_PATH   = STATIC_DIR / "css" / "styles.css"
 
 APP_NAME = "ZetaConvert"
 MAX_BYTES = 20 * 1024 * 1024
-RATE_LIMIT_PER_MIN = 60
+# /api/batch: muchos archivos en un request (cada uno igual hasta MAX_BYTES)
+BATCH_MAX_BYTES = int(env_float("ZC_BATCH_MAX_MB", 200) * 1024 * 1024)
+BATCH_MAX_FILES = int(env_float("ZC_BATCH_MAX_FILES", 100))
+# /api/variants: salidas por request (un decode, N encodes)
+VARIANTS_MAX = int(env_float("ZC_VARIANTS_MAX", 16))
+# Presupuesto de píxeles (ver engines/probe.py): por imagen/página decodificada y por PDF entero
+MAX_IMAGE_PIXELS = int(env_float("ZC_MAX_IMAGE_MP", 100) * 1e6)
+MAX_PDF_PIXELS = int(env_float("ZC_MAX_PDF_MP", 1500) * 1e6)
+MIN_PDF_DPI = int(env_float("ZC_MIN_DPI", 72))
+# Frames por animación / páginas por TIFF hacia un destino multiframe (se procesan de a uno)
+MAX_FRAMES = int(env_float("ZC_MAX_FRAMES", 500))
+# Perfil de encoder por defecto (ver PROFILES en engines/image_engine.py): fast donde
+# alguien espera la respuesta, max en /api/batch y /api/jobs
+PROFILE_INTERACTIVE = os.getenv("ZC_PROFILE_INTERACTIVE") or "fast"
+PROFILE_BULK = os.getenv("ZC_PROFILE_BULK") or "max"
+# Encodes en paralelo dentro de un job: pruebas de max_bytes y variantes
+ENCODE_THREADS = int(env_float("ZC_ENCODE_THREADS", image_engine.ENCODE_THREADS))
+# /metrics solo con este token (Authorization: Bearer ... o ?token=...); sin él, 404
+METRICS_TOKEN = os.getenv("ZC_METRICS_TOKEN") or ""
+RATE_LIMIT_PER_MIN = 60          # /api/* (conversiones)
+RATE_LIMIT_CHEAP_PER_MIN = 600   # páginas, JSON del catálogo, etc.
 STORE_DIR = "/tmp/zc"
 os.makedirs(STORE_DIR, exist_ok=True)
 
-app = FastAPI(title=APP_NAME)
+# Caché de resultados (sha256 del input + parámetros): disco bajo STORE_DIR + memoria para salidas chicas
+result_cache = ResultCache(
+    os.path.join(STORE_DIR, "cache"),
+    max_disk_bytes=int(env_float("ZC_CACHE_DISK_MB", 512) * 1024 * 1024),
+    max_mem_bytes=int(env_float("ZC_CACHE_MEM_MB", 64) * 1024 * 1024),
+    mem_item_max=int(env_float("ZC_CACHE_MEM_ITEM_KB", 512) * 1024),
+)
+
+# Directorios de job únicos bajo STORE_DIR/jobs, con cuota, janitor y tmpfs opcional
+# (ver services/storage.py)
+storage = Storage(os.path.join(STORE_DIR, "jobs"))
+
+# Pool de procesos para los engines (tamaño/cola/timeout por env, ver services/scheduler.py).
+# El guard de Pillow sigue a ZC_MAX_IMAGE_MP acá (probe) y en cada worker del pool
+probe.set_pillow_limit(MAX_IMAGE_PIXELS)
+scheduler = ConversionScheduler(initializer=probe.set_pillow_limit, initargs=(MAX_IMAGE_PIXELS,))
+
+# Métricas en memoria por worker, agregadas entre workers al scrapear /metrics
+# (ver services/metrics.py)
+metrics = Registry(os.path.join(STORE_DIR, "metrics"))
+STAGE_SECONDS = metrics.histogram("zc_stage_seconds", "Duración por etapa de las conversiones", ("stage",))
+RATE_LIMITED = metrics.counter("zc_rate_limited_total", "Requests rechazados por rate limit", ("budget",))
+STREAM_ERRORS = metrics.counter("zc_stream_errors_total", "Streams cortados por un error del engine", ("kind",))
+log = logging.getLogger("zetaconvert")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    scheduler.start()
+    storage.start_janitor()
+    metrics.start_flusher()
+    job_runner.start()
+    yield
+    await job_runner.stop()
+    await metrics.stop_flusher()
+    await storage.stop_janitor()
+    scheduler.shutdown()
+
+app = FastAPI(title=APP_NAME, lifespan=lifespan)
 
 # --- Formatos (mapa + status) ---
 MAP_PATH    = STATIC_DIR / "formats.map.json"
 STATUS_PATH = STATIC_DIR / "formats.status.json"
 
-def _load_json_safe(p: Path, default):
-    try:
-        with p.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return default
-
-def load_format_catalog():
-    """
-    Carga el mapa y el status desde /static/.
-    Devuelve: (ext_to_id, id_to_fmt, enabled_ids)
-    id_to_fmt[fid] => {"id","ext","label","mime","targets":[...], "premium"?}
-    """
-    mp = _load_json_safe(MAP_PATH, {"categories": {}})
-    st = _load_json_safe(STATUS_PATH, {"status": []})
-
-    ext_to_id = {}
-    id_to_fmt = {}
-    for arr in mp.get("categories", {}).values():
-        for f in (arr or []):
-            fid = f.get("id")
-            ext = (f.get("ext") or "").lower()
-            if fid and ext:
-                ext_to_id[ext] = fid
-                id_to_fmt[fid] = f
-
-    enabled_ids = {s["id"] for s in (st.get("status") or []) if s.get("id") and s.get("enabled") is True}
-    return ext_to_id, id_to_fmt, enabled_ids
-
-def is_enabled_ext(ext: str, ext_to_id: dict, enabled_ids: set) -> bool:
-    if not ext:
-        return False
-    fid = ext_to_id.get(ext.lower())
-    return bool(fid and (fid in enabled_ids))
-
-def enabled_targets_for_ext(ext: str, ext_to_id: dict, id_to_fmt: dict, enabled_ids: set) -> list[str]:
-    fid = ext_to_id.get((ext or "").lower())
-    fmt = id_to_fmt.get(fid)
-    if not fmt:
-        return []
-    outs = []
-    for tid in (fmt.get("targets") or []):
-        if tid in enabled_ids:
-            tf = id_to_fmt.get(tid)
-            if tf and tf.get("ext"):
-                outs.append(tf["ext"].lower())
-    return outs
+# Se carga una vez y se recarga solo si cambia el mtime (ver services/catalog.py)
+catalog = FormatCatalog(MAP_PATH, STATUS_PATH)
 
+def cached_json(request: Request, body: bytes, etag: str, max_age: int) -> Response:
+    headers = {"Cache-Control": f"public, max-age={max_age}", "ETag": etag}
+    if etag_matches(request.headers.get("if-none-match"), [etag]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/formats.map.json", response_class=PlainTextResponse)
-def formats_map_json():
-    data = _load_json_safe(MAP_PATH, {"categories": {}})
-    mt = str(int(MAP_PATH.stat().st_mtime)) if MAP_PATH.exists() else str(int(time.time()))
-    resp = Response(content=json.dumps(data, ensure_ascii=False), media_type="application/json")
-    resp.headers["Cache-Control"] = "public, max-age=300"
-    resp.headers["ETag"] = mt
-    return resp
+def formats_map_json(request: Request):
+    cat = catalog.get()
+    return cached_json(request, cat.map_body, cat.map_etag, 300)
 
 @app.get("/formats.status.json", response_class=PlainTextResponse)
-def formats_status_json():
-    data = _load_json_safe(STATUS_PATH, {"status": []})
-    mt = str(int(STATUS_PATH.stat().st_mtime)) if STATUS_PATH.exists() else str(int(time.time()))
-    resp = Response(content=json.dumps(data, ensure_ascii=False), media_type="application/json")
-    resp.headers["Cache-Control"] = "public, max-age=120"
-    resp.headers["ETag"] = mt
-    return resp
+def formats_status_json(request: Request):
+    cat = catalog.get()
+    return cached_json(request, cat.status_body, cat.status_etag, 120)
 
 
-# Static (RUTA ABSOLUTA) y Templates (UNICA instancia) + cache-bust por mtime real
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+# Static (RUTA ABSOLUTA) con URLs por hash de contenido, gzip/br precalculados e
+# immutable (ver services/assets.py); los templates piden las URLs con asset_url()
+assets = AssetStore(STATIC_DIR, prefix="/static")
+app.mount("/static", AssetFiles(assets), name="static")
 templates = Jinja2Templates(directory=str(TEMPL_DIR))
-try:
-    STYLE_VERSION = str(int(CSS_PATH.stat().st_mtime))
-except FileNotFoundError:
-    STYLE_VERSION = str(int(time.time()))
-templates.env.globals["STYLE_VERSION"] = STYLE_VERSION
+templates.env.globals["asset_url"] = assets.url
+
+# ====== Rate limit & size ======
+# El último middleware registrado es el de más afuera: estos van antes que
+# seguridad/CORS para que sus 413 y 429 salgan con esos headers (si no, el
+# frontend de otro origen ve un error de CORS en vez del Retry-After)
+# too_big() rechaza barato por Content-Length; BodySizeLimit cuenta los bytes reales
+# (uploads chunked o con Content-Length mentiroso)
+app.add_middleware(BodySizeLimit, max_bytes=MAX_BYTES, overrides={"/api/batch": BATCH_MAX_BYTES})
+
+def too_big(request: Request, limit: int = MAX_BYTES):
+    try:
+        size = int(request.headers.get('content-length') or "0")
+    except ValueError:
+        size = 0
+    return size > limit
+
+# Token bucket por IP con presupuestos separados (ver services/ratelimit.py).
+# ZC_RATE_BACKEND=sqlite comparte los baldes entre los workers de uvicorn del host.
+rate_limiter = RateLimiter(
+    backend_from_env(os.path.join(STORE_DIR, "ratelimit.sqlite3")),
+    {
+        "heavy": Budget(env_float("ZC_RATE_HEAVY_PER_MIN", RATE_LIMIT_PER_MIN), burst=RATE_LIMIT_PER_MIN),
+        "cheap": Budget(env_float("ZC_RATE_CHEAP_PER_MIN", RATE_LIMIT_CHEAP_PER_MIN), burst=120),
+    },
+)
+RATE_EXEMPT_PREFIXES = ("/static/", "/healthz")
+
+def rate_budget(request: Request) -> Optional[str]:
+    path = request.url.path
+    if path.startswith(RATE_EXEMPT_PREFIXES):
+        return None
+    if path.startswith("/api/") and request.method not in ("GET", "HEAD", "OPTIONS"):
+        return "heavy"
+    return "cheap"
+
+@app.middleware("http")
+async def rate_limit(request: Request, call_next):
+    # antes de leer el body: un cliente sin fichas no llega a subir el archivo
+    budget = rate_budget(request)
+    if budget:
+        client_ip = request.client.host if request.client else "0.0.0.0"
+        d = await rate_limiter.acheck(budget, client_ip)
+        if not d.allowed:
+            RATE_LIMITED.inc(budget=budget)
+            return JSONResponse({"detail": "Demasiadas solicitudes, probá en un minuto."},
+                                status_code=429, headers={"Retry-After": str(d.retry_after)})
+    return await call_next(request)
 
 # ====== Seguridad / CORS ======
+# Envuelven al rate limit y a BodySizeLimit (ver arriba)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_methods=["GET","POST","OPTIONS"], allow_headers=["*"]
@@ -123,20 +191,8 @@ async def add_security_headers(request, call_next):
     resp.headers.setdefault("Permissions-Policy","geolocation=(), microphone=(), camera=()")
     return resp
 
-# ====== Rate limit & size ======
-bucket = {}
-def too_big(request: Request):
-    try:
-        size = int(request.headers.get('content-length') or "0")
-    except ValueError:
-        size = 0
-    return size > MAX_BYTES
-
-def rate_limited(ip: str) -> bool:
-    now = int(time.time() // 60)
-    key = (ip, now)
-    bucket[key] = bucket.get(key, 0) + 1
-    return bucket[key] > RATE_LIMIT_PER_MIN
+# Afuera de todo: cuenta también los 429 y mide hasta el último byte enviado
+app.add_middleware(MetricsMiddleware, registry=metrics)
 
 # ====== Catálogo de rutas ======
 class Route:
@@ -225,47 +281,28 @@ CATEGORIES = defaultdict(list)
 for r in ROUTES:
     CATEGORIES[r.category].append(r)
 
-# ====== Dataset para buscador ======
+# ====== Índice de rutas + dataset para buscador ======
+# Precalculado (ver services/route_index.py); se rearma entero cuando el catálogo se recarga
+route_index = RouteIndex(ROUTES, catalog.get())
+
+def _rebuild_route_index(snap):
+    global route_index
+    route_index = RouteIndex(ROUTES, snap)
+
+catalog.on_reload(_rebuild_route_index)
+
+def current_route_index() -> RouteIndex:
+    catalog.get()  # dispara la recarga (y el rebuild) si cambiaron los JSON
+    return route_index
+
 @app.get("/formats.json")
-def formats_json():
-    ext_to_id, id_to_fmt, enabled_ids = load_format_catalog()
-
-    def route_is_viable(r: Route) -> bool:
-        # al menos un origen habilitado
-        if not any(is_enabled_ext(x, ext_to_id, enabled_ids) for x in (r.exts_from or [])):
-            return False
-        # al menos un destino permitido por mapa y habilitado
-        possible = set()
-        for fext in (r.exts_from or []):
-            for tout in enabled_targets_for_ext(fext, ext_to_id, id_to_fmt, enabled_ids):
-                possible.add(tout)
-        if not possible:
-            return False
-        if r.exts_to:
-            return any((t in possible) for t in r.exts_to)
-        return True
-
-    items = []
-    for r in ROUTES:
-        if route_is_viable(r):
-            # Derivo destinos reales para el buscador
-            derived = set()
-            for fext in (r.exts_from or []):
-                for tout in enabled_targets_for_ext(fext, ext_to_id, id_to_fmt, enabled_ids):
-                    derived.add(tout)
-            final_to = [t for t in (r.exts_to or []) if t in derived] if r.exts_to else sorted(derived)
-            items.append({
-                "slug": r.slug, "title": r.title, "desc": r.desc, "category": r.category,
-                "from": r.exts_from, "to": final_to, "keywords": r.keywords, "emoji": r.emoji
-            })
-    return {"items": items}
+def formats_json(request: Request):
+    idx = current_route_index()
+    return cached_json(request, idx.search_body, idx.search_etag, 120)
 
 
 def get_route(slug: str) -> Optional[Route]:
-    for r in ROUTES:
-        if r.slug == slug:
-            return r
-    return None
+    return current_route_index().route(slug)
 
 # ====== Pages ======
 # === helpers SEO ===
@@ -275,212 +312,850 @@ def abs_url(request: Request, path: str = "/") -> str:
         path = "/" + path
     return base + path
 
+# HTML ya renderizado por (template, clave, URL base, año, versión de static/); se invalida
+# solo si cambia un template o el catálogo (ver services/page_cache.py)
+page_cache = PageCache(TEMPL_DIR, version_fn=lambda: catalog.get().version)
+# La URL base sale del header Host: solo se cachea para estos hosts (host o host:puerto,
+# tal cual llegan). Con cualquier otro Host se renderiza sin caché, así rotar el
+# header no desaloja las páginas buenas ni fuerza gzip 9 + brotli 11 en cada request.
+PAGE_CACHE_HOSTS = frozenset(
+    h.strip().lower()
+    for h in (os.getenv("ZC_PAGE_CACHE_HOSTS") or "zetaconvert.online,www.zetaconvert.online").split(",")
+    if h.strip()
+)
+
+def cached_page(request: Request, template: str, key: str = "", **context) -> Response:
+    year = time.strftime("%Y")
+    render = lambda: templates.get_template(template).render({"request": request, "year": year, **context})
+    if request.headers.get("host", "").lower() in PAGE_CACHE_HOSTS:
+        ck = (template, key, str(request.base_url), year, assets.version)
+        page = page_cache.get_or_render(ck, render)
+    else:
+        page = build_page(render(), fast=True)
+    encoding, body, etag = page.pick(request.headers.get("accept-encoding", ""))
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), page.etags()):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="text/html; charset=utf-8", headers=headers)
+
 @app.get("/", response_class=HTMLResponse, name="home")
 async def home(request: Request):
-    return templates.TemplateResponse(
-        "home.html",
-        {
-            "request": request,
-            "year": time.strftime("%Y"),
-            "routes_list": ROUTES,
-            "canonical_url": abs_url(request, "/"),
-            "og_image_url": abs_url(request, "/static/og/og-default.png"),
-        }
+    return cached_page(
+        request, "home.html", "/",
+        routes_list=ROUTES,
+        canonical_url=abs_url(request, "/"),
+        og_image_url=abs_url(request, "/static/og/og-default.png"),
     )
 
 @app.get("/routes", response_class=HTMLResponse, name="routes")
 async def routes_page(request: Request):
-    return templates.TemplateResponse(
-        "home.html",
-        {
-            "request": request,
-            "year": time.strftime("%Y"),
-            "routes_list": ROUTES,
-            "canonical_url": abs_url(request, "/routes"),
-            "og_image_url": abs_url(request, "/static/og/og-default.png"),
-        }
+    return cached_page(
+        request, "home.html", "/routes",
+        routes_list=ROUTES,
+        canonical_url=abs_url(request, "/routes"),
+        og_image_url=abs_url(request, "/static/og/og-default.png"),
     )
 
 
-
 @app.get("/r/{slug}", response_class=HTMLResponse, name="route_page")
 async def route_page(request: Request, slug: str):
-    route = get_route(slug)
-    if not route:
+    page = current_route_index().page(slug)
+    if not page:
         raise HTTPException(404)
 
-    # relacionadas por input compatible
-    from_exts = set(route.exts_from or [])
-    related = []
-    for r in ROUTES:
-        if r.slug == route.slug:
-            continue
-        if not r.exts_from:
-            continue
-        if from_exts.intersection(set(r.exts_from)):
-            related.append(r)
-
-    # ====== NUEVO: filtrar destinos con mapa + status ======
-    ext_to_id, id_to_fmt, enabled_ids = load_format_catalog()
-
-    # posibles 'to' a partir de la ruta y relacionadas
-    raw_targets = set(route.exts_to or route.to or [])
-    for r in related:
-        for t in (r.exts_to or []):
-            raw_targets.add(t)
-
-    # allowed targets = (targets habilitados por mapa desde los 'from') ∩ raw_targets (si existiera)
-    allowed = set()
-    if route.exts_from:
-        for fext in route.exts_from:
-            if is_enabled_ext(fext, ext_to_id, enabled_ids):
-                for tout in enabled_targets_for_ext(fext, ext_to_id, id_to_fmt, enabled_ids):
-                    allowed.add(tout)
-
-    if raw_targets:
-        allowed = {t for t in allowed if t in raw_targets}
-
-    # fallback: si por algún motivo quedó vacío, mantené al menos los raw habilitados
-    if not allowed:
-        for t in raw_targets:
-            if is_enabled_ext(t, ext_to_id, enabled_ids):
-                allowed.add(t)
-
-    all_targets = sorted(allowed) if allowed else sorted(raw_targets)
-
-    # mapa target -> slug (sólo para los allowed)
-    target_to_slug = {}
-    # la propia ruta toma prioridad para sus 'to'
-    for t in (route.exts_to or route.to or []):
-        if t in all_targets:
-            target_to_slug[t] = route.slug
-    for r in related:
-        for t in (r.exts_to or []):
-            if t in all_targets:
-                target_to_slug.setdefault(t, r.slug)
-
-    # SEO
-    page_title = f"Convertir {route.title} online gratis"
-    page_desc  = f"{route.desc} Convertí {', '.join(route.exts_from or [])} a {', '.join(all_targets) or 'formatos compatibles'} en segundos. Rápido, privado y sin registro."
-
-    all_targets_json     = json.dumps(all_targets, ensure_ascii=False)
-    target_to_slug_json  = json.dumps(target_to_slug, ensure_ascii=False)
-
-    return templates.TemplateResponse(
-        "route.html",
-        {
-            "request": request,
-            "route": route,
-            "routes_list": ROUTES,
-            "all_targets": all_targets,
-            "target_to_slug": target_to_slug,
-            "all_targets_json": all_targets_json,
-            "target_to_slug_json": target_to_slug_json,
-            "page_title": page_title,
-            "page_desc": page_desc,
-            "year": time.strftime("%Y"),
-        }
+    return cached_page(
+        request, "route.html", slug,
+        route=page.route,
+        routes_list=ROUTES,
+        all_targets=page.all_targets,
+        target_to_slug=page.target_to_slug,
+        all_targets_json=page.all_targets_json,
+        target_to_slug_json=page.target_to_slug_json,
+        page_title=page.page_title,
+        page_desc=page.page_desc,
     )
 
 
-
-
 @app.get("/privacidad", response_class=HTMLResponse, name="privacy")
 async def privacy(request: Request):
-    return templates.TemplateResponse("privacy.html", {"request": request, "year": time.strftime("%Y")})
+    return cached_page(request, "privacy.html")
 
 @app.get("/terminos", response_class=HTMLResponse, name="terms")
 async def terms(request: Request):
-    return templates.TemplateResponse("terms.html", {"request": request, "year": time.strftime("%Y")})
+    return cached_page(request, "terms.html")
 
 # Short aliases
 app.add_api_route("/privacy", privacy, include_in_schema=False)
 app.add_api_route("/terms", terms, include_in_schema=False)
 
 # ====== Convert API ======
+def observe_stages(timings: dict, elapsed: Optional[float] = None):
+    """Publica los tiempos por etapa que devolvió un job (ver engines/stages.py)."""
+    for name, secs in timings.items():
+        STAGE_SECONDS.observe(secs, stage="job" if name == "total" else name)
+    if elapsed is not None:
+        STAGE_SECONDS.observe(max(0.0, elapsed - timings.get("total", 0.0)), stage="queue_wait")
+
+async def run_engine(fn, *args, **kwargs):
+    """Corre una función de engines/ en el scheduler y traduce cola llena/timeout a HTTP."""
+    t0 = time.perf_counter()
+    try:
+        result, timings = await scheduler.run(stages.collect, fn, *args, **kwargs)
+        observe_stages(timings, time.perf_counter() - t0)
+        return result
+    except QueueFull as e:
+        raise HTTPException(503, "Servidor ocupado, probá de nuevo en unos segundos.",
+                            headers={"Retry-After": str(e.retry_after)})
+    except JobTimeout:
+        raise HTTPException(504, "La conversión tardó demasiado.")
+    except OverBudget as e:
+        # el probe mira el primer frame; una página de TIFF más grande aparece recién acá
+        raise HTTPException(413, f"Imagen demasiado grande: {e}")
+
+def declared_bytes(request: Request) -> int:
+    try:
+        return int(request.headers.get("content-length") or "0")
+    except ValueError:
+        return 0
+
+def new_job(request: Request, prefix: str) -> JobDir:
+    """Directorio propio para los archivos del request; reserva lo que declara Content-Length."""
+    try:
+        return storage.job(prefix, expected_bytes=declared_bytes(request))
+    except StorageFull:
+        raise HTTPException(503, "Servidor ocupado, probá de nuevo en unos segundos.",
+                            headers={"Retry-After": "30"})
+
+async def spool(uf: UploadFile, job: JobDir) -> SpooledUpload:
+    """Pasa el upload al directorio del job por bloques; nunca entero en memoria."""
+    t0 = time.perf_counter()
+    try:
+        return await spool_upload(uf, job.path, MAX_BYTES)
+    except UploadTooLarge:
+        raise HTTPException(413, f"Archivo demasiado grande. Máx {MAX_BYTES//1024//1024}MB")
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage="upload")
+
+def check_profile(profile: Optional[str], default: str) -> str:
+    profile = (profile or "").strip().lower() or default
+    if profile not in image_engine.PROFILES:
+        raise HTTPException(400, f"Perfil inválido (opciones: {', '.join(image_engine.PROFILES)})")
+    return profile
+
+def fit_headers(fit: image_engine.SizeFit) -> dict:
+    """Qué eligió la búsqueda de max_bytes (si el original ya entraba, X-Passthrough en vez de X-Fit-Quality)."""
+    h = {"X-Fit-Encodes": str(fit.encodes)}
+    if fit.quality is not None:
+        h["X-Fit-Quality"] = str(fit.quality)
+    else:
+        h["X-Passthrough"] = "1"
+    if fit.scaled:
+        h["X-Fit-Size"] = f"{fit.size[0]}x{fit.size[1]}"
+    return h
+
+def mp(pixels: int) -> float:
+    """Costo para el scheduler, en megapíxeles."""
+    return pixels / 1e6
+
+def image_work(plan: ImagePlan, target: str) -> int:
+    """Píxeles a procesar: en memoria hay un frame por vez, pero el trabajo es por frame."""
+    return plan.pixels * (plan.frames if target in image_engine.FRAME_TARGETS else 1)
+
+async def image_plan(path: str, resize, target: Optional[str] = None) -> ImagePlan:
+    """
+    Pre-flight de una imagen (solo el header, en un thread): 413 si no entra en
+    el presupuesto, o si hacia `target` salen más de MAX_FRAMES frames.
+    """
+    t0 = time.perf_counter()
+    try:
+        plan = await asyncio.to_thread(probe.probe_image, path, MAX_IMAGE_PIXELS, resize)
+    except OverBudget as e:
+        raise HTTPException(413, f"Imagen demasiado grande: {e}")
+    except Exception:
+        raise HTTPException(400, "No se pudo leer la imagen")
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage="probe")
+    if target in image_engine.FRAME_TARGETS and plan.frames > MAX_FRAMES:
+        raise HTTPException(413, f"Animación demasiado larga: {plan.frames} frames (máximo {MAX_FRAMES})")
+    return plan
+
+async def pdf_plan(path: str, pages_list, dpi: int) -> PdfPlan:
+    """
+    Páginas (base 0) a exportar y dpi efectivo: valida que el PDF abra, que el
+    rango exista y que entre en el presupuesto de píxeles (bajando el dpi si hace falta).
+    """
+    try:
+        plan = await run_engine(probe.plan_pdf, path, pages_list, dpi, MAX_IMAGE_PIXELS,
+                                MAX_PDF_PIXELS, MIN_PDF_DPI)
+    except HTTPException:
+        raise
+    except OverBudget as e:
+        raise HTTPException(413, f"PDF demasiado grande: {e}")
+    except Exception:
+        raise HTTPException(400, "No se pudo leer el PDF")
+    if not plan.indices:
+        raise HTTPException(400, "El rango de páginas no existe en el PDF")
+    return plan
+
+def dpi_headers(plan: PdfPlan, dpi: int) -> dict:
+    return {"X-Render-DPI": str(plan.dpi)} if plan.dpi < dpi else {}
+
+def pdf_calls(path: str, plan: PdfPlan, image_ext: str, quality: int):
+    """
+    Argumentos de stages.collect para render_pages (una tupla por chunk de
+    páginas) y el costo en megapíxeles de cada chunk.
+    """
+    indices = list(plan.indices)
+    size = pdf_engine.chunk_size(len(indices), scheduler.workers)
+    chunks = [indices[:1]] + pdf_engine.split_chunks(indices[1:], size) if len(indices) > 1 else [indices]
+    px = dict(zip(plan.indices, plan.page_pixels))
+    calls = [(pdf_engine.render_pages, path, ch, image_ext, plan.dpi, quality) for ch in chunks]
+    return calls, [mp(sum(px[i] for i in ch)) for ch in chunks]
+
+def stream_pdf_zip(job: JobDir, src: SpooledUpload, key: str, plan: PdfPlan,
+                   image_ext: str, quality: int, headers: dict) -> StreamingResponse:
+    """
+    PDF -> ZIP en streaming: los rangos de páginas se reparten entre los procesos
+    del scheduler y cada página entra al ZIP (y sale al cliente) apenas termina.
+    La primera tanda es de una página, así el primer byte tarda un render.
+    Memoria acotada a los chunks en vuelo; el ZIP se copia a un .tmp del job para el caché.
+    El job se borra cuando termina el stream (o si no se pudo encolar).
+    Si el engine falla a mitad (timeout, worker caído) los headers ya salieron: el
+    ZIP se corta sin directorio central, así el cliente no lo toma por completo.
+    """
+    try:
+        calls, costs = pdf_calls(src.path, plan, image_ext, quality)
+        results = scheduler.run_many(stages.collect, calls, costs=costs)
+    except QueueFull as e:
+        job.cleanup()
+        raise HTTPException(503, "Servidor ocupado, probá de nuevo en unos segundos.",
+                            headers={"Retry-After": str(e.retry_after)})
+
+    tmp_path = job.file("pages.zip.tmp")
+
+    async def body():
+        complete = False
+        try:
+            with open(tmp_path, "wb") as tee:
+                w = ZipStreamWriter()
+                try:
+                    async for rendered, timings in results:
+                        observe_stages(timings)
+                        for _, name, data in rendered:
+                            t0 = time.perf_counter()
+                            chunk = w.add(name, data)
+                            STAGE_SECONDS.observe(time.perf_counter() - t0, stage="zip")
+                            tee.write(chunk)
+                            yield chunk
+                except Exception as e:
+                    w.abort()
+                    STREAM_ERRORS.inc(kind="pdf_zip")
+                    log.warning("PDF -> ZIP cortado (%s páginas): %s: %s",
+                                len(plan.indices), type(e).__name__, e)
+                    return
+                chunk = w.close()
+                tee.write(chunk)
+                yield chunk
+            complete = True
+        finally:
+            await results.aclose()
+            if complete:
+                result_cache.put_file(key, tmp_path, "application/zip", "pages.zip", move=True,
+                                      headers=headers)
+            job.cleanup()
+
+    return StreamingResponse(body(), media_type="application/zip",
+                             headers={"Content-Disposition": 'attachment; filename="pages.zip"',
+                                      "X-Cache": "MISS", **headers})
+
+def tag_convert(request: Request, kind: str, target: str, cache: str):
+    """Etiquetas de zc_convert_seconds; MetricsMiddleware las lee al terminar la respuesta."""
+    t = target if target in image_engine.SUPPORTED_TO or target == "zip" else "other"
+    request.state.convert = {"kind": kind, "target": t, "cache": cache}
+
+def cached_response(hit: CachedResult, fname: str) -> Response:
+    headers = {"Content-Disposition": f'attachment; filename="{fname}"', "X-Cache": "HIT",
+               **(hit.headers or {})}
+    if hit.data is not None:
+        return Response(content=hit.data, media_type=hit.mime, headers=headers)
+    return FileResponse(hit.path, media_type=hit.mime, headers=headers)
+
+def parse_pages(pages: str) -> Optional[List[int]]:
+    """ "1-3,5" -> [0, 1, 2, 4] (base 0); vacío => None (todas)."""
+    if not pages.strip():
+        return None
+    rngs = [p.strip() for p in pages.split(',') if p.strip()]
+    idxs = []
+    for r in rngs:
+        if '-' in r:
+            a,b = r.split('-',1)
+            a,b = int(a)-1, int(b)-1
+            idxs.extend(list(range(max(0,a), max(0,b)+1)))
+        else:
+            idxs.append(max(0, int(r)-1))
+    return sorted(set([i for i in idxs if i >= 0]))
+
+def check_single(file: Optional[UploadFile], target: str):
+    """Valida un upload simple; devuelve (nombre, extensión, target en minúsculas)."""
+    if not file:
+        raise HTTPException(400, "Falta archivo")
+    name = file.filename or "input"
+    ext = os.path.splitext(name)[1].lower()
+    if ext not in image_engine.SUPPORTED_FROM and ext != ".pdf":
+        raise HTTPException(400, "Formato de entrada no soportado aún")
+    tgt = target.lower()
+    if ext == ".pdf" and tgt not in ("zip", "png", "jpg", "webp"):
+        raise HTTPException(400, "Destino no soportado para PDF")
+    return name, ext, tgt
+
 @app.post("/api/convert")
 async def convert(
     request: Request,
     target: str = Form(...), route: str = Form(None),
     file: UploadFile = File(None), files: List[UploadFile] = File(None),
     quality: int = Form(90), dpi: int = Form(144), pages: str = Form(""),
-    resize_w: int = Form(0), resize_h: int = Form(0), stripmeta: int = Form(1)
+    resize_w: int = Form(0), resize_h: int = Form(0), stripmeta: int = Form(1),
+    profile: str = Form(""), max_bytes: int = Form(0)
 ):
-    client_ip = request.client.host if request.client else "0.0.0.0"
-    if rate_limited(client_ip):
-        raise HTTPException(429, "Demasiadas solicitudes, probá en un minuto.")
     if too_big(request):
         raise HTTPException(413, f"Archivo demasiado grande. Máx {MAX_BYTES//1024//1024}MB")
-
-    # Parse pages "1-3,5"
-    pages_list = None
-    if pages.strip():
-        rngs = [p.strip() for p in pages.split(',') if p.strip()]
-        idxs = []
-        for r in rngs:
-            if '-' in r:
-                a,b = r.split('-',1)
-                a,b = int(a)-1, int(b)-1
-                idxs.extend(list(range(max(0,a), max(0,b)+1)))
-            else:
-                idxs.append(max(0, int(r)-1))
-        pages_list = sorted(set([i for i in idxs if i >= 0]))
+    pages_list = parse_pages(pages)
+    profile = check_profile(profile, PROFILE_INTERACTIVE)
+    if max_bytes < 0:
+        raise HTTPException(400, "max_bytes inválido")
 
     # Multi-upload: images -> single PDF
     if files:
         if target.lower() != "pdf":
             raise HTTPException(400, "Multi-archivo solo se permite a PDF.")
-        from PIL import Image
-        images = []
-        for uf in files:
-            b = await uf.read()
-            im = Image.open(io.BytesIO(b))
-            if im.mode in ('RGBA','P'):
-                im = im.convert('RGB')
-            # Optional resize
-            if resize_w>0 or resize_h>0:
-                w, h = im.size
-                new_w = resize_w if resize_w>0 else int(w*(resize_h/h))
-                new_h = resize_h if resize_h>0 else int(h*(resize_w/w))
-                im = im.resize((new_w, new_h))
-            images.append(im)
-        if not images:
-            raise HTTPException(400, "Sin archivos")
-        out_path = os.path.join(STORE_DIR, f"images-{int(time.time())}.pdf")
-        images[0].save(out_path, save_all=True, append_images=images[1:], format="PDF")
+        job = new_job(request, "images-pdf")
+        spooled = []
+        try:
+            for uf in files:
+                spooled.append(await spool(uf, job))
+            if not spooled:
+                raise HTTPException(400, "Sin archivos")
+            key = cache_key(hashlib.sha256("".join(s.sha256 for s in spooled).encode()).hexdigest(),
+                            kind="images-pdf", resize=(resize_w, resize_h))
+            hit = result_cache.get(key)
+            tag_convert(request, "images-pdf", "pdf", "hit" if hit else "miss")
+            if hit:
+                job.cleanup()
+                return cached_response(hit, "images.pdf")
+            out_path = job.file("images.pdf")
+            cost = sum([image_work(await image_plan(s.path, (resize_w, resize_h), "pdf"), "pdf")
+                        for s in spooled])
+            await run_engine(image_engine.images_to_pdf, [s.path for s in spooled], out_path,
+                             (resize_w, resize_h), MAX_IMAGE_PIXELS, MAX_FRAMES, cost=mp(cost))
+            cleanup_all(spooled)
+            result_cache.put_file(key, out_path, "application/pdf", "images.pdf")
+        except BaseException:
+            job.cleanup()
+            raise
+        # el job (con el PDF) se borra después de mandarlo; si el cliente corta, lo levanta el janitor
         return FileResponse(
-            out_path, filename="images.pdf", media_type="application/pdf",
-            background=BackgroundTask(lambda: os.path.exists(out_path) and os.remove(out_path))
+            out_path, filename="images.pdf", media_type="application/pdf", headers={"X-Cache": "MISS"},
+            background=BackgroundTask(job.cleanup)
         )
 
     # Single file
-    if not file:
-        raise HTTPException(400, "Falta archivo")
-    name = file.filename or "input"
-    ext = os.path.splitext(name)[1].lower()
+    name, ext, tgt = check_single(file, target)
+    if max_bytes and (ext == ".pdf" or tgt not in image_engine.FIT_TARGETS):
+        raise HTTPException(400, "max_bytes solo aplica a imágenes con destino JPG o WEBP")
 
-    if ext in image_engine.SUPPORTED_FROM:
-        content = await file.read()
-        data, mime = convert_image(content, ext, target,
-                                   quality=quality, resize=(resize_w, resize_h), strip=bool(stripmeta))
-        fname = os.path.splitext(os.path.basename(name))[0] + "." + target.lower()
-        return Response(content=data, media_type=mime,
-                        headers={"Content-Disposition": f'attachment; filename="{fname}"'})
-    elif ext == ".pdf":
-        content = await file.read()
-        if target.lower() == "zip":
-            data, mime, fname = pdf_engine.pdf_to_images(content, image_ext="jpg", dpi=dpi, pages=pages_list)
-            return Response(content=data, media_type=mime,
-                            headers={"Content-Disposition": f'attachment; filename="{fname}"'})
-        elif target.lower() in ("png","jpg","webp"):
-            data, mime, fname = pdf_engine.pdf_to_images(content, image_ext=target.lower(), dpi=dpi, pages=pages_list)
-            return Response(content=data, media_type=mime,
-                            headers={"Content-Disposition": f'attachment; filename="{fname}"'})
+    job = new_job(request, "convert")
+    streaming = False
+    try:
+        src = await spool(file, job)
+        # PIL registra .pdf como extensión (sabe escribirlos), así que va primero
+        if ext == ".pdf":
+            image_ext = "jpg" if tgt == "zip" else tgt
+            key = cache_key(src.sha256, kind="pdf", target=tgt, image_ext=image_ext, dpi=dpi,
+                            pages=pages_list, quality=quality)
+            hit = result_cache.get(key)
+            tag_convert(request, "pdf", tgt, "hit" if hit else "miss")
+            if hit:
+                return cached_response(hit, hit.filename)
+            plan = await pdf_plan(src.path, pages_list, dpi)
+            extra = dpi_headers(plan, dpi)
+            if len(plan.indices) > 1 or tgt == "zip":
+                streaming = True  # el generador del stream borra el job al terminar
+                return stream_pdf_zip(job, src, key, plan, image_ext, quality, extra)
+            (_, fname, data), = await run_engine(pdf_engine.render_pages, src.path, list(plan.indices),
+                                                 image_ext, plan.dpi, quality, cost=mp(plan.pixels))
+            mime = image_engine.mime_of_target(image_ext)
         else:
-            raise HTTPException(400, "Destino no soportado para PDF")
-    else:
+            fname = os.path.splitext(os.path.basename(name))[0] + "." + tgt
+            key = cache_key(src.sha256, kind="image", src_ext=ext, target=tgt, quality=quality,
+                            resize=(resize_w, resize_h), strip=bool(stripmeta), profile=profile,
+                            # solo si se pidió: sin max_bytes la clave es la misma que en /api/batch y /api/jobs
+                            **({"max_bytes": max_bytes} if max_bytes else {}))
+            hit = result_cache.get(key)
+            tag_convert(request, "image", tgt, "hit" if hit else "miss")
+            if hit:
+                return cached_response(hit, fname)
+            plan = await image_plan(src.path, (resize_w, resize_h), tgt)
+            if max_bytes:
+                try:
+                    data, mime, fit = await run_engine(image_engine.convert_image_fit, src.path, ext, tgt,
+                                                       max_bytes, quality, (resize_w, resize_h), bool(stripmeta),
+                                                       MAX_IMAGE_PIXELS, profile, ENCODE_THREADS, cost=mp(plan.pixels))
+                except image_engine.SizeNotReached as e:
+                    raise HTTPException(422, f"No se pudo llegar al tamaño pedido: {e}")
+                extra = fit_headers(fit)
+            else:
+                # JPEG -> JPEG que sale tal cual: sin pasar por el pool, y avisando que
+                # calidad y perfil no cambiaron nada
+                data = await asyncio.to_thread(image_engine.jpeg_passthrough, src.path, tgt, quality,
+                                               (resize_w, resize_h), bool(stripmeta))
+                if data is not None:
+                    mime, extra = image_engine.mime_of_target(tgt), {"X-Passthrough": "1"}
+                else:
+                    data, mime = await run_engine(convert_image, src.path, ext, target,
+                                                  quality=quality, resize=(resize_w, resize_h),
+                                                  strip=bool(stripmeta), max_pixels=MAX_IMAGE_PIXELS,
+                                                  profile=profile, max_frames=MAX_FRAMES,
+                                                  cost=mp(image_work(plan, tgt)))
+                    extra = {}
+        result_cache.put_bytes(key, data, mime, fname, headers=extra)
+        return Response(content=data, media_type=mime,
+                        headers={"Content-Disposition": f'attachment; filename="{fname}"', "X-Cache": "MISS",
+                                 **extra})
+    finally:
+        if not streaming:
+            job.cleanup()
+
+# ====== Lote: N archivos -> ZIP con N convertidos ======
+def unique_name(name: str, used: set) -> str:
+    """"foto.jpg", "foto (2).jpg"...: dos entradas del ZIP nunca se pisan."""
+    stem, ext = os.path.splitext(name)
+    out, n = name, 1
+    while out.lower() in used:
+        n += 1
+        out = f"{stem} ({n}){ext}"
+    used.add(out.lower())
+    return out
+
+def batch_error(exc: BaseException) -> bytes:
+    if isinstance(exc, JobTimeout):
+        return "La conversión tardó demasiado.\n".encode("utf-8")
+    return "No se pudo convertir el archivo.\n".encode("utf-8")
+
+@app.post("/api/batch")
+async def convert_batch(
+    request: Request,
+    target: str = Form(...), files: List[UploadFile] = File(...),
+    quality: int = Form(90), resize_w: int = Form(0), resize_h: int = Form(0), stripmeta: int = Form(1),
+    profile: str = Form("")
+):
+    """
+    Imágenes -> ZIP con una salida por archivo, en streaming. Los ítems se
+    reparten entre los procesos del scheduler y entran al ZIP a medida que
+    terminan (los hits del caché primero). Un ítem que falla deja
+    "<nombre>.error.txt" en el ZIP en vez de cortar el lote.
+    """
+    if too_big(request, BATCH_MAX_BYTES):
+        raise HTTPException(413, f"Lote demasiado grande. Máx {BATCH_MAX_BYTES//1024//1024}MB")
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(400, f"Máximo {BATCH_MAX_FILES} archivos por lote.")
+    tgt = target.lower()
+    if tgt not in image_engine.SUPPORTED_TO or tgt == "pdf":
+        raise HTTPException(400, "Destino no soportado para lotes")
+    resize, strip = (resize_w, resize_h), bool(stripmeta)
+    profile = check_profile(profile, PROFILE_BULK)
+
+    job = new_job(request, "batch")
+    ready = []      # (nombre, bytes): hits y errores de entrada, van primero
+    misses = []     # (clave del caché, nombre original, [nombres de salida])
+    by_key = {}     # clave -> índice en misses: el mismo archivo dos veces se convierte una
+    calls, costs = [], []
+    used = set()
+    try:
+        for uf in files:
+            name = os.path.basename(uf.filename or "input")
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in image_engine.SUPPORTED_FROM or ext == ".pdf":
+                await uf.close()
+                ready.append((unique_name(name + ".error.txt", used),
+                              "Formato de entrada no soportado en lotes.\n".encode("utf-8")))
+                continue
+            try:
+                src = await spool(uf, job)
+            except HTTPException as e:
+                ready.append((unique_name(name + ".error.txt", used), f"{e.detail}\n".encode("utf-8")))
+                continue
+            out = unique_name(os.path.splitext(name)[0] + "." + tgt, used)
+            key = cache_key(src.sha256, kind="image", src_ext=ext, target=tgt, quality=quality,
+                            resize=resize, strip=strip, profile=profile)
+            hit = result_cache.get(key)
+            if hit:
+                if hit.data is not None:
+                    ready.append((out, hit.data))
+                else:
+                    with open(hit.path, "rb") as f:
+                        ready.append((out, f.read()))
+                src.cleanup()
+                continue
+            if key in by_key:
+                misses[by_key[key]][2].append(out)
+                continue
+            try:
+                plan = await image_plan(src.path, resize, tgt)
+            except HTTPException as e:
+                ready.append((unique_name(name + ".error.txt", used), f"{e.detail}\n".encode("utf-8")))
+                continue
+            by_key[key] = len(misses)
+            misses.append((key, name, [out]))
+            calls.append((convert_image, src.path, ext, tgt, quality, resize, strip, MAX_IMAGE_PIXELS, profile,
+                          None, MAX_FRAMES))
+            costs.append(mp(image_work(plan, tgt)))
+        results = scheduler.run_each(stages.collect, calls, costs=costs)
+    except QueueFull as e:
+        job.cleanup()
+        raise HTTPException(503, "Servidor ocupado, probá de nuevo en unos segundos.",
+                            headers={"Retry-After": str(e.retry_after)})
+    except BaseException:
+        job.cleanup()
+        raise
+    tag_convert(request, "batch", tgt, "miss" if misses else "hit")
+
+    async def body():
+        try:
+            w = ZipStreamWriter()
+            for name, data in ready:
+                yield w.add(name, data)
+            async for i, res, exc in results:
+                key, name, outs = misses[i]
+                if exc is not None:
+                    yield w.add(unique_name(name + ".error.txt", used), batch_error(exc))
+                    continue
+                (data, mime), timings = res
+                observe_stages(timings)
+                result_cache.put_bytes(key, data, mime, outs[0])
+                for out in outs:
+                    yield w.add(out, data)
+            yield w.close()
+        finally:
+            await results.aclose()
+            job.cleanup()
+
+    return StreamingResponse(body(), media_type="application/zip",
+                             headers={"Content-Disposition": 'attachment; filename="convertidos.zip"',
+                                      "X-Batch-Items": str(len(files))})
+
+def parse_outputs(raw: str) -> List[tuple]:
+    """
+    outputs de /api/variants: JSON [{"target": "webp", "width": 800, "height": 0,
+    "quality": 80}, ...] -> [(target, (w, h), quality)] validado.
+    """
+    try:
+        items = json.loads(raw or "[]")
+        if not isinstance(items, list):
+            raise ValueError
+        specs = []
+        for it in items:
+            tgt = str(it["target"]).lower()
+            w, h, q = int(it.get("width") or 0), int(it.get("height") or 0), int(it.get("quality") or 90)
+            if tgt not in image_engine.SUPPORTED_TO or tgt == "pdf" or min(w, h) < 0 or not 1 <= q <= 100:
+                raise ValueError
+            specs.append((tgt, (w, h), q))
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise HTTPException(400, 'outputs inválido: [{"target": "webp", "width": 800, "quality": 80}, ...]')
+    if not 1 <= len(specs) <= VARIANTS_MAX:
+        raise HTTPException(400, f"Entre 1 y {VARIANTS_MAX} salidas por request.")
+    return specs
+
+def stream_variants_zip(job: JobDir, key: str, entries: List[tuple]) -> StreamingResponse:
+    """
+    Las salidas de /api/variants como ZIP en streaming (ZipStreamWriter, como
+    stream_pdf_zip): cada entrada se suelta apenas sale, sin armar el ZIP entero
+    en memoria; se copia a un .tmp del job para el caché. `entries` es
+    [(nombre, bytes)] y se vacía a medida que se escribe. El job se borra al terminar.
+    """
+    tmp_path = job.file("variantes.zip.tmp")
+
+    async def body():
+        complete = False
+        try:
+            with open(tmp_path, "wb") as tee:
+                w = ZipStreamWriter()
+                while entries:
+                    name, data = entries.pop(0)
+                    chunk = w.add(name, data)
+                    tee.write(chunk)
+                    yield chunk
+                chunk = w.close()
+                tee.write(chunk)
+                yield chunk
+            complete = True
+        finally:
+            if complete:
+                result_cache.put_file(key, tmp_path, "application/zip", "variantes.zip", move=True)
+            job.cleanup()
+
+    return StreamingResponse(body(), media_type="application/zip",
+                             headers={"Content-Disposition": 'attachment; filename="variantes.zip"',
+                                      "X-Cache": "MISS"})
+
+@app.post("/api/variants")
+async def convert_variants(
+    request: Request,
+    file: UploadFile = File(...), outputs: str = Form(...), format: str = Form("zip"),
+    stripmeta: int = Form(1), profile: str = Form("")
+):
+    """
+    Una imagen -> varias salidas (formatos y/o anchos de un srcset) con un solo
+    decode: ver image_engine.convert_image_many. Responde un ZIP o, con
+    format=json, un manifiesto con cada salida en base64.
+    """
+    if too_big(request):
+        raise HTTPException(413, f"Archivo demasiado grande. Máx {MAX_BYTES//1024//1024}MB")
+    specs = parse_outputs(outputs)
+    fmt = format.lower()
+    if fmt not in ("zip", "json"):
+        raise HTTPException(400, "format debe ser zip o json")
+    profile = check_profile(profile, PROFILE_INTERACTIVE)
+    name = os.path.basename(file.filename or "input")
+    stem, ext = os.path.splitext(name)
+    if ext.lower() not in image_engine.SUPPORTED_FROM or ext.lower() == ".pdf":
         raise HTTPException(400, "Formato de entrada no soportado aún")
 
+    job = new_job(request, "variants")
+    streaming = False
+    try:
+        src = await spool(file, job)
+        key = cache_key(src.sha256, kind="variants", src_ext=ext.lower(), outputs=specs, format=fmt,
+                        strip=bool(stripmeta), profile=profile)
+        hit = result_cache.get(key)
+        tag_convert(request, "variants", fmt, "hit" if hit else "miss")
+        if hit:
+            return cached_response(hit, hit.filename)
+        plan = await image_plan(src.path, None)
+        cost = plan.pixels
+        for _, resize, _ in specs:
+            out = probe.resize_target((plan.width, plan.height), resize)
+            if out and out[0] * out[1] > MAX_IMAGE_PIXELS:
+                raise HTTPException(413, f"Imagen demasiado grande: {out[0]}x{out[1]} supera el máximo "
+                                         f"de {MAX_IMAGE_PIXELS / 1e6:.0f} MP")
+            cost += out[0] * out[1] if out else plan.decode_pixels
+        results = await run_engine(image_engine.convert_image_many, src.path, ext.lower(), specs,
+                                   bool(stripmeta), MAX_IMAGE_PIXELS, profile, ENCODE_THREADS, cost=mp(cost))
+        src.cleanup()
+
+        used, items = set(), []
+        for (tgt, resize, q), (data, mime, (w, h)) in zip(specs, results):
+            suffix = f"-{w}x{h}" if any(resize) else ""
+            items.append((unique_name(f"{stem}{suffix}.{tgt}", used), tgt, w, h, q, data, mime))
+        if fmt == "zip":
+            streaming = True  # el generador del stream borra el job al terminar
+            return stream_variants_zip(job, key, [(n, d) for n, _, _, _, _, d, _ in items])
+    finally:
+        if not streaming:
+            job.cleanup()
+
+    body = json.dumps({"items": [
+        {"name": n, "target": t, "width": w, "height": h, "quality": q, "bytes": len(d), "mime": m,
+         "data": base64.b64encode(d).decode("ascii")}
+        for n, t, w, h, q, d, m in items
+    ]}).encode("utf-8")
+    result_cache.put_bytes(key, body, "application/json", "variantes.json")
+    return Response(content=body, media_type="application/json",
+                    headers={"Content-Disposition": 'attachment; filename="variantes.json"', "X-Cache": "MISS"})
+
+# ====== Jobs asíncronos ======
+# Conversiones largas fuera del request: POST /api/jobs spoolea, encola y responde
+# el id; el runner las corre en el scheduler y el resultado queda ZC_ASYNC_TTL
+# segundos (ver services/jobs.py). La cola es SQLite: sobrevive a un restart; los
+# directorios de los jobs salen de `storage`, con su cuota y su janitor.
+jobs = JobStore(os.path.join(STORE_DIR, "async"), storage)
+
+def keep_hit(hit: CachedResult, dest: str):
+    """Deja un hit del caché en el directorio del job (el caché lo puede desalojar antes del TTL)."""
+    if hit.data is not None:
+        with open(dest, "wb") as f:
+            f.write(hit.data)
+        return
+    try:
+        os.link(hit.path, dest)
+    except OSError:
+        shutil.copyfile(hit.path, dest)
+
+async def run_pdf_job(job: Job, progress):
+    p, (inp,) = job.params, job.inputs
+    src, tgt, dpi, quality = job.file(inp["name"]), p["target"], p["dpi"], p["quality"]
+    image_ext = "jpg" if tgt == "zip" else tgt
+    key = cache_key(inp["sha256"], kind="pdf", target=tgt, image_ext=image_ext, dpi=dpi,
+                    pages=p["pages"], quality=quality)
+    hit = result_cache.get(key)
+    if hit:
+        out = job.file("result-" + hit.filename)
+        keep_hit(hit, out)
+        await progress(1, 1)  # del caché no sabemos cuántas páginas eran
+        return out, hit.mime, hit.filename
+    plan = await pdf_plan(src, p["pages"], dpi)
+    total = len(plan.indices)
+    await progress(0, total)
+    if total == 1 and tgt != "zip":
+        (_, fname, data), = await run_engine(pdf_engine.render_pages, src, list(plan.indices), image_ext,
+                                             plan.dpi, quality, cost=mp(plan.pixels))
+        mime = image_engine.mime_of_target(image_ext)
+        out = job.file("result-" + fname)
+        with open(out, "wb") as f:
+            f.write(data)
+        result_cache.put_bytes(key, data, mime, fname)
+        return out, mime, fname
+
+    out, done = job.file("pages.zip"), 0
+    calls, costs = pdf_calls(src, plan, image_ext, quality)
+    results = scheduler.run_many(stages.collect, calls, costs=costs)
+    try:
+        with open(out, "wb") as f:
+            w = ZipStreamWriter()
+            async for rendered, timings in results:
+                observe_stages(timings)
+                for _, name, data in rendered:
+                    f.write(w.add(name, data))
+                done += len(rendered)
+                await progress(done, total)
+            f.write(w.close())
+    finally:
+        await results.aclose()
+    result_cache.put_file(key, out, "application/zip", "pages.zip")
+    return out, "application/zip", "pages.zip"
+
+async def run_image_job(job: Job, progress):
+    p, (inp,) = job.params, job.inputs
+    tgt, resize, profile = p["target"], tuple(p["resize"]), p.get("profile", PROFILE_BULK)
+    ext = os.path.splitext(inp["filename"])[1].lower()
+    fname = os.path.splitext(os.path.basename(inp["filename"]))[0] + "." + tgt
+    out = job.file("result." + tgt)
+    key = cache_key(inp["sha256"], kind="image", src_ext=ext, target=tgt, quality=p["quality"],
+                    resize=resize, strip=bool(p["stripmeta"]), profile=profile)
+    hit = result_cache.get(key)
+    if hit:
+        keep_hit(hit, out)
+        await progress(1, 1)
+        return out, hit.mime, fname
+    await progress(0, 1)
+    src = job.file(inp["name"])
+    plan = await image_plan(src, resize, tgt)
+    data, mime = await run_engine(convert_image, src, ext, tgt, quality=p["quality"], resize=resize,
+                                  strip=bool(p["stripmeta"]), max_pixels=MAX_IMAGE_PIXELS, profile=profile,
+                                  max_frames=MAX_FRAMES, cost=mp(image_work(plan, tgt)))
+    with open(out, "wb") as f:
+        f.write(data)
+    result_cache.put_bytes(key, data, mime, fname)
+    return out, mime, fname
+
+async def run_images_pdf_job(job: Job, progress):
+    resize = tuple(job.params["resize"])
+    key = cache_key(hashlib.sha256("".join(i["sha256"] for i in job.inputs).encode()).hexdigest(),
+                    kind="images-pdf", resize=resize)
+    out = job.file("images.pdf")
+    hit = result_cache.get(key)
+    if hit:
+        keep_hit(hit, out)
+        await progress(len(job.inputs), len(job.inputs))
+    else:
+        await progress(0, len(job.inputs))
+        srcs = [job.file(i["name"]) for i in job.inputs]
+        cost = sum([image_work(await image_plan(src, resize, "pdf"), "pdf") for src in srcs])
+        await run_engine(image_engine.images_to_pdf, srcs, out, resize, MAX_IMAGE_PIXELS, MAX_FRAMES,
+                         cost=mp(cost))
+        result_cache.put_file(key, out, "application/pdf", "images.pdf")
+    return out, "application/pdf", "images.pdf"
+
+JOB_HANDLERS = {"pdf": run_pdf_job, "image": run_image_job, "images-pdf": run_images_pdf_job}
+
+async def run_job(job: Job, progress):
+    """Handler de JobRunner: devuelve (archivo resultado, mime, nombre de descarga)."""
+    try:
+        return await JOB_HANDLERS[job.kind](job, progress)
+    except QueueFull as e:
+        raise JobRetry(e.retry_after)
+    except HTTPException as e:
+        if e.status_code == 503:  # run_engine: pool lleno, se reintenta más tarde
+            raise JobRetry(int((e.headers or {}).get("Retry-After", 5)))
+        raise
+
+job_runner = JobRunner(jobs, run_job)
+
+def job_status(job: Job) -> dict:
+    d = {"id": job.id, "state": job.state, "kind": job.kind, "done": job.done, "total": job.total,
+         "status_url": f"/api/jobs/{job.id}"}
+    if job.state == "error":
+        d["error"] = job.error
+    if job.state == "done":
+        d.update(result_url=f"/api/jobs/{job.id}/result", filename=job.filename,
+                 expires_in=max(0, int(job.expires - time.time())))
+    return d
+
+@app.post("/api/jobs", status_code=202)
+async def create_job(
+    request: Request,
+    target: str = Form(...), route: str = Form(None),
+    file: UploadFile = File(None), files: List[UploadFile] = File(None),
+    quality: int = Form(90), dpi: int = Form(144), pages: str = Form(""),
+    resize_w: int = Form(0), resize_h: int = Form(0), stripmeta: int = Form(1),
+    profile: str = Form("")
+):
+    """Mismos campos que /api/convert; responde 202 con el id y las URLs de estado/resultado."""
+    if too_big(request):
+        raise HTTPException(413, f"Archivo demasiado grande. Máx {MAX_BYTES//1024//1024}MB")
+    params = {"target": target.lower(), "quality": quality, "dpi": dpi, "pages": parse_pages(pages),
+              "resize": [resize_w, resize_h], "stripmeta": stripmeta,
+              "profile": check_profile(profile, PROFILE_BULK)}
+    if files:
+        if params["target"] != "pdf":
+            raise HTTPException(400, "Multi-archivo solo se permite a PDF.")
+        kind, uploads = "images-pdf", files
+    else:
+        _, ext, _ = check_single(file, target)
+        kind, uploads = ("pdf" if ext == ".pdf" else "image"), [file]
+
+    try:
+        jd = await asyncio.to_thread(jobs.prepare, declared_bytes(request))
+    except JobsFull:
+        raise HTTPException(503, "Hay demasiadas conversiones en cola, probá en un rato.",
+                            headers={"Retry-After": "30"})
+    except StorageFull:
+        raise HTTPException(503, "Servidor ocupado, probá de nuevo en unos segundos.",
+                            headers={"Retry-After": "30"})
+    try:
+        inputs = []
+        for uf in uploads:
+            s = await spool(uf, jd)
+            inputs.append({"name": os.path.basename(s.path), "filename": s.filename, "sha256": s.sha256})
+        job = await asyncio.to_thread(jobs.submit, jd, kind, params, inputs)
+    except BaseException:
+        jd.cleanup()
+        raise
+    job_runner.wake()
+    return JSONResponse(job_status(job), status_code=202,
+                        headers={"Location": f"/api/jobs/{job.id}", "Cache-Control": "no-store"})
+
+def get_job(job_id: str) -> Job:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "El trabajo no existe o ya venció")
+    return job
+
+@app.get("/api/jobs/{job_id}")
+def job_info(job_id: str):
+    return JSONResponse(job_status(get_job(job_id)), headers={"Cache-Control": "no-store"})
+
+@app.get("/api/jobs/{job_id}/result")
+def job_result(job_id: str):
+    job = get_job(job_id)
+    if job.state != "done":
+        raise HTTPException(409, job.error if job.state == "error" else "La conversión todavía no terminó")
+    path = job.file(job.result)
+    if not os.path.exists(path):
+        raise HTTPException(404, "El trabajo no existe o ya venció")
+    return FileResponse(path, filename=job.filename, media_type=job.mime)
+
 # ====== SEO util ======
 @app.get("/robots.txt", response_class=PlainTextResponse)
 def robots():
@@ -489,6 +1164,7 @@ def robots():
         "Allow: /\n"
         "Disallow: /api/\n"
         "Disallow: /healthz\n"
+        "Disallow: /metrics\n"
         "Sitemap: https://zetaconvert.online/sitemap.xml\n"
     )
 
@@ -524,11 +1200,48 @@ def manifest():
         "name":"ZetaConvert","short_name":"ZetaConvert","start_url":"/","display":"standalone",
         "background_color":"#ffffff","theme_color":"#e1192a",
         "icons":[
-            {"src":"/static/icons/icon-192.png","sizes":"192x192","type":"image/png"},
-            {"src":"/static/icons/icon-512.png","sizes":"512x512","type":"image/png"}
+            {"src":assets.url("icons/icon-192.png"),"sizes":"192x192","type":"image/png"},
+            {"src":assets.url("icons/icon-512.png"),"sizes":"512x512","type":"image/png"}
         ]
     }
 
+# ====== Métricas ======
+def _collect_runtime():
+    SCHED_PENDING.set(scheduler.pending)
+    SCHED_WORKERS.set(scheduler.workers)
+    SCHED_COST.set(scheduler.pending_cost)
+    for tier, n in (("hit_mem", result_cache.hits_mem), ("hit_disk", result_cache.hits_disk),
+                    ("miss", result_cache.misses)):
+        RESULT_CACHE.set(n, result=tier)
+    PAGE_CACHE.set(page_cache.hits, result="hit")
+    PAGE_CACHE.set(page_cache.misses, result="miss")
+    for area, u in storage.usage().items():
+        STORAGE_BYTES.set(u["bytes"], area=area)
+    ASYNC_RUNNING.set(job_runner.running)
+
+SCHED_PENDING = metrics.gauge("zc_scheduler_pending", "Jobs corriendo + en cola en el pool")
+SCHED_WORKERS = metrics.gauge("zc_scheduler_workers", "Procesos del pool")
+SCHED_COST = metrics.gauge("zc_scheduler_pending_mp", "Megapíxeles en vuelo en el pool (admisión por costo)")
+RESULT_CACHE = metrics.counter("zc_result_cache_total", "Búsquedas en el caché de resultados", ("result",))
+PAGE_CACHE = metrics.counter("zc_page_cache_total", "Búsquedas en el caché de HTML", ("result",))
+STORAGE_BYTES = metrics.gauge("zc_storage_bytes", "Uso estimado de los directorios de job", ("area",))
+ASYNC_RUNNING = metrics.gauge("zc_async_running", "Jobs de /api/jobs corriendo en este worker")
+metrics.on_collect(_collect_runtime)
+
+def _metrics_allowed(request: Request) -> bool:
+    if not METRICS_TOKEN:
+        return False
+    auth = request.headers.get("authorization") or ""
+    given = auth[7:].strip() if auth[:7].lower() == "bearer " else request.query_params.get("token") or ""
+    return hmac.compare_digest(given.encode(), METRICS_TOKEN.encode())
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics_endpoint(request: Request):
+    # 404 y no 401: sin token la ruta no existe (ni se anuncia)
+    if not _metrics_allowed(request):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(render(metrics.collect_all()), media_type="text/plain; version=0.0.4")
+
 @app.get("/healthz")
 def health():
     return {"ok": True}
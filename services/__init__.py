@@ -0,0 +1,10 @@
+# Servicios de infraestructura (scheduler, cachés, storage...) compartidos por main.py
+import os
+
+
+def env_float(name: str, default: float) -> float:
+    """Lee un número de una variable de entorno; vacío o inválido => default."""
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
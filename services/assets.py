@@ -0,0 +1,194 @@
+# assets.py
+"""
+Archivos de static/ con URL atada al contenido.
+
+Al arrancar se recorre static/, se hashea cada archivo y se precalculan las
+variantes gzip (+ brotli si el módulo está instalado) de los tipos de texto.
+Todo queda en memoria (static/ pesa ~130 KB; lo que pase `max_file_bytes`
+lo sirve StaticFiles tal cual).
+
+- asset_url("css/styles.css") -> "/static/css/styles.3fa9c01b2e.css"
+- /static/<nombre con hash>: `Cache-Control: immutable` por un año; quien
+  vuelve a la página no hace ni un request por assets
+- /static/<nombre original>: sigue andando (sw.js, links externos) con
+  no-cache + ETag
+- un hash que ya no es el actual (HTML de antes de un deploy) sirve el
+  contenido de hoy, pero sin immutable
+
+Igual que el catálogo, se re-escanea solo si cambió algún mtime o tamaño, y
+como mucho una vez por `check_interval` segundos: editar un .css en dev no
+pide reiniciar, y los archivos que no cambiaron no se vuelven a comprimir.
+"""
+from __future__ import annotations
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from services.page_cache import RenderedPage, build_variants, etag_matches
+
+HASH_LEN = 10
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+# Tipos que vale la pena comprimir (PNG/JPEG/WOFF2 ya vienen comprimidos)
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "application/manifest+json",
+                 "image/svg+xml", "application/xml")
+# nombre.<hash>.ext
+_HASHED_RE = re.compile(r"^(.+)\.([0-9a-f]{%d})(\.[^./]+)$" % HASH_LEN)
+
+
+def hashed_name(path: str, digest: str) -> str:
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{digest[:HASH_LEN]}{ext}"
+
+
+@dataclass(frozen=True)
+class Asset:
+    path: str            # relativo a static/, con "/"
+    hashed: str          # ej. "css/styles.3fa9c01b2e.css"
+    media_type: str
+    body: RenderedPage   # identity (+ gzip/br) con su ETag
+    stamp: Tuple[int, int]   # (mtime_ns, tamaño) del escaneo
+
+    @property
+    def compressed(self) -> bool:
+        return len(self.body.variants) > 1
+
+
+@dataclass(frozen=True)
+class AssetManifest:
+    by_path: Dict[str, Asset]
+    by_hashed: Dict[str, Asset]
+    version: str         # cambia si cambia cualquier archivo
+
+
+def _media_type(path: str) -> str:
+    mt = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if mt == "application/json" and path.endswith(".webmanifest"):
+        mt = "application/manifest+json"
+    return mt
+
+
+def _load(root: Path, rel: str, stamp: Tuple[int, int]) -> Asset:
+    raw = (root / rel).read_bytes()
+    mt = _media_type(rel)
+    body = RenderedPage(build_variants(raw, compress=mt.startswith(_COMPRESSIBLE)))
+    return Asset(rel, hashed_name(rel, hashlib.sha256(raw).hexdigest()), mt, body, stamp)
+
+
+class AssetStore:
+    """
+    assets = AssetStore(STATIC_DIR)
+    assets.url("js/main.js")      # para los templates
+    app.mount("/static", AssetFiles(assets), name="static")
+    """
+    def __init__(self, root: Path, prefix: str = "/static", check_interval: float = 1.0,
+                 max_file_bytes: int = 1024 * 1024):
+        self.root = Path(root)
+        self.prefix = prefix.rstrip("/")
+        self.check_interval = check_interval
+        self.max_file_bytes = max_file_bytes
+        self._snap: Optional[AssetManifest] = None
+        self._stamps = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        out = {}
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                if st.st_size <= self.max_file_bytes:
+                    rel = os.path.relpath(full, self.root).replace(os.sep, "/")
+                    out[rel] = (st.st_mtime_ns, st.st_size)
+        return out
+
+    def get(self) -> AssetManifest:
+        now = time.monotonic()
+        snap = self._snap
+        if snap is not None and now - self._checked_at < self.check_interval:
+            return snap
+        with self._lock:
+            self._checked_at = now
+            stamps = self._scan()
+            if self._snap is not None and stamps == self._stamps:
+                return self._snap
+            old = self._snap.by_path if self._snap else {}
+            by_path = {}
+            for rel, stamp in stamps.items():
+                prev = old.get(rel)
+                if prev is not None and prev.stamp == stamp:
+                    by_path[rel] = prev
+                    continue
+                try:
+                    by_path[rel] = _load(self.root, rel, stamp)
+                except OSError:
+                    continue
+            version = hashlib.sha256("\n".join(sorted(a.hashed for a in by_path.values())).encode())
+            self._snap = AssetManifest(by_path, {a.hashed: a for a in by_path.values()},
+                                       version.hexdigest()[:16])
+            self._stamps = stamps
+            return self._snap
+
+    @property
+    def version(self) -> str:
+        return self.get().version
+
+    def url(self, path: str) -> str:
+        """URL con hash para un archivo de static/; si no está en el manifiesto, la URL común."""
+        path = path.lstrip("/")
+        asset = self.get().by_path.get(path)
+        return f"{self.prefix}/{quote(asset.hashed if asset else path)}"
+
+    def lookup(self, path: str) -> Tuple[Optional[Asset], bool]:
+        """(asset, immutable) para un path pedido relativo a static/."""
+        snap = self.get()
+        asset = snap.by_hashed.get(path)
+        if asset is not None:
+            return asset, True
+        asset = snap.by_path.get(path)
+        if asset is None:
+            m = _HASHED_RE.match(path)
+            if m:
+                asset = snap.by_path.get(m.group(1) + m.group(3))
+        return asset, False
+
+
+class AssetFiles(StaticFiles):
+    """StaticFiles que sirve desde el manifiesto en memoria (con hash y precomprimido)."""
+    def __init__(self, store: AssetStore, **kwargs):
+        super().__init__(directory=str(store.root), **kwargs)
+        self.store = store
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+        asset, immutable = self.store.lookup(path.replace(os.sep, "/"))
+        if asset is None:
+            return await super().get_response(path, scope)
+        req = Headers(scope=scope)
+        encoding, body, etag = asset.body.pick(req.get("accept-encoding", ""))
+        headers = {"ETag": etag, "Cache-Control": IMMUTABLE if immutable else REVALIDATE}
+        if asset.compressed:
+            headers["Vary"] = "Accept-Encoding"
+        if etag_matches(req.get("if-none-match"), asset.body.etags()):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=asset.media_type, headers=headers)
@@ -0,0 +1,133 @@
+# catalog.py
+"""
+Catálogo de formatos (static/formats.map.json + formats.status.json) en memoria.
+
+Se parsea una vez y se precalcula todo lo que usan las páginas y la API:
+ext_to_id, id_to_fmt, enabled_ids, destinos habilitados por extensión, y los
+cuerpos JSON ya serializados con su ETag (hash del contenido). Solo se recarga
+cuando cambia el mtime de alguno de los dos archivos; el stat se hace como
+mucho una vez por `check_interval` segundos.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, List, Optional
+
+
+def _load_json_safe(p: Path, default):
+    try:
+        with p.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def content_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    ext_to_id: Dict[str, str]
+    id_to_fmt: Dict[str, dict]
+    enabled_ids: FrozenSet[str]
+    # ext origen habilitada -> destinos (ext) habilitados según el mapa
+    targets_by_ext: Dict[str, List[str]]
+    map_body: bytes
+    map_etag: str
+    status_body: bytes
+    status_etag: str
+    version: str = field(default="")
+
+    def is_enabled_ext(self, ext: str) -> bool:
+        fid = self.ext_to_id.get((ext or "").lower())
+        return bool(fid and fid in self.enabled_ids)
+
+    def enabled_targets_for_ext(self, ext: str) -> List[str]:
+        return self.targets_by_ext.get((ext or "").lower(), [])
+
+
+def build_snapshot(mp: dict, st: dict) -> CatalogSnapshot:
+    ext_to_id = {}
+    id_to_fmt = {}
+    for arr in mp.get("categories", {}).values():
+        for f in (arr or []):
+            fid = f.get("id")
+            ext = (f.get("ext") or "").lower()
+            if fid and ext:
+                ext_to_id[ext] = fid
+                id_to_fmt[fid] = f
+
+    enabled_ids = frozenset(s["id"] for s in (st.get("status") or [])
+                            if s.get("id") and s.get("enabled") is True)
+
+    targets_by_ext = {}
+    for ext, fid in ext_to_id.items():
+        outs = []
+        for tid in (id_to_fmt[fid].get("targets") or []):
+            if tid in enabled_ids:
+                tf = id_to_fmt.get(tid)
+                if tf and tf.get("ext"):
+                    outs.append(tf["ext"].lower())
+        targets_by_ext[ext] = outs
+
+    map_body = json.dumps(mp, ensure_ascii=False).encode("utf-8")
+    status_body = json.dumps(st, ensure_ascii=False).encode("utf-8")
+    map_etag, status_etag = content_etag(map_body), content_etag(status_body)
+    return CatalogSnapshot(
+        ext_to_id=ext_to_id, id_to_fmt=id_to_fmt, enabled_ids=enabled_ids,
+        targets_by_ext=targets_by_ext,
+        map_body=map_body, map_etag=map_etag,
+        status_body=status_body, status_etag=status_etag,
+        version=hashlib.sha256((map_etag + status_etag).encode()).hexdigest()[:16],
+    )
+
+
+class FormatCatalog:
+    def __init__(self, map_path: Path, status_path: Path, check_interval: float = 1.0):
+        self.map_path = Path(map_path)
+        self.status_path = Path(status_path)
+        self.check_interval = check_interval
+        self._snap: Optional[CatalogSnapshot] = None
+        self._mtimes = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[CatalogSnapshot], None]] = []
+
+    def _stat(self):
+        out = []
+        for p in (self.map_path, self.status_path):
+            try:
+                out.append(p.stat().st_mtime_ns)
+            except FileNotFoundError:
+                out.append(None)
+        return tuple(out)
+
+    def on_reload(self, fn: Callable[[CatalogSnapshot], None]):
+        """Registra un callback que corre (con el snapshot nuevo) en cada recarga."""
+        self._listeners.append(fn)
+
+    def get(self) -> CatalogSnapshot:
+        now = time.monotonic()
+        snap = self._snap
+        if snap is not None and now - self._checked_at < self.check_interval:
+            return snap
+        with self._lock:
+            self._checked_at = now
+            mtimes = self._stat()
+            if self._snap is not None and mtimes == self._mtimes:
+                return self._snap
+            snap = build_snapshot(
+                _load_json_safe(self.map_path, {"categories": {}}),
+                _load_json_safe(self.status_path, {"status": []}),
+            )
+            changed = self._snap is None or snap.version != self._snap.version
+            self._snap, self._mtimes = snap, mtimes
+        if changed:
+            for fn in self._listeners:
+                fn(snap)
+        return snap
@@ -0,0 +1,128 @@
+# ingest.py
+"""
+Ingesta de uploads sin cargarlos en memoria.
+
+- BodySizeLimit: middleware ASGI que cuenta los bytes REALES del body (no confía
+  en Content-Length, así un upload chunked no se saltea MAX_BYTES).
+- spool_upload: copia un UploadFile por bloques a un archivo bajo STORE_DIR,
+  calculando el sha256 mientras streamea. Los engines reciben la ruta.
+"""
+from __future__ import annotations
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from fastapi import UploadFile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """El body/archivo superó el máximo permitido."""
+
+
+@dataclass
+class SpooledUpload:
+    path: str
+    filename: str
+    size: int
+    sha256: str
+
+    @property
+    def ext(self) -> str:
+        return os.path.splitext(self.filename)[1].lower()
+
+    def cleanup(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def spool_upload(upload: UploadFile, spool_dir: str, max_bytes: int) -> SpooledUpload:
+    """Streamea upload a spool_dir en bloques de CHUNK_SIZE. Levanta UploadTooLarge."""
+    name = upload.filename or "input"
+    ext = os.path.splitext(name)[1].lower()
+    path = os.path.join(spool_dir, f"up-{uuid.uuid4().hex}{ext}")
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(name)
+                h.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    finally:
+        await upload.close()
+    return SpooledUpload(path=path, filename=name, size=size, sha256=h.hexdigest())
+
+
+def cleanup_all(items: Iterable[Optional[SpooledUpload]]):
+    for it in items:
+        if it is not None:
+            it.cleanup()
+
+
+class BodySizeLimit:
+    """
+    Corta con 413 cualquier request a `prefixes` cuyo body supere max_bytes,
+    contando lo recibido (sirve para Transfer-Encoding: chunked).
+    `overrides` da otro tope a rutas puntuales: {"/api/batch": 200 * MB}.
+    """
+    def __init__(self, app, max_bytes: int, prefixes=("/api/",), overrides: Optional[dict] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.prefixes = tuple(prefixes)
+        self.overrides = dict(overrides or {})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefixes):
+            return await self.app(scope, receive, send)
+
+        max_bytes = self.overrides.get(scope["path"], self.max_bytes)
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    exceeded = True
+                    raise UploadTooLarge(scope["path"])
+            return message
+
+        async def tracking_send(message):
+            nonlocal started
+            # FastAPI convierte errores de parseo del form en 400: si el motivo
+            # fue el límite, descartamos esa respuesta y mandamos el 413 nuestro
+            if exceeded:
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except UploadTooLarge:
+            pass
+        if exceeded and not started:
+            mb = max_bytes // 1024 // 1024
+            body = f'{{"detail":"Archivo demasiado grande. Máx {mb}MB"}}'.encode("utf-8")
+            await send({"type": "http.response.start", "status": 413,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(body)).encode())]})
+            await send({"type": "http.response.body", "body": body})
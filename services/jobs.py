@@ -0,0 +1,353 @@
+# jobs.py
+"""
+Cola persistente de conversiones asíncronas (POST /api/jobs).
+
+Un PDF grande o un lote de imágenes no tiene por qué terminar dentro de un
+request HTTP: el handler spoolea los uploads al directorio del job, lo encola
+y responde enseguida con el id. JobRunner toma jobs de la cola y los corre con
+el handler que le pasa main.py (que a su vez usa el scheduler).
+
+Estado en SQLite (WAL) bajo el directorio raíz, compartido por todos los
+workers de uvicorn del host. Cada job tiene además su directorio, pedido a
+Storage (services/storage.py) como cualquier otro: con los uploads mientras
+está pendiente y solo con el resultado una vez terminado.
+
+  queued -> running -> done | error
+
+- reclamar un job es un UPDATE dentro de BEGIN IMMEDIATE: varios runners sobre
+  la misma base nunca toman el mismo job
+- un job `running` tiene un lease que su runner renueva; si el proceso muere
+  (restart, OOM) el lease vence y otro runner lo retoma, hasta MAX_ATTEMPTS
+- los terminados se guardan ZC_ASYNC_TTL segundos; después el barrido borra
+  la fila y el directorio
+- ZC_ASYNC_MAX_QUEUED acota los jobs pendientes; el disco (uploads y
+  resultados) cuenta en la cuota de Storage. El janitor de Storage no toca el
+  directorio de un job con fila (live_paths): pendiente, corriendo o terminado
+  sin vencer. Solo sweep() lo borra, a los ZC_ASYNC_TTL segundos de terminar;
+  mientras tanto, si la cuota se llena, los jobs nuevos reciben StorageFull
+"""
+from __future__ import annotations
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from . import env_float
+from .storage import JobDir, Storage
+
+LEASE_SECS = 60          # un runner vivo lo renueva cada LEASE_SECS / 3
+MAX_ATTEMPTS = 3
+SWEEP_EVERY = 60.0
+
+
+class JobsFull(Exception):
+    """Demasiados jobs pendientes; el caller debería responder 503."""
+
+
+class JobRetry(Exception):
+    """El handler no pudo arrancar (pool lleno): el job vuelve a la cola en `after` segundos."""
+    def __init__(self, after: float):
+        super().__init__(f"reintentar en {after}s")
+        self.after = after
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    state: str
+    params: dict
+    inputs: List[dict]             # [{"name": archivo en el dir del job, "filename", "sha256"}]
+    path: str                      # directorio del job (de Storage)
+    done: int = 0
+    total: int = 0
+    attempts: int = 0
+    created: float = 0.0
+    error: Optional[str] = None
+    result: Optional[str] = None   # archivo resultado dentro del dir del job
+    mime: Optional[str] = None
+    filename: Optional[str] = None
+    expires: Optional[float] = None
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.path, os.path.basename(name))
+
+
+_COLUMNS = ("id, kind, state, params, inputs, done, total, attempts, created, error, "
+            "result, mime, filename, expires, path")
+
+
+class JobStore:
+    """
+    store = JobStore("/tmp/zc/async", storage)
+    jd = store.prepare(expected_bytes=n)  # directorio para spoolear los uploads
+    job = store.submit(jd, "pdf", {...}, [{"name": ..., ...}])
+    store.get(job.id).state               # queued / running / done / error
+    """
+    def __init__(self, root: str, storage: Storage, ttl: Optional[float] = None,
+                 max_queued: Optional[int] = None):
+        self.root = root
+        self.storage = storage
+        self.ttl = float(ttl if ttl is not None else env_float("ZC_ASYNC_TTL", 3600))
+        self.max_queued = int(max_queued if max_queued is not None else env_float("ZC_ASYNC_MAX_QUEUED", 100))
+        self._local = threading.local()
+        os.makedirs(root, exist_ok=True)
+        storage.add_pinned(self.live_paths)
+        db = self._conn()
+        db.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                   "id TEXT PRIMARY KEY, kind TEXT NOT NULL, state TEXT NOT NULL, "
+                   "params TEXT NOT NULL, inputs TEXT NOT NULL, "
+                   "done INTEGER NOT NULL DEFAULT 0, total INTEGER NOT NULL DEFAULT 0, "
+                   "attempts INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL, updated REAL NOT NULL, "
+                   "not_before REAL NOT NULL DEFAULT 0, owner TEXT, lease_until REAL, "
+                   "error TEXT, result TEXT, mime TEXT, filename TEXT, expires REAL, path TEXT)")
+        if "path" not in {r[1] for r in db.execute("PRAGMA table_info(jobs)")}:
+            db.execute("ALTER TABLE jobs ADD COLUMN path TEXT")  # base de antes de usar Storage
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created)")
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(os.path.join(self.root, "jobs.sqlite3"), timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _row(self, row) -> Job:
+        (id_, kind, state, params, inputs, done, total, attempts, created, error,
+         result, mime, filename, expires, path) = row
+        return Job(id_, kind, state, json.loads(params), json.loads(inputs), path or os.path.join(self.root, id_),
+                   done, total, attempts, created, error, result, mime, filename, expires)
+
+    # ---- alta ----
+    def prepare(self, expected_bytes: int = 0) -> JobDir:
+        """
+        Directorio para un job nuevo (todavía sin fila), reservando expected_bytes
+        en la cuota. Levanta JobsFull si la cola está llena y StorageFull si no hay disco.
+        """
+        if self.pending() >= self.max_queued:
+            raise JobsFull(f"hay {self.max_queued} jobs pendientes")
+        # a disco siempre: el directorio vive hasta ZC_ASYNC_TTL, no es para tmpfs
+        return self.storage.job("async", expected_bytes=expected_bytes, ram=False)
+
+    def submit(self, jd: JobDir, kind: str, params: dict, inputs: List[dict]) -> Job:
+        now = time.time()
+        job_id = os.path.basename(jd.path)
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, state, params, inputs, created, updated, path) "
+            "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(params), json.dumps(inputs), now, now, jd.path))
+        jd.keep()
+        return self.get(job_id)
+
+    # ---- consulta ----
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._conn().execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def live_paths(self) -> List[str]:
+        """Directorios de todos los jobs con fila (de cualquier worker): el janitor no los toca."""
+        return [r[0] for r in self._conn().execute("SELECT path FROM jobs WHERE path IS NOT NULL")]
+
+    def pending(self) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'running')").fetchone()[0]
+
+    # ---- runner ----
+    def claim(self, owner: str) -> Optional[Job]:
+        """Toma el job en cola más viejo (o uno running con lease vencido)."""
+        db = self._conn()
+        while True:
+            now = time.time()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT id, attempts FROM jobs WHERE (state = 'queued' AND not_before <= ?) "
+                    "OR (state = 'running' AND lease_until < ?) ORDER BY created LIMIT 1",
+                    (now, now)).fetchone()
+                if row is None:
+                    db.execute("COMMIT")
+                    return None
+                job_id, attempts = row
+                if attempts >= MAX_ATTEMPTS:
+                    # se cayó el proceso MAX_ATTEMPTS veces con este job: no lo reintentamos más
+                    db.execute("UPDATE jobs SET state = 'error', error = ?, owner = NULL, updated = ?, "
+                               "expires = ? WHERE id = ?",
+                               ("La conversión falló repetidamente.", now, now + self.ttl, job_id))
+                    db.execute("COMMIT")
+                    self._drop_inputs(job_id)
+                    continue
+                db.execute("UPDATE jobs SET state = 'running', owner = ?, lease_until = ?, "
+                           "attempts = attempts + 1, updated = ? WHERE id = ?",
+                           (owner, now + LEASE_SECS, now, job_id))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            return self.get(job_id)
+
+    def heartbeat(self, owner: str):
+        now = time.time()
+        self._conn().execute("UPDATE jobs SET lease_until = ? WHERE owner = ? AND state = 'running'",
+                             (now + LEASE_SECS, owner))
+
+    def progress(self, job_id: str, done: int, total: int):
+        self._conn().execute("UPDATE jobs SET done = ?, total = ?, updated = ? WHERE id = ?",
+                             (int(done), int(total), time.time(), job_id))
+
+    def finish(self, job_id: str, result: str, mime: str, filename: str):
+        now = time.time()
+        self._conn().execute(
+            "UPDATE jobs SET state = 'done', result = ?, mime = ?, filename = ?, owner = NULL, "
+            "done = MAX(done, total), updated = ?, expires = ? WHERE id = ?",
+            (os.path.basename(result), mime, filename, now, now + self.ttl, job_id))
+        self._drop_inputs(job_id)
+
+    def fail(self, job_id: str, error: str):
+        now = time.time()
+        self._conn().execute("UPDATE jobs SET state = 'error', error = ?, owner = NULL, updated = ?, "
+                             "expires = ? WHERE id = ?", (error, now, now + self.ttl, job_id))
+        self._drop_inputs(job_id)
+
+    def _drop_inputs(self, job_id: str):
+        """Un job terminado no vuelve a leer sus uploads: en disco queda solo el resultado."""
+        job = self.get(job_id)
+        for inp in job.inputs if job else ():
+            try:
+                os.remove(job.file(inp["name"]))
+            except FileNotFoundError:
+                pass
+
+    def release(self, job_id: str, delay: float = 0.0, count_attempt: bool = False):
+        """Devuelve un job running a la cola (shutdown, pool lleno)."""
+        now = time.time()
+        self._conn().execute(
+            "UPDATE jobs SET state = 'queued', owner = NULL, not_before = ?, updated = ?, "
+            "attempts = attempts - ? WHERE id = ? AND state = 'running'",
+            (now + delay, now, 0 if count_attempt else 1, job_id))
+
+    # ---- limpieza ----
+    def sweep(self) -> int:
+        """
+        Borra los jobs terminados vencidos. Los directorios sin fila (upload
+        cortado antes de encolar) los levanta el janitor de Storage.
+        """
+        now = time.time()
+        db = self._conn()
+        expired = [r[0] for r in db.execute("SELECT id FROM jobs WHERE expires < ?", (now,))]
+        for job_id in expired:
+            job = self.get(job_id)
+            if job is not None:
+                shutil.rmtree(job.path, ignore_errors=True)
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        return len(expired)
+
+
+Handler = Callable[[Job, Callable[[int, int], Awaitable[None]]], Awaitable[Tuple[str, str, str]]]
+
+
+class JobRunner:
+    """
+    Corre hasta `concurrency` jobs a la vez en el event loop del worker:
+
+        runner = JobRunner(store, handler)   # handler(job, progress) -> (archivo, mime, nombre)
+                                             # (con `await progress(done, total)`)
+        runner.start()                       # en el lifespan
+        runner.wake()                        # después de encolar (si no, espera al próximo poll)
+        await runner.stop()                  # los jobs en curso vuelven a la cola
+
+    El handler levanta JobRetry si no hay lugar en el pool; cualquier otra
+    excepción marca el job como error (con e.detail si la tiene, p. ej. un
+    HTTPException de los helpers de main.py).
+
+    Cada llamada a JobStore es SQLite con busy timeout: corre en un thread
+    (asyncio.to_thread) para que una base bloqueada no frene el event loop.
+    """
+    def __init__(self, store: JobStore, handler: Handler, concurrency: Optional[int] = None,
+                 poll: Optional[float] = None):
+        self.store = store
+        self.handler = handler
+        self.concurrency = max(1, int(concurrency if concurrency is not None
+                                      else env_float("ZC_ASYNC_CONCURRENCY", 1)))
+        self.poll = float(poll if poll is not None else env_float("ZC_ASYNC_POLL", 1.0))
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._tasks: Dict[asyncio.Task, str] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._loop_task is None:
+            self._wake = asyncio.Event()
+            self._loop_task = asyncio.get_running_loop().create_task(self._main())
+
+    @property
+    def running(self) -> int:
+        return len(self._tasks)
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def stop(self):
+        if self._loop_task is None:
+            return
+        self._loop_task.cancel()
+        tasks = list(self._tasks)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(self._loop_task, *tasks, return_exceptions=True)
+        self._loop_task = None
+
+    async def _main(self):
+        last_beat = last_sweep = 0.0
+        while True:
+            now = time.monotonic()
+            try:
+                if now - last_sweep >= SWEEP_EVERY:
+                    last_sweep = now
+                    await asyncio.to_thread(self.store.sweep)
+                if self._tasks and now - last_beat >= LEASE_SECS / 3:
+                    last_beat = now
+                    await asyncio.to_thread(self.store.heartbeat, self.owner)
+                while len(self._tasks) < self.concurrency:
+                    job = await asyncio.to_thread(self.store.claim, self.owner)
+                    if job is None:
+                        break
+                    task = asyncio.get_running_loop().create_task(self._run(job))
+                    self._tasks[task] = job.id
+                    task.add_done_callback(self._done)
+            except sqlite3.Error:
+                pass  # base bloqueada un rato: se reintenta en el próximo ciclo
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll)
+            except asyncio.TimeoutError:
+                pass
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.pop(task, None)
+        self.wake()  # hay un lugar libre
+
+    async def _run(self, job: Job):
+        async def progress(done: int, total: int):
+            await asyncio.to_thread(self.store.progress, job.id, done, total)
+        try:
+            result, mime, filename = await self.handler(job, progress)
+        except JobRetry as e:
+            await asyncio.to_thread(self.store.release, job.id, delay=e.after)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.store.release, job.id)
+            raise
+        except Exception as e:
+            detail = getattr(e, "detail", None)
+            await asyncio.to_thread(self.store.fail, job.id,
+                                    detail if isinstance(detail, str) else "No se pudo convertir el archivo.")
+        else:
+            await asyncio.to_thread(self.store.finish, job.id, result, mime, filename)
@@ -0,0 +1,356 @@
+# metrics.py
+"""
+Métricas estilo Prometheus (formato de texto 0.0.4) sin dependencias.
+
+Cada worker de uvicorn lleva sus contadores en memoria (un lock y un dict por
+observación: barato como para dejarlo siempre prendido) y cada FLUSH_EVERY
+segundos escribe un snapshot JSON en <dir>/metrics-<pid>.json. /metrics junta
+los snapshots de todos los workers vivos (el propio, fresco) y los suma; así el
+número es el del host y no el del worker que atendió el scrape.
+
+Contadores e histogramas de workers que ya murieron se pliegan en
+metrics-dead.json para que los totales no retrocedan; los gauges de un proceso
+muerto se descartan.
+"""
+from __future__ import annotations
+import asyncio
+import fcntl
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Segundos: de 5 ms (páginas cacheadas) a 2 min (ZC_JOB_TIMEOUT)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+FLUSH_EVERY = 5.0
+_DEAD = "metrics-dead.json"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, help: str, labels: Iterable[str]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = registry._lock
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(k, "")) for k in self.labelnames)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            values = {json.dumps(k): (list(v) if isinstance(v, list) else v) for k, v in self._values.items()}
+        return {"type": self.kind, "help": self.help, "labels": list(self.labelnames), "values": values}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        k = self._key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0.0) + amount
+
+    def set(self, value: float, **labels):
+        """Para contadores que ya lleva otro objeto (p. ej. hits del ResultCache)."""
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labels, buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        k = self._key(labels)
+        with self._lock:
+            # [cuenta por bucket (no acumulada)..., +Inf, suma]
+            v = self._values.get(k)
+            if v is None:
+                v = self._values[k] = [0] * (len(self.buckets) + 1) + [0.0]
+            i = 0
+            while i < len(self.buckets) and value > self.buckets[i]:
+                i += 1
+            v[i] += 1
+            v[-1] += value
+
+    def snapshot(self) -> dict:
+        out = super().snapshot()
+        out["buckets"] = list(self.buckets)
+        return out
+
+
+class Registry:
+    def __init__(self, snapshot_dir: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self.snapshot_dir = snapshot_dir
+        self._flusher: Optional[asyncio.Task] = None
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+
+    def _add(self, m: _Metric) -> _Metric:
+        self._metrics[m.name] = m
+        return m
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(self, name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._add(Gauge(self, name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (),
+                  buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(self, name, help, labels, buckets))
+
+    def on_collect(self, fn: Callable[[], None]):
+        """fn() corre antes de cada snapshot; sirve para gauges que se leen de otro lado."""
+        self._collectors.append(fn)
+
+    def snapshot(self) -> dict:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception:
+                pass
+        return {name: m.snapshot() for name, m in self._metrics.items()}
+
+    # ---- multi-worker ----
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.snapshot_dir, f"metrics-{pid}.json")
+
+    def flush(self) -> dict:
+        snap = self.snapshot()
+        if self.snapshot_dir:
+            tmp = self._path(os.getpid()) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snap, f)
+            os.replace(tmp, self._path(os.getpid()))
+        return snap
+
+    def collect_all(self) -> dict:
+        """Snapshot propio (fresco) + los de los otros workers vivos + el de los muertos."""
+        own = self.flush()
+        if not self.snapshot_dir:
+            return own
+        snaps = [own]
+        dead = []
+        for entry in os.scandir(self.snapshot_dir):
+            name = entry.name
+            if not (name.startswith("metrics-") and name.endswith(".json")) or name == _DEAD:
+                continue
+            try:
+                pid = int(name[len("metrics-"):-len(".json")])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            if not _alive(pid):
+                dead.append(entry.path)
+                continue
+            snap = _load(entry.path)
+            if snap is not None:
+                snaps.append(snap)
+        snaps.append(self._fold_dead(dead))
+        return merge(snaps)
+
+    def _fold_dead(self, dead: List[str]) -> dict:
+        path = os.path.join(self.snapshot_dir, _DEAD)
+        with open(path + ".lock", "w") as lock:
+            # releer bajo el lock: otro worker puede haberlos plegado recién
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            acc = _load(path) or {}
+            folded = [(p, _load(p)) for p in dead]
+            folded = [(p, snap) for p, snap in folded if snap is not None]
+            if folded:
+                acc = merge([acc] + [_drop_gauges(snap) for _, snap in folded])
+                tmp = path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(acc, f)
+                os.replace(tmp, path)
+                for p, _ in folded:
+                    try:
+                        os.remove(p)
+                    except FileNotFoundError:
+                        pass
+        return acc
+
+    def start_flusher(self, interval: float = FLUSH_EVERY):
+        if self._flusher is None and self.snapshot_dir:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop(interval))
+
+    async def _flush_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception:
+                pass
+
+    async def stop_flusher(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self.snapshot_dir:
+            # los contadores de este proceso los pliega el próximo scrape
+            await asyncio.to_thread(self.flush)
+
+
+def _load(path: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _drop_gauges(snap: dict) -> dict:
+    return {n: m for n, m in snap.items() if m.get("type") != "gauge"}
+
+
+def merge(snaps: List[dict]) -> dict:
+    """Suma snapshots: contadores, gauges e histogramas (bucket a bucket)."""
+    out: Dict[str, dict] = {}
+    for snap in snaps:
+        for name, m in snap.items():
+            acc = out.get(name)
+            if acc is None:
+                acc = out[name] = {k: v for k, v in m.items() if k != "values"}
+                acc["values"] = {}
+            vals = acc["values"]
+            for k, v in m.get("values", {}).items():
+                if isinstance(v, list):
+                    cur = vals.get(k)
+                    vals[k] = list(v) if cur is None else [a + b for a, b in zip(cur, v)]
+                else:
+                    vals[k] = vals.get(k, 0.0) + v
+    return out
+
+
+def _fmt_labels(names: List[str], values: List[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def render(snap: dict) -> str:
+    """Formato de exposición de texto de Prometheus."""
+    lines = []
+    for name in sorted(snap):
+        m = snap[name]
+        lines.append(f"# HELP {name} {m.get('help', '')}")
+        lines.append(f"# TYPE {name} {m['type']}")
+        labels = m.get("labels", [])
+        for k in sorted(m.get("values", {})):
+            v = m["values"][k]
+            lv = json.loads(k)
+            if m["type"] == "histogram":
+                acc = 0
+                for le, c in zip(m["buckets"] + ["+Inf"], v[:-1]):
+                    acc += c
+                    le_label = 'le="%s"' % ("+Inf" if le == "+Inf" else _num(le))
+                    lines.append(f"{name}_bucket{_fmt_labels(labels, lv, le_label)} {_num(acc)}")
+                lines.append(f"{name}_sum{_fmt_labels(labels, lv)} {_num(v[-1])}")
+                lines.append(f"{name}_count{_fmt_labels(labels, lv)} {_num(acc)}")
+            else:
+                lines.append(f"{name}{_fmt_labels(labels, lv)} {_num(v)}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI: cuenta requests, latencia hasta el último byte de la respuesta (incluye
+    el envío de un StreamingResponse) y bytes de entrada/salida por ruta. La ruta
+    es la plantilla de FastAPI (/r/{slug}), no la URL, para acotar la cardinalidad.
+    """
+    def __init__(self, app, registry: Registry):
+        self.app = app
+        self.requests = registry.counter("zc_http_requests_total", "Requests HTTP", ("route", "method", "status"))
+        self.latency = registry.histogram("zc_http_request_seconds", "Latencia hasta el último byte", ("route",))
+        self.bytes_in = registry.counter("zc_http_request_bytes_total", "Bytes de body recibidos", ("route",))
+        self.bytes_out = registry.counter("zc_http_response_bytes_total", "Bytes de body enviados", ("route",))
+        self.convert = registry.histogram("zc_convert_seconds", "Latencia de /api/convert por tipo y destino",
+                                          ("kind", "target", "cache"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        status = [500]
+        n_in = [0]
+        n_out = [0]
+
+        async def _receive():
+            msg = await receive()
+            if msg["type"] == "http.request":
+                n_in[0] += len(msg.get("body", b""))
+            return msg
+
+        async def _send(msg):
+            if msg["type"] == "http.response.start":
+                status[0] = msg["status"]
+            elif msg["type"] == "http.response.body":
+                n_out[0] += len(msg.get("body", b""))
+            await send(msg)
+
+        try:
+            await self.app(scope, _receive, _send)
+        finally:
+            dt = time.perf_counter() - t0
+            route = _route_label(scope)
+            self.requests.inc(route=route, method=scope.get("method", ""), status=status[0])
+            self.latency.observe(dt, route=route)
+            if n_in[0]:
+                self.bytes_in.inc(n_in[0], route=route)
+            self.bytes_out.inc(n_out[0], route=route)
+            conv = (scope.get("state") or {}).get("convert")
+            if conv:
+                self.convert.observe(dt, **conv)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    path = scope.get("path", "")
+    if path.startswith("/static/"):
+        return "/static"
+    return "other"
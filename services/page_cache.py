@@ -0,0 +1,166 @@
+# page_cache.py
+"""
+Caché de HTML ya renderizado para las páginas públicas (home, /routes, /r/{slug},
+privacidad, términos).
+
+Su salida depende solo del template, del slug, de la URL base (url_for arma
+URLs absolutas), del año, de la versión de static/ y del catálogo. Cada página se
+renderiza una vez por combinación y se guarda cruda + gzip (+ brotli si el
+módulo está instalado), con un ETag fuerte por representación. Todo se tira
+cuando cambia el mtime de algún template o la versión del catálogo.
+
+La URL base sale del header Host, que elige el cliente: main.py solo cachea
+los hosts conocidos. El resto se renderiza cada vez con build_page(fast=True),
+que comprime barato en vez de gzip 9 + brotli 11.
+"""
+from __future__ import annotations
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+# Por debajo de esto comprimir no compensa (y el header pesa más que lo ahorrado)
+MIN_COMPRESS_BYTES = 512
+
+
+@dataclass(frozen=True)
+class RenderedPage:
+    # encoding ('identity' | 'gzip' | 'br') -> (bytes, etag)
+    variants: Dict[str, Tuple[bytes, str]]
+
+    def pick(self, accept_encoding: str) -> Tuple[str, bytes, str]:
+        accepted = _parse_accept_encoding(accept_encoding)
+        for enc in ("br", "gzip"):
+            if enc in self.variants and accepted.get(enc, 0) > 0:
+                body, etag = self.variants[enc]
+                return enc, body, etag
+        body, etag = self.variants["identity"]
+        return "identity", body, etag
+
+    def etags(self):
+        return [etag for _, etag in self.variants.values()]
+
+
+def _parse_accept_encoding(value: str) -> Dict[str, float]:
+    out = {}
+    for part in (value or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        out[name] = q
+    if "*" in out:
+        for enc in ("br", "gzip"):
+            out.setdefault(enc, out["*"])
+    return out
+
+
+def etag_matches(if_none_match: Optional[str], etags: Iterable[str]) -> bool:
+    """
+    If-None-Match contra los ETags de una representación (comparación débil,
+    como pide el RFC para GET/HEAD). Lo usan las páginas, el JSON del catálogo
+    y los assets, así un 304 se decide igual en todos lados.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return any(e.removeprefix("W/") in tags for e in etags)
+
+
+def build_variants(raw: bytes, compress: bool = True, fast: bool = False) -> Dict[str, Tuple[bytes, str]]:
+    """
+    Cuerpo crudo + gzip (+ brotli) al máximo nivel, con un ETag fuerte por
+    representación. fast=True: solo gzip nivel 1, para lo que se usa una vez.
+    """
+    digest = hashlib.sha256(raw).hexdigest()[:32]
+    variants = {"identity": (raw, f'"{digest}"')}
+    if compress and len(raw) >= MIN_COMPRESS_BYTES:
+        variants["gzip"] = (gzip.compress(raw, compresslevel=1 if fast else 9, mtime=0), f'"{digest}-gz"')
+        if brotli is not None and not fast:
+            variants["br"] = (brotli.compress(raw, quality=11, mode=brotli.MODE_TEXT), f'"{digest}-br"')
+    return variants
+
+
+def build_page(html: str, fast: bool = False) -> RenderedPage:
+    return RenderedPage(build_variants(html.encode("utf-8"), fast=fast))
+
+
+class PageCache:
+    """
+    pc = PageCache(TEMPL_DIR, version_fn=lambda: catalog.get().version)
+    page = pc.get_or_render(key, lambda: template.render(ctx))
+    """
+    def __init__(self, templates_dir: Path, version_fn: Optional[Callable[[], str]] = None,
+                 max_entries: int = 512, check_interval: float = 1.0):
+        self.templates_dir = Path(templates_dir)
+        self.version_fn = version_fn
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self._pages: "OrderedDict[Hashable, RenderedPage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _templates_mtime(self) -> int:
+        try:
+            return max((p.stat().st_mtime_ns for p in self.templates_dir.rglob("*.html")), default=0)
+        except OSError:
+            return 0
+
+    def _check_version(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.check_interval:
+            return
+        version = (self._templates_mtime(), self.version_fn() if self.version_fn else "")
+        with self._lock:
+            self._checked_at = now
+            if version != self._version:
+                self._pages.clear()
+                self._version = version
+
+    def get_or_render(self, key: Hashable, render: Callable[[], str]) -> RenderedPage:
+        self._check_version()
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return page
+        # render fuera del lock: dos requests simultáneos pueden renderizar la misma
+        # página, pero el resultado es idéntico y no frenamos al resto
+        page = build_page(render())
+        with self._lock:
+            self.misses += 1
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._pages), "hits": self.hits, "misses": self.misses,
+                "brotli": brotli is not None}
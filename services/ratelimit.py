@@ -0,0 +1,172 @@
+# ratelimit.py
+"""
+Rate limit por cliente con token bucket.
+
+Cada (presupuesto, cliente) es un balde de `burst` fichas que se rellena a
+`per_min` por minuto; un request gasta una ficha. El estado por cliente son dos
+números (fichas, último acceso), así que la memoria es O(clientes activos):
+un balde que estuvo quieto lo suficiente para llenarse es idéntico a uno nuevo
+y se puede borrar sin cambiar el resultado.
+
+Backends:
+  MemoryBackend  dentro del proceso; OrderedDict por último acceso, expira los
+                 baldes llenos y además tiene un tope duro de claves.
+  SQLiteBackend  archivo compartido por todos los workers de uvicorn del host
+                 (WAL + BEGIN IMMEDIATE), para que el límite sea por host y no
+                 por worker.
+"""
+from __future__ import annotations
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Budget:
+    per_min: float
+    burst: int
+
+    @property
+    def rate(self) -> float:
+        return self.per_min / 60.0
+
+    @property
+    def ttl(self) -> float:
+        """Segundos sin uso a partir de los cuales el balde ya está lleno."""
+        return self.burst / self.rate if self.rate > 0 else float("inf")
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    retry_after: int = 0
+
+
+def _refill(tokens: float, ts: float, now: float, b: Budget) -> float:
+    return min(float(b.burst), tokens + max(0.0, now - ts) * b.rate)
+
+
+def _decide(tokens: float, b: Budget) -> Tuple[float, Decision]:
+    if tokens >= 1.0:
+        return tokens - 1.0, Decision(True)
+    wait = (1.0 - tokens) / b.rate if b.rate > 0 else 60
+    return tokens, Decision(False, max(1, math.ceil(wait)))
+
+
+class MemoryBackend:
+    blocking = False    # un lock y un dict: se puede llamar desde el event loop
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # un OrderedDict por presupuesto (cada uno expira a su ritmo):
+        # clave -> [fichas, último acceso], ordenado por último acceso
+        self._stores: "Dict[Budget, OrderedDict[str, list]]" = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, b: Budget, now: Optional[float] = None) -> Decision:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bk = self._stores.setdefault(b, OrderedDict())
+            st = bk.get(key)
+            if st is None:
+                st = [float(b.burst), now]
+                bk[key] = st
+            else:
+                bk.move_to_end(key)
+            tokens, decision = _decide(_refill(st[0], st[1], now, b), b)
+            st[0], st[1] = tokens, now
+            # los más viejos están al principio: se corta en el primero que sigue vivo
+            while len(bk) > 1:
+                oldest = next(iter(bk.values()))
+                if now - oldest[1] < b.ttl and len(bk) <= self.max_keys:
+                    break
+                bk.popitem(last=False)
+            return decision
+
+    def __len__(self):
+        return sum(len(bk) for bk in self._stores.values())
+
+
+class SQLiteBackend:
+    PRUNE_EVERY = 1000
+    blocking = True     # BEGIN IMMEDIATE con busy timeout: fuera del event loop
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._calls = 0
+        with self._conn() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS buckets ("
+                       "key TEXT PRIMARY KEY, tokens REAL NOT NULL, ts REAL NOT NULL, "
+                       "expires REAL NOT NULL) WITHOUT ROWID")
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=OFF")
+            self._local.db = db
+        return db
+
+    def take(self, key: str, b: Budget, now: Optional[float] = None) -> Decision:
+        # reloj de pared: tiene que ser el mismo en todos los procesos
+        now = time.time() if now is None else now
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT tokens, ts FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(*row, now, b) if row else float(b.burst)
+            tokens, decision = _decide(tokens, b)
+            db.execute("INSERT INTO buckets (key, tokens, ts, expires) VALUES (?, ?, ?, ?) "
+                       "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, ts = excluded.ts, "
+                       "expires = excluded.expires",
+                       (key, tokens, now, now + b.ttl))
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                db.execute("DELETE FROM buckets WHERE expires < ?", (now,))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return decision
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+
+class RateLimiter:
+    """
+    rl = RateLimiter(MemoryBackend(), {"heavy": Budget(60, 10), "cheap": Budget(600, 120)})
+    d = rl.check("heavy", ip)   # d.allowed / d.retry_after
+    d = await rl.acheck("heavy", ip)   # desde código async (SQLite corre en un thread)
+    """
+    def __init__(self, backend, budgets: Dict[str, Budget]):
+        self.backend = backend
+        self.budgets = dict(budgets)
+
+    def check(self, budget: str, client: str) -> Decision:
+        b = self.budgets[budget]
+        if b.per_min <= 0:  # presupuesto desactivado
+            return Decision(True)
+        return self.backend.take(f"{budget}:{client}", b)
+
+    async def acheck(self, budget: str, client: str) -> Decision:
+        if getattr(self.backend, "blocking", True):
+            return await asyncio.to_thread(self.check, budget, client)
+        return self.check(budget, client)
+
+
+def backend_from_env(default_sqlite_path: str):
+    """ZC_RATE_BACKEND=memory (default) | sqlite; ZC_RATE_DB para la ruta del archivo."""
+    kind = (os.getenv("ZC_RATE_BACKEND") or "memory").strip().lower()
+    if kind == "sqlite":
+        return SQLiteBackend(os.getenv("ZC_RATE_DB") or default_sqlite_path)
+    return MemoryBackend(max_keys=int(os.getenv("ZC_RATE_MAX_KEYS") or 100_000))
@@ -0,0 +1,198 @@
+# result_cache.py
+"""
+Caché de resultados de conversión, direccionada por contenido.
+
+Clave = sha256(input) + parámetros de conversión (target, quality, dpi, pages,
+resize, stripmeta...). Dos niveles:
+- memoria: LRU acotada en bytes, solo para salidas chicas
+- disco: archivos bajo <root>/<k[:2]>/<k>, LRU por mtime con tope de tamaño total
+
+Un hit no toca PIL ni PyMuPDF: devuelve los bytes (memoria) o la ruta (disco).
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# Subir cuando cambie la salida de los engines, para no servir resultados viejos
+CACHE_VERSION = 2
+
+
+@dataclass
+class CachedResult:
+    mime: str
+    filename: str
+    data: Optional[bytes] = None   # hit en memoria
+    path: Optional[str] = None     # hit en disco
+    headers: Optional[Dict[str, str]] = None   # headers propios del resultado (X-Render-DPI...)
+
+
+def cache_key(input_hash: str, **params) -> str:
+    """sha256 estable de (versión, hash del input, parámetros)."""
+    payload = json.dumps({"v": CACHE_VERSION, "in": input_hash, "p": params},
+                         sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, root: str, max_disk_bytes: int, max_mem_bytes: int, mem_item_max: int):
+        self.root = root
+        self.max_disk_bytes = max_disk_bytes
+        self.max_mem_bytes = max_mem_bytes
+        self.mem_item_max = mem_item_max
+        self._mem: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._mem_bytes = 0
+        self._disk_bytes = None   # se calcula perezosamente (puede haber otros workers escribiendo)
+        self._lock = threading.Lock()
+        self.hits_mem = 0
+        self.hits_disk = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    # ---- rutas ----
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    # ---- lectura ----
+    def get(self, key: str) -> Optional[CachedResult]:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                self._mem.move_to_end(key)
+                self.hits_mem += 1
+                return hit
+
+        path = self._path(key)
+        try:
+            with open(path + ".json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(path)  # LRU: mtime = último uso
+            if os.path.getsize(path) <= self.mem_item_max:
+                with open(path, "rb") as f:
+                    data = f.read()
+            else:
+                data = None
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits_disk += 1
+        if data is not None:
+            # chico: lo subimos a memoria y lo servimos desde ahí
+            res = CachedResult(meta["mime"], meta["filename"], data=data, headers=meta.get("headers"))
+            self._remember(key, res)
+            return res
+        return CachedResult(meta["mime"], meta["filename"], path=path, headers=meta.get("headers"))
+
+    # ---- escritura ----
+    def put_bytes(self, key: str, data: bytes, mime: str, filename: str,
+                  headers: Optional[Dict[str, str]] = None):
+        self._write(key, mime, filename, data=data, headers=headers)
+        if len(data) <= self.mem_item_max:
+            self._remember(key, CachedResult(mime, filename, data=data, headers=headers or None))
+
+    def put_file(self, key: str, src_path: str, mime: str, filename: str, move: bool = False,
+                 headers: Optional[Dict[str, str]] = None):
+        """
+        Guarda un resultado ya escrito en disco (ej. PDF multi-imagen). Con move=True
+        el archivo se mueve al caché (si está en otro filesystem, se copia).
+        """
+        self._write(key, mime, filename, src_path=src_path, move=move, headers=headers)
+
+    def _write(self, key: str, mime: str, filename: str, data: bytes = None, src_path: str = None,
+               move: bool = False, headers: Optional[Dict[str, str]] = None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            if data is not None:
+                with open(tmp, "wb") as f:
+                    f.write(data)
+            elif move:
+                try:
+                    os.replace(src_path, tmp)
+                except OSError:  # otro filesystem (p. ej. un job en tmpfs): copiamos
+                    shutil.copyfile(src_path, tmp)
+            else:
+                shutil.copyfile(src_path, tmp)
+            size = os.path.getsize(tmp)
+            if size > self.max_disk_bytes:
+                os.remove(tmp)
+                return
+            os.replace(tmp, path)  # atómico: un lector nunca ve un archivo a medias
+            with open(tmp, "w", encoding="utf-8") as f:
+                meta = {"mime": mime, "filename": filename}
+                if headers:
+                    meta["headers"] = headers
+                json.dump(meta, f)
+            os.replace(tmp, path + ".json")
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+        self._maybe_evict()
+
+    def _remember(self, key: str, res: CachedResult):
+        size = len(res.data or b"")
+        with self._lock:
+            if key in self._mem:
+                return
+            self._mem[key] = res
+            self._mem_bytes += size
+            while self._mem_bytes > self.max_mem_bytes and self._mem:
+                _, old = self._mem.popitem(last=False)
+                self._mem_bytes -= len(old.data or b"")
+
+    # ---- desalojo (disco) ----
+    def _scan(self):
+        entries = []
+        for dirpath, _, names in os.walk(self.root):
+            for n in names:
+                if n.endswith(".json") or n.endswith(".tmp"):
+                    continue
+                p = os.path.join(dirpath, n)
+                try:
+                    st = os.stat(p)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+        return entries
+
+    def _maybe_evict(self):
+        with self._lock:
+            known = self._disk_bytes
+        if known is not None and known <= self.max_disk_bytes:
+            return
+        entries = self._scan()
+        total = sum(e[1] for e in entries)
+        if total > self.max_disk_bytes:
+            # baja hasta 90% del tope para no escanear en cada put
+            target = int(self.max_disk_bytes * 0.9)
+            for _, size, p in sorted(entries):
+                if total <= target:
+                    break
+                for victim in (p, p + ".json"):
+                    try:
+                        os.remove(victim)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+    # ---- métricas ----
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits_mem": self.hits_mem, "hits_disk": self.hits_disk, "misses": self.misses,
+                "mem_items": len(self._mem), "mem_bytes": self._mem_bytes,
+                "disk_bytes": self._disk_bytes,
+            }
@@ -0,0 +1,138 @@
+# route_index.py
+"""
+Índice de rutas (/r/{slug}) y dataset del buscador, precalculados.
+
+ROUTES es estático y el catálogo cambia muy de vez en cuando, así que todo lo
+que antes se recorría en cada request (relacionadas, destinos permitidos,
+target -> slug, JSON para el template, viabilidad para /formats.json) se arma
+una vez acá. Cuando el catálogo se recarga se construye un RouteIndex nuevo y
+se reemplaza la referencia entera: un request ve el índice viejo o el nuevo,
+nunca uno a medio armar.
+"""
+from __future__ import annotations
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from services.catalog import CatalogSnapshot, content_etag
+
+
+@dataclass(frozen=True)
+class RoutePage:
+    route: object
+    related: tuple
+    all_targets: List[str]
+    target_to_slug: Dict[str, str]
+    all_targets_json: str
+    target_to_slug_json: str
+    page_title: str
+    page_desc: str
+
+
+def _derived_targets(route, cat: CatalogSnapshot) -> set:
+    out = set()
+    for fext in (route.exts_from or []):
+        out.update(cat.enabled_targets_for_ext(fext))
+    return out
+
+
+def _search_item(route, cat: CatalogSnapshot) -> Optional[dict]:
+    """Entrada del buscador, o None si la ruta no es viable con el catálogo actual."""
+    # al menos un origen habilitado
+    if not any(cat.is_enabled_ext(x) for x in (route.exts_from or [])):
+        return None
+    # al menos un destino permitido por mapa y habilitado
+    derived = _derived_targets(route, cat)
+    if not derived:
+        return None
+    if route.exts_to:
+        final_to = [t for t in route.exts_to if t in derived]
+        if not final_to:
+            return None
+    else:
+        final_to = sorted(derived)
+    return {
+        "slug": route.slug, "title": route.title, "desc": route.desc, "category": route.category,
+        "from": route.exts_from, "to": final_to, "keywords": route.keywords, "emoji": route.emoji,
+    }
+
+
+def _route_page(route, related: tuple, cat: CatalogSnapshot) -> RoutePage:
+    # posibles 'to' a partir de la ruta y relacionadas
+    raw_targets = set(route.exts_to or route.to or [])
+    for r in related:
+        raw_targets.update(r.exts_to or [])
+
+    # allowed = (habilitados por mapa desde los 'from') ∩ raw_targets (si existiera)
+    allowed = set()
+    for fext in (route.exts_from or []):
+        if cat.is_enabled_ext(fext):
+            allowed.update(cat.enabled_targets_for_ext(fext))
+    if raw_targets:
+        allowed &= raw_targets
+
+    # fallback: si quedó vacío, mantené al menos los raw habilitados
+    if not allowed:
+        allowed = {t for t in raw_targets if cat.is_enabled_ext(t)}
+
+    all_targets = sorted(allowed) if allowed else sorted(raw_targets)
+
+    # target -> slug; la propia ruta toma prioridad para sus 'to'
+    target_to_slug = {}
+    for t in (route.exts_to or route.to or []):
+        if t in all_targets:
+            target_to_slug[t] = route.slug
+    for r in related:
+        for t in (r.exts_to or []):
+            if t in all_targets:
+                target_to_slug.setdefault(t, r.slug)
+
+    page_title = f"Convertir {route.title} online gratis"
+    page_desc = (f"{route.desc} Convertí {', '.join(route.exts_from or [])} a "
+                 f"{', '.join(all_targets) or 'formatos compatibles'} en segundos. "
+                 "Rápido, privado y sin registro.")
+    return RoutePage(
+        route=route, related=related,
+        all_targets=all_targets, target_to_slug=target_to_slug,
+        all_targets_json=json.dumps(all_targets, ensure_ascii=False),
+        target_to_slug_json=json.dumps(target_to_slug, ensure_ascii=False),
+        page_title=page_title, page_desc=page_desc,
+    )
+
+
+class RouteIndex:
+    """
+    idx = RouteIndex(ROUTES, catalog.get())
+    idx.page(slug)      -> RoutePage o None
+    idx.route(slug)     -> Route o None
+    idx.by_ext[ext]     -> rutas que aceptan esa extensión (orden de ROUTES)
+    idx.search_body / search_etag  -> /formats.json ya serializado
+    """
+    def __init__(self, routes: Sequence, cat: CatalogSnapshot):
+        self.routes = tuple(routes)
+        self.version = cat.version
+        self.by_slug = {r.slug: r for r in self.routes}
+
+        by_ext: Dict[str, list] = {}
+        for r in self.routes:
+            for ext in (r.exts_from or []):
+                by_ext.setdefault(ext, []).append(r)
+        self.by_ext = {ext: tuple(rs) for ext, rs in by_ext.items()}
+
+        # relacionadas por input compatible, vía el índice invertido (sin el O(N²))
+        pos = {r.slug: i for i, r in enumerate(self.routes)}
+        self.pages: Dict[str, RoutePage] = {}
+        for r in self.routes:
+            rel = {o.slug: o for ext in (r.exts_from or []) for o in self.by_ext[ext] if o.slug != r.slug}
+            related = tuple(sorted(rel.values(), key=lambda o: pos[o.slug]))
+            self.pages[r.slug] = _route_page(r, related, cat)
+
+        items = [it for it in (_search_item(r, cat) for r in self.routes) if it]
+        self.search_body = json.dumps({"items": items}, ensure_ascii=False).encode("utf-8")
+        self.search_etag = content_etag(self.search_body)
+
+    def route(self, slug: str):
+        return self.by_slug.get(slug)
+
+    def page(self, slug: str) -> Optional[RoutePage]:
+        return self.pages.get(slug)
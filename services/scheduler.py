@@ -0,0 +1,220 @@
+# scheduler.py
+"""
+Planificador de conversiones.
+
+Las funciones de engines/ son CPU-bound (PIL, PyMuPDF). Si se llaman directo
+desde un handler `async`, bloquean el event loop del worker de uvicorn y
+congelan todo lo demás (páginas, /healthz). Acá las despachamos a un pool de
+procesos acotado:
+
+- tamaño del pool por núcleo (ZC_WORKERS_PER_CORE) con tope (ZC_MAX_WORKERS)
+- profundidad máxima de cola (ZC_QUEUE_DEPTH): jobs esperando además de los que corren
+- timeout por job (ZC_JOB_TIMEOUT, segundos)
+- costo en vuelo (ZC_QUEUE_MP): megapíxeles estimados por engines/probe.py de
+  los jobs corriendo + esperando; un job que no entra espera afuera (QueueFull)
+  aunque haya slots, así diez PDFs enormes no se encolan detrás de un worker.
+  Con la cola vacía siempre entra uno, por grande que sea (el tope por job lo
+  pone el probe)
+
+Si la cola está llena se levanta QueueFull con un Retry-After estimado, para
+que el handler responda 503 sin encolar más trabajo.
+"""
+from __future__ import annotations
+import asyncio
+import functools
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+
+from . import env_float
+
+
+class QueueFull(Exception):
+    """No hay lugar en la cola; el caller debería responder 503 + Retry-After."""
+    def __init__(self, retry_after: int):
+        super().__init__(f"cola llena, reintentar en {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobTimeout(Exception):
+    """El job superó el timeout configurado."""
+
+
+class ConversionScheduler:
+    def __init__(self, workers: Optional[int] = None, queue_depth: Optional[int] = None,
+                 timeout: Optional[float] = None, max_cost: Optional[float] = None,
+                 initializer: Optional[Callable[..., Any]] = None, initargs: Tuple = ()):
+        if workers is None:
+            per_core = env_float("ZC_WORKERS_PER_CORE", 1.0)
+            workers = max(1, int((os.cpu_count() or 1) * per_core))
+            workers = min(workers, int(env_float("ZC_MAX_WORKERS", 8)))
+        self.workers = max(1, int(workers))
+        self.queue_depth = int(queue_depth if queue_depth is not None
+                               else env_float("ZC_QUEUE_DEPTH", self.workers * 4))
+        self.timeout = float(timeout if timeout is not None else env_float("ZC_JOB_TIMEOUT", 120))
+        self.max_cost = float(max_cost if max_cost is not None else env_float("ZC_QUEUE_MP", 2000))
+        # corre en cada worker al arrancar (los spawneados no heredan el estado de este proceso)
+        self.initializer = initializer
+        self.initargs = tuple(initargs)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0          # jobs corriendo + esperando (hasta que el proceso termina)
+        self._cost = 0.0           # megapíxeles de esos mismos jobs
+        self._avg_secs = 1.0       # EWMA de duración, para estimar Retry-After
+
+    # ---- ciclo de vida ----
+    def start(self):
+        if self._executor is None:
+            # spawn: los workers no heredan los threads/sockets del proceso de uvicorn
+            ctx = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx,
+                                                 initializer=self.initializer, initargs=self.initargs)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _restart(self):
+        # un worker murió (OOM, segfault de un decoder): el pool queda inutilizable
+        ex, self._executor = self._executor, None
+        if ex is not None:
+            ex.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    # ---- estado ----
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def pending_cost(self) -> float:
+        return self._cost
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_depth
+
+    def retry_after(self) -> int:
+        waves = math.ceil(max(1, self._pending) / self.workers)
+        return max(1, int(math.ceil(self._avg_secs * waves)))
+
+    # ---- despacho ----
+    def _admit(self, slots: int = 1, cost: float = 0.0):
+        if self._pending + slots > self.capacity:
+            raise QueueFull(self.retry_after())
+        if self._cost > 0 and self._cost + cost > self.max_cost:
+            raise QueueFull(self.retry_after())
+        self.start()
+
+    async def _execute(self, fn: Callable[..., Any], args, kwargs, cost: float = 0.0) -> Any:
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        try:
+            cfut = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        except BrokenProcessPool:
+            self._restart()
+            cfut = self._executor.submit(functools.partial(fn, *args, **kwargs))
+
+        # el slot se libera cuando el proceso realmente termina, no cuando el
+        # caller deja de esperar (un job con timeout sigue ocupando el worker)
+        self._pending += 1
+        self._cost += cost
+
+        def _done(_f):
+            self._pending -= 1
+            self._cost = max(0.0, self._cost - cost)
+            self._avg_secs = 0.8 * self._avg_secs + 0.2 * (time.perf_counter() - t0)
+
+        def _notify(f):
+            try:
+                loop.call_soon_threadsafe(_done, f)
+            except RuntimeError:
+                pass  # loop cerrado (shutdown)
+        cfut.add_done_callback(_notify)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(cfut), self.timeout)
+        except asyncio.TimeoutError:
+            cfut.cancel()
+            raise JobTimeout(f"la conversión superó {int(self.timeout)}s")
+        except BrokenProcessPool:
+            self._restart()
+            raise
+
+    async def run(self, fn: Callable[..., Any], *args, cost: float = 0.0, **kwargs) -> Any:
+        """
+        Ejecuta fn(*args, **kwargs) en el pool. fn y sus argumentos tienen que
+        ser picklables (funciones de módulo en engines/). `cost`: megapíxeles
+        estimados (no se le pasa a fn).
+        """
+        self._admit(1, cost)
+        return await self._execute(fn, args, kwargs, cost)
+
+    def run_many(self, fn: Callable[..., Any], calls: List[tuple],
+                 window: Optional[int] = None, costs: Optional[List[float]] = None) -> AsyncIterator[Any]:
+        """
+        Corre fn(*args) para cada args de `calls` y devuelve un async iterator con
+        los resultados a medida que terminan (orden de finalización). Mantiene como
+        mucho `window` jobs en vuelo (default: uno por worker), así un PDF de 500
+        páginas no monopoliza la cola ni acumula resultados en memoria.
+        La admisión se decide acá, al llamar (QueueFull antes de empezar a
+        iterar), para poder responder 503 antes de abrir un StreamingResponse.
+        `costs` (uno por call): para la admisión cuenta lo que entra en la primera ventana.
+        """
+        window = self._admit_many(calls, window, costs)
+        return self._iter_many(fn, calls, window, costs)
+
+    def run_each(self, fn: Callable[..., Any], calls: List[tuple], window: Optional[int] = None,
+                 costs: Optional[List[float]] = None) -> AsyncIterator[Tuple[int, Any, Optional[BaseException]]]:
+        """
+        Como run_many, pero un job que falla no corta la iteración: devuelve
+        (índice en calls, resultado, None) o (índice, None, excepción) por cada
+        job, para lotes donde cada ítem se reporta por separado.
+        """
+        window = self._admit_many(calls, window, costs)
+        return self._iter_each(fn, calls, window, costs)
+
+    def _admit_many(self, calls: List[tuple], window: Optional[int], costs: Optional[List[float]]) -> int:
+        window = max(1, min(window or self.workers, len(calls) or 1))
+        if calls:
+            self._admit(window, sum((costs or [])[:window]))
+        return window
+
+    async def _iter_many(self, fn, calls, window, costs=None):
+        each = self._iter_each(fn, calls, window, costs)
+        try:
+            async for _, result, exc in each:
+                if exc is not None:
+                    raise exc
+                yield result
+        finally:
+            await each.aclose()  # cancela lo que quede en vuelo ya, no cuando lo junte el GC
+
+    async def _iter_each(self, fn, calls, window, costs=None):
+        pending_calls = iter(enumerate(calls))
+        in_flight = {}
+
+        def _spawn():
+            nxt = next(pending_calls, None)
+            if nxt is not None:
+                i, args = nxt
+                cost = costs[i] if costs else 0.0
+                in_flight[asyncio.ensure_future(self._execute(fn, args, {}, cost))] = i
+
+        for _ in range(window):
+            _spawn()
+        try:
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    i = in_flight.pop(t)
+                    _spawn()
+                    exc = t.exception()
+                    yield i, (None if exc else t.result()), exc
+        finally:
+            for t in in_flight:
+                t.cancel()
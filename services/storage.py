@@ -0,0 +1,231 @@
+# storage.py
+"""
+Almacenamiento temporal de trabajos bajo STORE_DIR.
+
+Cada request que necesita archivos (uploads spooleados, salidas, temporales de
+un ZIP en streaming) pide un JobDir: un directorio propio con nombre único, así
+dos requests simultáneos nunca pisan sus archivos. Al terminar se borra el
+directorio entero; lo que quede por un crash o un cliente que cortó lo levanta
+el janitor.
+
+- cuota total (ZC_STORE_QUOTA_MB): si un job nuevo no entra se desalojan los
+  directorios más viejos (LRU por mtime) que no estén en uso; si igual no
+  entra, StorageFull
+- antigüedad máxima (ZC_STORE_MAX_AGE, segundos): el janitor borra lo que la
+  supere aunque sobre espacio
+- RAM (ZC_RAM_DIR, default /dev/shm/zc; ZC_RAM_QUOTA_MB, 0 = desactivado):
+  los jobs chicos (hasta ZC_RAM_JOB_MAX_MB) van a tmpfs si hay lugar
+
+Con varios workers de uvicorn sobre el mismo STORE_DIR cada uno conoce solo
+sus jobs activos; por eso nunca se desaloja un directorio tocado hace menos de
+MIN_EVICT_AGE segundos (bastante más que ZC_JOB_TIMEOUT). Los directorios que
+viven más que un request (jobs asíncronos) los declara su dueño con
+add_pinned(): el janitor no los borra nunca, pero siguen contando en la cuota.
+"""
+from __future__ import annotations
+import asyncio
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import env_float
+
+MB = 1024 * 1024
+# Un directorio modificado hace menos que esto puede ser de un job en curso de otro worker
+MIN_EVICT_AGE = 600
+
+
+class StorageFull(Exception):
+    """No hay lugar para el job ni desalojando; el caller debería responder 503."""
+
+
+@dataclass
+class JobDir:
+    path: str
+    in_ram: bool = False
+    _storage: Optional["Storage"] = field(default=None, repr=False)
+
+    def file(self, name: str) -> str:
+        """Ruta para un archivo dentro del job (solo el nombre base, sin subdirectorios)."""
+        return os.path.join(self.path, os.path.basename(name))
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        if self._storage is not None:
+            self._storage._release(self)
+
+    def keep(self):
+        """
+        El directorio sobrevive al request (p. ej. un job asíncrono): se suelta
+        la reserva de este proceso y desde ahí lo protege quien lo registró con
+        Storage.add_pinned(); lo escrito sigue contando en la cuota.
+        """
+        if self._storage is not None:
+            self._storage._keep(self)
+
+
+class _Area:
+    """Una raíz (disco o tmpfs) con su cuota y su uso estimado."""
+    def __init__(self, root: str, quota: int):
+        self.root = root
+        self.quota = quota
+        self.usage = 0          # lo medido en el último sweep + lo reservado desde entonces
+
+    def scan(self) -> List[Tuple[float, int, str]]:
+        """[(mtime más reciente, bytes, ruta)] de cada directorio de job."""
+        out = []
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return out
+        for e in entries:
+            if not e.is_dir(follow_symlinks=False):
+                continue
+            size, newest = 0, 0.0
+            try:
+                newest = e.stat().st_mtime
+                for f in os.scandir(e.path):
+                    st = f.stat(follow_symlinks=False)
+                    size += st.st_size
+                    newest = max(newest, st.st_mtime)
+            except FileNotFoundError:
+                continue
+            out.append((newest, size, e.path))
+        return out
+
+
+class Storage:
+    """
+    storage = Storage("/tmp/zc/jobs")
+    job = storage.job("convert", expected_bytes=len_del_upload)
+    ... archivos en job.path / job.file("out.pdf") ...
+    job.cleanup()
+    """
+    def __init__(self, root: str, quota_bytes: Optional[int] = None, max_age: Optional[float] = None,
+                 ram_root: Optional[str] = None, ram_quota_bytes: Optional[int] = None,
+                 ram_job_max: Optional[int] = None):
+        quota = quota_bytes if quota_bytes is not None else int(env_float("ZC_STORE_QUOTA_MB", 2048) * MB)
+        self.disk = _Area(root, quota)
+        self.max_age = float(max_age if max_age is not None else env_float("ZC_STORE_MAX_AGE", 3600))
+
+        ram_quota = ram_quota_bytes if ram_quota_bytes is not None else int(env_float("ZC_RAM_QUOTA_MB", 0) * MB)
+        ram_root = ram_root or os.getenv("ZC_RAM_DIR") or "/dev/shm/zc"
+        self.ram = None
+        if ram_quota > 0 and os.path.isdir(os.path.dirname(ram_root.rstrip("/")) or "/"):
+            self.ram = _Area(ram_root, ram_quota)
+        self.ram_job_max = int(ram_job_max if ram_job_max is not None else env_float("ZC_RAM_JOB_MAX_MB", 8) * MB)
+
+        self._active: Dict[str, int] = {}    # ruta -> bytes reservados
+        self._pinned: List[Callable[[], Iterable[str]]] = []
+        self._lock = threading.Lock()
+        self._janitor: Optional[asyncio.Task] = None
+        for area in self._areas():
+            os.makedirs(area.root, exist_ok=True)
+
+    def _areas(self) -> List[_Area]:
+        return [a for a in (self.disk, self.ram) if a is not None]
+
+    # ---- jobs ----
+    def job(self, prefix: str = "job", expected_bytes: int = 0, ram: bool = True) -> JobDir:
+        """Crea un directorio de job único; reserva expected_bytes en la cuota (ram=False: siempre a disco)."""
+        expected = max(0, int(expected_bytes))
+        area = self.disk
+        if ram and self.ram is not None and expected <= self.ram_job_max and self._fits(self.ram, expected):
+            area = self.ram
+        elif not self._fits(self.disk, expected):
+            raise StorageFull(f"sin espacio para {expected} bytes")
+        path = os.path.join(area.root, f"{prefix}-{uuid.uuid4().hex}")
+        os.makedirs(path)
+        with self._lock:
+            area.usage += expected
+            self._active[path] = expected
+        return JobDir(path, in_ram=area is self.ram, _storage=self)
+
+    def _fits(self, area: _Area, n: int) -> bool:
+        if area.usage + n <= area.quota:
+            return True
+        self._sweep_area(area, need=n)
+        return area.usage + n <= area.quota
+
+    def _release(self, job: JobDir):
+        with self._lock:
+            n = self._active.pop(job.path, 0)
+            area = self.ram if job.in_ram else self.disk
+            if area is not None:
+                area.usage = max(0, area.usage - n)
+
+    def add_pinned(self, fn: Callable[[], Iterable[str]]):
+        """
+        fn() devuelve rutas que el janitor no puede tocar (ni por edad ni por
+        cuota), p. ej. JobStore.live_paths: se consulta en cada sweep, así vale
+        también para directorios de otros workers.
+        """
+        self._pinned.append(fn)
+
+    def _keep(self, job: JobDir):
+        # la reserva queda sumada en area.usage hasta que el próximo sweep mida lo escrito
+        with self._lock:
+            self._active.pop(job.path, None)
+
+    # ---- limpieza ----
+    def _sweep_area(self, area: _Area, need: int = 0) -> int:
+        try:
+            pinned = {p for fn in self._pinned for p in fn()}
+        except Exception:
+            return 0  # sin saber qué está en uso (base bloqueada) no se borra nada
+        now = time.time()
+        dirs = sorted(area.scan())            # más viejo primero
+        with self._lock:
+            active = set(self._active) | pinned
+        usage = sum(size for _, size, _ in dirs)
+        removed = 0
+        for mtime, size, path in dirs:
+            age = now - mtime
+            too_old = age > self.max_age
+            over = usage + need > area.quota and age > MIN_EVICT_AGE
+            if path in active or not (too_old or over):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            usage -= size
+            removed += 1
+        with self._lock:
+            # lo medido incluye lo que los jobs activos ya escribieron; si todavía
+            # no escribieron todo, su reserva manda
+            reserved = sum(n for p, n in self._active.items() if p.startswith(area.root + os.sep))
+            area.usage = max(usage, reserved, 0)
+        return removed
+
+    def sweep(self) -> int:
+        """Borra jobs vencidos y, si hace falta, los más viejos hasta entrar en la cuota."""
+        return sum(self._sweep_area(a) for a in self._areas())
+
+    def usage(self) -> dict:
+        return {("ram" if a is self.ram else "disk"): {"bytes": a.usage, "quota": a.quota}
+                for a in self._areas()}
+
+    # ---- janitor ----
+    def start_janitor(self, interval: float = 60.0):
+        """Barre una vez ya (restos de un crash) y después cada `interval` segundos."""
+        if self._janitor is None:
+            self._janitor = asyncio.get_running_loop().create_task(self._janitor_loop(interval))
+
+    async def _janitor_loop(self, interval: float):
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception:
+                pass  # el janitor no puede morirse por un archivo raro
+            await asyncio.sleep(interval)
+
+    async def stop_janitor(self):
+        if self._janitor is not None:
+            self._janitor.cancel()
+            try:
+                await self._janitor
+            except asyncio.CancelledError:
+                pass
+            self._janitor = None
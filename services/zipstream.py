@@ -0,0 +1,85 @@
+# zipstream.py
+"""
+ZIP en streaming para StreamingResponse.
+
+zipfile necesita volver atrás para reescribir el header local de cada entrada
+(CRC y tamaños). _Sink le da ese seek solo dentro de la entrada en curso y
+entrega los bytes apenas la entrada se cierra, así el cliente recibe cada página
+en cuanto está lista y la memoria queda acotada a una entrada, sin importar
+cuántas tenga el archivo. Los headers quedan con tamaños reales (sin data
+descriptors), compatibles con descompresores que leen en streaming.
+"""
+from __future__ import annotations
+import io
+import zipfile
+
+# Ya comprimidos: guardarlos con deflate solo gasta CPU
+STORED_EXTS = {"jpg", "jpeg", "png", "webp", "gif", "avif", "heic", "zip", "pdf", "mp3", "mp4"}
+
+
+def compress_type_for(name: str) -> int:
+    ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+    return zipfile.ZIP_STORED if ext in STORED_EXTS else zipfile.ZIP_DEFLATED
+
+
+class _Sink(io.RawIOBase):
+    """Destino 'seekable' que solo admite seek dentro de lo que todavía no se entregó."""
+    def __init__(self):
+        self._buf = io.BytesIO()
+        self._base = 0
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, b):
+        return self._buf.write(b)
+
+    def tell(self):
+        return self._base + self._buf.tell()
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence != io.SEEK_SET or pos < self._base:
+            raise OSError("seek fuera de la entrada en curso")
+        return self._base + self._buf.seek(pos - self._base)
+
+    def drain(self) -> bytes:
+        data = self._buf.getvalue()
+        self._base += len(data)
+        self._buf = io.BytesIO()
+        return data
+
+
+class ZipStreamWriter:
+    """
+    w = ZipStreamWriter()
+    chunk = w.add(nombre, datos)   # bytes listos para mandar
+    chunk = w.close()              # directorio central
+    w.abort()                      # si falló a mitad: se descarta, sin directorio central
+    """
+    def __init__(self):
+        self._sink = _Sink()
+        self._zf = zipfile.ZipFile(self._sink, "w", allowZip64=True)
+
+    def add(self, name: str, data: bytes) -> bytes:
+        self._zf.writestr(name, data, compress_type=compress_type_for(name))
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._zf.close()
+        return self._sink.drain()
+
+    def abort(self):
+        """
+        Cierra el ZipFile descartando lo que escriba: lo ya enviado queda como un
+        ZIP sin directorio central (inválido para cualquier lector), y el ZipFile
+        no intenta cerrarse de nuevo en __del__ cuando el sink ya no existe.
+        """
+        try:
+            self._zf.close()
+        except Exception:
+            pass
+        self._sink.drain()
+
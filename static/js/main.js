@@ -288,6 +288,9 @@
     fd.append('route', routeHidden.value || '');
     fd.append('file', it.file);
 
+    // PDFs: pueden tardar más que un request; van por /api/jobs y se sigue el progreso
+    if (/\.pdf$/i.test(it.name)) { convertViaJob(it, fd); return; }
+
     const xhr = new XMLHttpRequest();
     it.xhr = xhr;
     xhr.open('POST', '/api/convert', true);
@@ -323,6 +326,64 @@
     xhr.send(fd);
   }
 
+  // ---------- Conversión asíncrona (/api/jobs) ----------
+  // Subida = 0-50% de la barra, páginas hechas = 50-100%
+  const sleep = ms => new Promise(res=>setTimeout(res, ms));
+
+  function finishItem(it, blob, fname){
+    if (it.blobUrl) URL.revokeObjectURL(it.blobUrl);
+    it.blobUrl = URL.createObjectURL(blob);
+    it.downloadName = fname;
+    it.status = 'done';
+    it.progress = 1;
+    render();
+  }
+
+  function failItem(it, msg){
+    it.status = 'error'; render(); alert(msg);
+  }
+
+  async function pollJob(it, job){
+    let wait = 500;
+    while (true){
+      await sleep(wait);
+      wait = Math.min(3000, wait * 1.5);
+      const r = await fetch(job.status_url, {cache:'no-store'});
+      if (!r.ok) throw new Error('estado '+r.status);
+      const st = await r.json();
+      if (st.total){ it.progress = 0.5 + 0.5 * Math.min(1, st.done / st.total) * 0.95; render(); }
+      if (st.state === 'error') throw new Error(st.error || 'Error convirtiendo '+ it.name);
+      if (st.state === 'done'){
+        const res = await fetch(st.result_url);
+        if (!res.ok) throw new Error('resultado '+res.status);
+        return { blob: await res.blob(), fname: st.filename };
+      }
+    }
+  }
+
+  function convertViaJob(it, fd){
+    const xhr = new XMLHttpRequest();
+    it.xhr = xhr;
+    xhr.open('POST', '/api/jobs', true);
+    xhr.responseType = 'json';
+    it.status = 'uploading'; it.progress = 0; render();
+
+    xhr.upload.onprogress = function(e){
+      if (e.lengthComputable){ it.progress = 0.5 * e.loaded / e.total; render(); }
+    };
+    xhr.onload = async function(){
+      if (xhr.status !== 202 || !xhr.response){ failItem(it, 'Error convirtiendo '+ it.name); return; }
+      try{
+        const {blob, fname} = await pollJob(it, xhr.response);
+        finishItem(it, blob, fname);
+      }catch(e){
+        failItem(it, e.message || ('Error convirtiendo '+ it.name));
+      }
+    };
+    xhr.onerror = function(){ failItem(it, 'Fallo de red en '+ it.name); };
+    xhr.send(fd);
+  }
+
   // ---------- Convertir todo (concurrencia 2) ----------
   btnConvertAll?.addEventListener('click', async e=>{
     e.preventDefault();
@@ -372,7 +433,7 @@
 
   // Utilidades
   async function getJSON(url){
-    const r = await fetch(url, {cache:'no-store'});
+    const r = await fetch(url);
     if (!r.ok) throw new Error(url+': '+r.status);
     return r.json();
   }
@@ -389,8 +450,8 @@
     let extToId = {}, idToFmt = {}, enabled = new Set();
     try{
       const [mapJson, stJson] = await Promise.all([
-        getJSON('/static/formats.map.json'),
-        getJSON('/static/formats.status.json')
+        getJSON(window.ZCFMT?.map || '/formats.map.json'),
+        getJSON(window.ZCFMT?.status || '/formats.status.json')
       ]);
       Object.values(mapJson?.categories || {}).forEach(arr => {
         arr.forEach(f => {
@@ -0,0 +1,51 @@
+# conftest.py
+"""
+Fixtures comunes. Los tests corren desde la raíz del repo:
+
+  python -m pytest -q
+
+Imágenes sintéticas chicas (gradientes + ruido): los bordes de franja, de
+strip y de bloque se prueban con tamaños elegidos a mano, no con tamaño.
+Los tests que pasan por main.py usan `fresh_cache`: el caché de resultados
+vive en /tmp/zc y sobrevive entre corridas.
+"""
+import os
+import sys
+
+import pytest
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def noisy(mode: str, size) -> Image.Image:
+    """Imagen con detalle en todas las escalas (un resize mal cosido se nota)."""
+    w, h = size
+    grad = Image.linear_gradient("L").resize((w, h))
+    noise = Image.effect_noise((w, h), 60).filter(ImageFilter.GaussianBlur(0.7))
+    rgb = Image.merge("RGB", (grad, noise, grad.transpose(Image.FLIP_LEFT_RIGHT)))
+    if mode == "RGBA":
+        rgb.putalpha(noise.point(lambda v: 255 - v))
+        return rgb
+    if mode == "LA":
+        return Image.merge("LA", (grad, noise))
+    if mode == "P":
+        return rgb.quantize(64)
+    return rgb.convert(mode)
+
+
+@pytest.fixture
+def make_image():
+    return noisy
+
+
+@pytest.fixture
+def fresh_cache(tmp_path, monkeypatch):
+    """main.result_cache vacío en tmp_path (el de /tmp/zc daría HIT de otra corrida)."""
+    main = pytest.importorskip("main")
+    from services.result_cache import ResultCache
+
+    cache = ResultCache(str(tmp_path / "cache"), max_disk_bytes=64 << 20, max_mem_bytes=8 << 20,
+                        mem_item_max=1 << 20)
+    monkeypatch.setattr(main, "result_cache", cache)
+    return cache
@@ -0,0 +1,245 @@
+# test_bands.py
+"""
+engines/bands.py: lectura por franjas (PNG, TIFF), BandResizer y los writers,
+contra Pillow sobre la imagen entera. Alturas que no son múltiplo de la franja
+ni del strip, para que siempre haya una franja y un strip final incompletos.
+"""
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageChops, TiffImagePlugin, TiffTags
+
+from engines import bands, image_engine
+
+ROWS = 16
+
+
+def png_bytes(im: Image.Image, **kw) -> bytes:
+    buf = BytesIO()
+    im.save(buf, format="PNG", **kw)
+    return buf.getvalue()
+
+
+def tiff_bytes(im: Image.Image, **kw) -> bytes:
+    buf = BytesIO()
+    im.save(buf, format="TIFF", **kw)
+    return buf.getvalue()
+
+
+def raw_tiff(im: Image.Image, rps: int = 0, tile: int = 0) -> bytes:
+    """TIFF sin compresión armado a mano: varios strips de `rps` filas, o tiles de tile x tile."""
+    w, h = im.size
+    n = len(im.getbands())
+    ifd = TiffImagePlugin.ImageFileDirectory_v2(prefix=b"II")
+    ifd[256], ifd[257] = w, h
+    ifd[258] = (8,) * n
+    ifd[259] = 1
+    ifd[262] = 2 if im.mode == "RGB" else 1
+    ifd[277] = n
+    ifd[284] = 1
+    if tile:
+        blocks = []
+        for ty in range(0, h, tile):
+            for tx in range(0, w, tile):
+                t = Image.new(im.mode, (tile, tile))
+                t.paste(im.crop((tx, ty, min(w, tx + tile), min(h, ty + tile))))
+                blocks.append(t.tobytes())
+        ifd[322], ifd[323] = tile, tile
+        ifd[324] = tuple(sum(len(b) for b in blocks[:i]) for i in range(len(blocks)))
+        ifd[325] = tuple(len(b) for b in blocks)
+        tags = (256, 257, 322, 323, 324, 325)
+    else:
+        stride = w * n
+        blocks = [im.crop((0, y, w, min(h, y + rps))).tobytes() for y in range(0, h, rps)]
+        ifd[273] = tuple(i * rps * stride for i in range(len(blocks)))
+        ifd[278] = rps
+        ifd[279] = tuple(len(b) for b in blocks)
+        tags = (256, 257, 273, 278, 279)
+    for tag in tags:
+        ifd.tagtype[tag] = TiffTags.LONG
+    if tile:
+        # tobytes() corre StripOffsets al final del IFD, TileOffsets no
+        start = 8 + len(ifd.tobytes(8))
+        ifd[324] = tuple(start + o for o in ifd[324])
+    return b"II*\0" + (8).to_bytes(4, "little") + ifd.tobytes(8) + b"".join(blocks)
+
+
+def stacked(it) -> Image.Image:
+    return bands.vstack(list(it))
+
+
+def max_diff(a: Image.Image, b: Image.Image) -> int:
+    assert a.size == b.size and a.mode == b.mode
+    if a.mode in ("P", "1", "I;16"):
+        return 0 if a.tobytes() == b.tobytes() else 255
+    return max(hi for _, hi in ImageChops.difference(a, b).getextrema()) if len(a.getbands()) > 1 \
+        else ImageChops.difference(a, b).getextrema()[1]
+
+
+# ---- lectura ----
+@pytest.mark.parametrize("mode", ["L", "LA", "RGB", "RGBA", "P"])
+@pytest.mark.parametrize("height", [ROWS - 1, ROWS, 3 * ROWS + 1])
+def test_png_bands_match_full_decode(make_image, mode, height):
+    im = make_image(mode, (37, height))
+    data = png_bytes(im)
+    assert bands.png_streamable(data)
+    got = stacked(bands.png_bands(data, ROWS))
+    want = Image.open(BytesIO(data))
+    want.load()
+    assert got.mode == want.mode
+    assert got.tobytes() == want.tobytes()
+
+
+def test_png_bands_split_across_idat_chunks(make_image):
+    # muchos IDAT chicos: una franja empieza y termina en medio de un chunk
+    im = make_image("RGB", (41, 70))
+    from PIL import ImageFile
+    old = ImageFile.MAXBLOCK
+    ImageFile.MAXBLOCK = 97
+    try:
+        data = png_bytes(im, compress_level=1)
+    finally:
+        ImageFile.MAXBLOCK = old
+    assert stacked(bands.png_bands(data, ROWS)).tobytes() == im.tobytes()
+
+
+def test_png_16bit_falls_back(make_image):
+    im = make_image("L", (33, 50)).point(lambda v: v * 257, "I").convert("I;16")
+    data = png_bytes(im)
+    assert not bands.png_streamable(data)
+    src = Image.open(BytesIO(data))
+    got = stacked(bands.read_bands(src, data, ROWS))
+    assert got.size == im.size
+    assert got.tobytes() == Image.open(BytesIO(data)).tobytes()
+
+
+def test_png_interlaced_not_streamable(make_image):
+    # Pillow no escribe Adam7: alcanza con el flag del IHDR (png_streamable solo mira eso)
+    data = bytearray(png_bytes(make_image("RGB", (33, 50))))
+    data[28] = 1
+    assert not bands.png_streamable(bytes(data))
+
+
+@pytest.mark.parametrize("kw", [
+    {"compression": "raw"},
+    {"compression": "tiff_lzw", "strip_size": 700},
+    {"compression": "tiff_adobe_deflate", "strip_size": 1500},
+])
+@pytest.mark.parametrize("mode", ["L", "RGB", "RGBA"])
+def test_tiff_bands_match_full_decode(make_image, kw, mode):
+    im = make_image(mode, (29, 3 * ROWS + 5))
+    data = tiff_bytes(im, **kw)
+    src = Image.open(BytesIO(data))
+    assert bands.tiff_striped(src)
+    got = stacked(bands.tiff_bands(src, data, ROWS))
+    assert got.mode == im.mode
+    assert got.tobytes() == im.tobytes()
+
+
+@pytest.mark.parametrize("rps", [1, 5, ROWS, ROWS + 3])
+def test_tiff_raw_rows_span_strips(make_image, rps):
+    # sin compresión las franjas se arman con filas de varios strips
+    im = make_image("RGB", (23, 2 * ROWS + 7))
+    data = raw_tiff(im, rps=rps)
+    src = Image.open(BytesIO(data))
+    assert bands.tiff_striped(src)
+    assert stacked(bands.tiff_bands(src, data, ROWS)).tobytes() == im.tobytes()
+
+
+def test_tiff_tiled_falls_back(make_image):
+    im = make_image("RGB", (40, 37))
+    data = raw_tiff(im, tile=16)
+    src = Image.open(BytesIO(data))
+    assert not bands.tiff_striped(src)
+    assert stacked(bands.read_bands(src, data, ROWS)).tobytes() == im.tobytes()
+
+
+# ---- resize ----
+@pytest.mark.parametrize("mode", ["L", "RGB", "RGBA", "LA"])
+@pytest.mark.parametrize("src_size, size", [
+    ((120, 97), (50, 40)),      # reduce() x2 + LANCZOS
+    ((300, 203), (37, 25)),     # reduce() grande, alto de origen impar
+    ((64, 45), (64, 44)),       # casi 1:1, soporte chico
+    ((40, 31), (90, 70)),       # ampliar
+])
+def test_band_resizer_matches_resize(make_image, mode, src_size, size):
+    im = make_image(mode, src_size)
+    r = bands.BandResizer(im.size, size, mode, ROWS)
+    out = []
+    for y in range(0, im.height, ROWS):
+        out += list(r.feed(im.crop((0, y, im.width, min(im.height, y + ROWS)))))
+    out += list(r.finish())
+    got = bands.vstack(out)
+    want = im.resize(size, Image.LANCZOS, reducing_gap=bands.REDUCING_GAP)
+    assert got.size == want.size
+    assert max_diff(got, want) <= 2
+
+
+# ---- writers ----
+@pytest.mark.parametrize("mode", ["1", "L", "LA", "RGB", "RGBA", "P"])
+def test_png_band_writer_roundtrip(make_image, mode):
+    im = make_image("L", (35, 50)).convert("1") if mode == "1" else make_image(mode, (35, 50))
+    buf = BytesIO()
+    palette = bytes(im.getpalette()) if mode == "P" else None
+    w = bands.PngBandWriter(buf, im.size, mode, 6, palette=palette)
+    for y in range(0, im.height, ROWS):
+        w.write(im.crop((0, y, im.width, min(im.height, y + ROWS))))
+    w.close()
+    back = Image.open(BytesIO(buf.getvalue()))
+    back.load()
+    assert back.size == im.size
+    if mode == "P":
+        assert back.convert("RGB").tobytes() == im.convert("RGB").tobytes()
+    else:
+        assert back.mode == mode
+        assert back.tobytes() == im.tobytes()
+
+
+@pytest.mark.parametrize("mode", ["1", "L", "RGB", "RGBA", "CMYK"])
+def test_tiff_band_writer_roundtrip(make_image, mode, monkeypatch):
+    # strips chicos: el último queda incompleto
+    monkeypatch.setattr(bands, "_TIFF_STRIP_BYTES", 300)
+    im = make_image("L", (35, 53)).convert("1") if mode == "1" else make_image(mode, (35, 53))
+    buf = BytesIO()
+    w = bands.TiffBandWriter(buf, im.size, mode)
+    for y in range(0, im.height, ROWS):
+        w.write(im.crop((0, y, im.width, min(im.height, y + ROWS))))
+    w.close()
+    back = Image.open(BytesIO(buf.getvalue()))
+    back.load()
+    assert back.mode == mode
+    assert back.tobytes() == im.tobytes()
+
+
+# ---- pipeline entero: convert_image por franjas vs. el camino de siempre ----
+def convert_both(monkeypatch, data: bytes, ext: str, target: str, resize=None):
+    monkeypatch.setattr(image_engine, "BAND_BYTES", 4 * 40 * ROWS)   # franjas de ~ROWS filas
+    monkeypatch.setattr(image_engine, "BAND_MIN_PIXELS", 1)
+    calls = []
+    real = image_engine.convert_image_bands
+    monkeypatch.setattr(image_engine, "convert_image_bands", lambda *a, **k: calls.append(1) or real(*a, **k))
+    banded, _ = image_engine.convert_image(data, ext, target, 90, resize)
+    assert calls, "no pasó por convert_image_bands"
+    monkeypatch.setattr(image_engine, "BAND_MIN_PIXELS", 10 ** 12)
+    whole, _ = image_engine.convert_image(data, ext, target, 90, resize)
+    return Image.open(BytesIO(banded)), Image.open(BytesIO(whole))
+
+
+@pytest.mark.parametrize("src_fmt", ["png", "tiff"])
+@pytest.mark.parametrize("target", ["png", "tiff", "jpg"])
+@pytest.mark.parametrize("resize", [None, (23, 0)])
+def test_convert_image_bands_matches_whole(make_image, monkeypatch, src_fmt, target, resize):
+    im = make_image("RGBA", (40, 3 * ROWS + 3))
+    data = png_bytes(im) if src_fmt == "png" else tiff_bytes(im, compression="tiff_lzw", strip_size=500)
+    banded, whole = convert_both(monkeypatch, data, "." + src_fmt, target, resize)
+    assert banded.size == whole.size and banded.mode == whole.mode
+    # sin resize lo sin pérdida tiene que ser idéntico; con resize, redondeo en las costuras
+    # (y JPEG amplifica cualquier diferencia de un nivel)
+    tol = (0 if resize is None else 2) if target != "jpg" else 6
+    assert max_diff(banded.convert(whole.mode), whole) <= tol
+
+
+def test_convert_image_bands_palette_png(make_image, monkeypatch):
+    im = make_image("P", (40, 3 * ROWS + 3))
+    banded, whole = convert_both(monkeypatch, png_bytes(im, transparency=0), ".png", "png")
+    assert banded.convert("RGBA").tobytes() == whole.convert("RGBA").tobytes()
@@ -0,0 +1,80 @@
+# test_frames.py
+"""
+Animaciones y TIFF multipágina (convert_frames): todos los frames llegan, con
+su tamaño y duración, y se encodean de a uno. Lo de WEBP fija el contrato de
+append_images del que depende _FrameSequence (ver image_engine.py).
+"""
+import gc
+import weakref
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageSequence
+
+from engines import image_engine
+
+COLORS = [(255, 0, 0), (0, 160, 0), (0, 0, 255), (240, 240, 0), (0, 200, 200)]
+
+
+def save(frames, fmt: str, **kw) -> bytes:
+    buf = BytesIO()
+    frames[0].save(buf, format=fmt, save_all=True, append_images=frames[1:], **kw)
+    return buf.getvalue()
+
+
+def read_frames(data: bytes):
+    im = Image.open(BytesIO(data))
+    out = []
+    for f in ImageSequence.Iterator(im):
+        px = f.convert("RGB").getpixel((2, 2))      # WEBP llena info["duration"] al cargar
+        out.append((f.size, f.info.get("duration"), px))
+    return out
+
+
+def close(a, b, tol=12):
+    return all(abs(x - y) <= tol for x, y in zip(a, b))
+
+
+def test_gif_to_webp_keeps_frames_and_durations():
+    frames = [Image.new("RGB", (24, 16), c) for c in COLORS]
+    data = save(frames, "GIF", duration=[40, 80, 120, 160, 200], loop=0)
+    out, mime = image_engine.convert_image(data, ".gif", "webp", quality=90)
+    assert mime == "image/webp"
+    got = read_frames(out)
+    assert [d for _, d, _ in got] == [40, 80, 120, 160, 200]
+    assert all(close(px, c) for (_, _, px), c in zip(got, COLORS))
+
+
+def test_tiff_pages_keep_their_size():
+    frames = [Image.new("RGB", (20 + 5 * i, 10 + 3 * i), c) for i, c in enumerate(COLORS)]
+    out, _ = image_engine.convert_image(save(frames, "TIFF"), ".tiff", "tiff", strip=True)
+    got = read_frames(out)
+    assert [size for size, _, _ in got] == [f.size for f in frames]
+    assert [px for _, _, px in got] == COLORS
+
+
+def test_tiff_to_gif_all_pages():
+    frames = [Image.new("RGB", (20, 10), c) for c in COLORS]
+    out, _ = image_engine.convert_image(save(frames, "TIFF"), ".tiff", "gif")
+    assert len(read_frames(out)) == len(COLORS)
+
+
+@pytest.mark.parametrize("target", ["webp", "tiff", "gif"])
+def test_frames_are_encoded_one_at_a_time(monkeypatch, target):
+    alive = []
+
+    def iter_frames(im, resize=None, max_pixels=None, max_frames=None):
+        for i, c in enumerate(COLORS):
+            gc.collect()
+            # el writer ya soltó los anteriores (el 0 lo tiene convert_frames,
+            # el anterior a este puede seguir en la variable del generador)
+            assert not [k for k, ref in enumerate(alive[1:i - 1], 1) if ref() is not None]
+            frame = Image.new("RGB", (24, 16), c)
+            alive.append(weakref.ref(frame))
+            yield frame, 50
+
+    monkeypatch.setattr(image_engine, "iter_frames", iter_frames)
+    src = Image.open(BytesIO(save([Image.new("RGB", (24, 16), c) for c in COLORS], "GIF")))
+    out = image_engine.convert_frames(src, target)
+    assert len(alive) == len(COLORS)
+    assert len(read_frames(out)) == len(COLORS)
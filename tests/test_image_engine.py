@@ -0,0 +1,97 @@
+# test_image_engine.py
+"""
+_prepare y los encodes en paralelo de image_engine: la imagen que sale de
+_prepare es propia (no la del archivo) y ningún encode ve lo que escribe otro.
+"""
+from io import BytesIO
+
+import pytest
+from PIL import Image, TiffImagePlugin
+
+from engines import image_engine
+
+
+def save(im: Image.Image, fmt: str, **kw) -> bytes:
+    buf = BytesIO()
+    im.save(buf, format=fmt, **kw)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("resize", [None, (20, 0), (200, 0)])
+def test_prepare_detaches_from_file(make_image, resize):
+    src = Image.open(BytesIO(save(make_image("RGB", (40, 30)), "PNG")))
+    px = image_engine._prepare(src, resize)
+    assert px is not src and type(px) is Image.Image
+    src.close()
+    px.getpixel((0, 0))       # sigue viva con el archivo cerrado
+
+
+@pytest.mark.parametrize("orientation", range(1, 9))
+def test_prepare_exif_orientation(make_image, orientation):
+    im = make_image("RGB", (40, 30))
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    data = save(im, "JPEG", quality=95, exif=exif.tobytes())
+    px = image_engine._prepare(Image.open(BytesIO(data)), None)
+    want = (30, 40) if orientation >= 5 else (40, 30)
+    assert px.size == want
+    # la orientación ya está aplicada: no puede quedar en el EXIF de la salida
+    assert px.getexif().get(0x0112, 1) == 1
+
+
+def test_tiff_strip_drops_source_tags(make_image):
+    info = TiffImagePlugin.ImageFileDirectory_v2()
+    info[700] = b"<x:xmpmeta/>"                # XMP: el writer lo copia del IFD del archivo
+    data = save(make_image("RGB", (40, 30)), "TIFF", tiffinfo=info)
+    assert 700 in Image.open(BytesIO(data)).tag_v2
+    out, _ = image_engine.convert_image(data, ".tiff", "tiff", strip=True)
+    assert 700 not in Image.open(BytesIO(out)).tag_v2
+
+
+def test_variants_same_size_are_independent(make_image):
+    im = make_image("RGBA", (60, 40))
+    specs = [("png", None, None), ("webp", None, 80), ("jpg", None, 80), ("png", (30, 0), None)]
+    out = image_engine.convert_image_many(save(im, "PNG"), ".png", specs, strip=False)
+    assert [size for _, _, size in out] == [(60, 40), (60, 40), (60, 40), (30, 20)]
+    # los tres de 60x40 salen del mismo decode: el PNG conserva el alfa
+    # aunque el WEBP y el JPG se aplanen
+    assert [Image.open(BytesIO(data)).mode for data, _, _ in out] == ["RGBA", "RGB", "RGB", "RGBA"]
+
+
+@pytest.mark.parametrize("threads", [1, 3])
+def test_fit_search_matches_serial_encode(make_image, threads):
+    im = make_image("RGB", (120, 90))
+    data = save(im, "PNG")
+    full = len(image_engine.convert_image(data, ".png", "jpg", quality=90)[0])
+    out, _, fit = image_engine.convert_image_fit(data, ".png", "jpg", full * 2 // 3, quality=90,
+                                                 threads=threads)
+    assert len(out) <= full * 2 // 3 and not fit.scaled
+    # los encodes de prueba en paralelo no se pisan: la elegida es la misma que un encode suelto
+    assert out == image_engine.convert_image(data, ".png", "jpg", quality=fit.quality)[0]
+
+
+def test_jpeg_passthrough_only_when_nothing_changes(make_image):
+    exif = Image.Exif()
+    exif[0x010F] = "cámara"
+    data = save(make_image("RGB", (40, 30)), "JPEG", quality=80, exif=exif.tobytes())
+    out = image_engine.jpeg_passthrough(data, "jpg", 95, None, strip=True)
+    assert out is not None and out.endswith(data[data.index(b"\xff\xda"):])
+    assert 0x010F not in Image.open(BytesIO(out)).getexif()
+    # lo mismo que devuelve convert_image, sin importar el perfil
+    assert image_engine.convert_image(data, ".jpg", "jpg", 95, strip=True, profile="max")[0] == out
+    for args in [("jpg", 95, None, False), ("jpg", 80, None, True), ("jpg", 95, (20, 0), True),
+                 ("webp", 95, None, True)]:
+        assert image_engine.jpeg_passthrough(data, *args) is None
+
+
+def test_jpeg_passthrough_header(fresh_cache):
+    main = pytest.importorskip("main")
+    from fastapi.testclient import TestClient
+
+    data = save(Image.effect_noise((37, 23), 50).convert("RGB"), "JPEG", quality=85)
+    client = TestClient(main.app)
+    for cache in ("MISS", "HIT"):
+        r = client.post("/api/convert", data={"target": "jpg", "quality": "95", "profile": "max"},
+                        files={"file": ("foto.jpg", data, "image/jpeg")})
+        assert r.status_code == 200
+        assert (r.headers["X-Cache"], r.headers["X-Passthrough"]) == (cache, "1")
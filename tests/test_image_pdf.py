@@ -0,0 +1,157 @@
+# test_image_pdf.py
+"""
+Imágenes -> PDF (engines/pdf_writer.py y image_to_pdf / images_to_pdf en
+image_engine): cada PDF se vuelve a abrir con PyMuPDF y se compara página por
+página (tamaño y píxeles renderizados) con la imagen de origen.
+"""
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageChops, ImageStat
+
+from engines import image_engine
+from engines.pdf_writer import ImageStream, PdfWriter
+
+fitz = pytest.importorskip("fitz")
+
+
+def save(im: Image.Image, fmt: str, **kw) -> bytes:
+    buf = BytesIO()
+    im.save(buf, format=fmt, **kw)
+    return buf.getvalue()
+
+
+def pages(pdf: bytes):
+    """[(ancho pt, alto pt, render RGB a 72 dpi)] de cada página."""
+    out = []
+    with fitz.open(stream=pdf, filetype="pdf") as doc:
+        for page in doc:
+            pix = page.get_pixmap(alpha=False)
+            out.append((page.rect.width, page.rect.height,
+                        Image.frombytes("RGB", (pix.width, pix.height), pix.samples)))
+    return out
+
+
+def mean_diff(a: Image.Image, b: Image.Image) -> float:
+    assert a.size == b.size
+    return max(ImageStat.Stat(ImageChops.difference(a.convert("RGB"), b.convert("RGB"))).mean)
+
+
+def on_white(im: Image.Image) -> Image.Image:
+    bg = Image.new("RGB", im.size, "white")
+    bg.paste(im, mask=im.getchannel("A"))
+    return bg
+
+
+def smooth(mode: str, size) -> Image.Image:
+    """Degradé: el ruido de make_image no sobrevive igual a dos decoders de JPEG."""
+    r = Image.linear_gradient("L").resize(size)
+    g = r.transpose(Image.Transpose.ROTATE_90).resize(size)
+    return Image.merge("RGB", (r, g, Image.new("L", size, 128))).convert(mode)
+
+
+def one_page(pdf: bytes, size):
+    (w, h, px), = pages(pdf)
+    assert (round(w), round(h)) == size
+    return px
+
+
+def test_jpeg_passthrough():
+    im = smooth("RGB", (64, 48))
+    data = save(im, "JPEG", quality=90)
+    stream = image_engine._pdf_image_stream(data)
+    assert stream.filter == "DCTDecode" and stream.colorspace == "DeviceRGB"
+    px = one_page(image_engine.image_to_pdf(data), im.size)
+    assert mean_diff(px, Image.open(BytesIO(data))) < 2
+
+
+def test_gray_jpeg_passthrough():
+    im = smooth("L", (40, 30))
+    data = save(im, "JPEG", quality=90)
+    assert image_engine._pdf_image_stream(data).colorspace == "DeviceGray"
+    px = one_page(image_engine.image_to_pdf(data), im.size)
+    assert mean_diff(px, Image.open(BytesIO(data))) < 2
+
+
+def test_cmyk_jpeg_is_decoded():
+    # CMYK de Adobe suele venir invertido: se decodifica y se re-encodea en RGB
+    im = smooth("CMYK", (48, 40))
+    data = save(im, "JPEG", quality=95)
+    stream = image_engine._pdf_image_stream(data)
+    assert stream.colorspace == "DeviceRGB"
+    px = one_page(image_engine.image_to_pdf(data), im.size)
+    assert mean_diff(px, Image.open(BytesIO(data)).convert("RGB")) < 4
+
+
+def test_rgba_png_flattened_on_white(make_image):
+    im = make_image("RGBA", (50, 37))
+    px = one_page(image_engine.image_to_pdf(save(im, "PNG")), im.size)
+    assert mean_diff(px, on_white(im)) < 1
+
+
+@pytest.mark.parametrize("mode", ["RGB", "L", "P"])
+def test_png_passthrough_lossless(make_image, mode):
+    im = make_image(mode, (45, 33))
+    data = save(im, "PNG")
+    stream = image_engine._pdf_image_stream(data)
+    assert stream.filter == "FlateDecode" and "/Predictor 15" in stream.decode_parms
+    if mode == "P":
+        assert stream.colorspace.startswith("[/Indexed")
+    px = one_page(image_engine.image_to_pdf(data), im.size)
+    assert mean_diff(px, im.convert("RGB")) == 0
+
+
+def test_png_16bit_is_decoded(make_image):
+    # 16 bits no entra en un /FlateDecode de 8: se decodifica y se baja a 8 bits
+    # (sin escalar, convert() recortaba todo a blanco)
+    im = make_image("L", (30, 20))
+    gray16 = im.point(lambda v: v * 257, "I").convert("I;16")
+    data = save(gray16, "PNG")
+    assert image_engine._png_image_stream(data) is None
+    px = one_page(image_engine.image_to_pdf(data), im.size)
+    assert mean_diff(px, im) < 1
+
+
+def test_images_to_pdf_pages(make_image, tmp_path):
+    srcs, want = [], []
+    for i, (mode, fmt, size) in enumerate([("RGB", "JPEG", (64, 48)), ("RGBA", "PNG", (30, 50)),
+                                           ("P", "PNG", (41, 41)), ("RGB", "BMP", (20, 10))]):
+        im = make_image(mode, size)
+        path = tmp_path / f"in{i}.{fmt.lower()}"
+        path.write_bytes(save(im, fmt))
+        srcs.append(str(path))
+        want.append(size)
+    out = image_engine.images_to_pdf(srcs, str(tmp_path / "out.pdf"))
+    got = pages(open(out, "rb").read())
+    assert [(round(w), round(h)) for w, h, _ in got] == want
+
+
+def test_multiframe_tiff_one_page_per_frame(make_image):
+    frames = [make_image("RGB", (30, 20)), make_image("L", (30, 20)).convert("RGB")]
+    data = save(frames[0], "TIFF", save_all=True, append_images=frames[1:])
+    got = pages(image_engine.image_to_pdf(data))
+    assert len(got) == 2
+    for (_, _, px), im in zip(got, frames):
+        assert mean_diff(px, im) == 0
+
+
+def test_writer_layout_and_dpi():
+    buf = BytesIO()
+    w = PdfWriter(buf)
+    im = Image.new("RGB", (144, 72), (200, 10, 30))
+    stream = image_engine._png_image_stream(save(im, "PNG"))
+    w.add_image_page(stream)
+    w.add_image_page(stream, dpi=144)
+    assert w.page_count == 2
+    w.close()
+    (w1, h1, px), (w2, h2, _) = pages(buf.getvalue())
+    assert (w1, h1) == (144, 72) and (w2, h2) == (72, 36)
+    assert px.getpixel((10, 10)) == (200, 10, 30)
+    with fitz.open(stream=buf.getvalue(), filetype="pdf") as doc:
+        # xref válida: PyMuPDF no tuvo que reparar el archivo
+        assert not doc.is_repaired
+
+
+def test_writer_without_pages_fails():
+    with pytest.raises(ValueError):
+        PdfWriter(BytesIO()).close()
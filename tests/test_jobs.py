@@ -0,0 +1,182 @@
+# test_jobs.py
+"""
+services/jobs.py: la máquina de estados de JobStore (claim, lease, reintentos,
+vencimiento) sobre una base y un Storage en tmp_path, con el reloj a mano.
+"""
+import asyncio
+import os
+
+import pytest
+
+from services import jobs
+from services.jobs import LEASE_SECS, MAX_ATTEMPTS, JobRetry, JobRunner, JobsFull, JobStore
+from services.storage import Storage
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(jobs, "time", c)
+    return c
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(str(tmp_path / "store"), quota_bytes=10 << 20, max_age=0, ram_quota_bytes=0)
+
+
+def new_store(tmp_path, storage, **kw) -> JobStore:
+    return JobStore(str(tmp_path / "async"), storage, ttl=kw.pop("ttl", 100), **kw)
+
+
+def submit(store: JobStore, kind: str = "pdf") -> str:
+    jd = store.prepare(expected_bytes=3)
+    with open(jd.file("in0"), "wb") as f:
+        f.write(b"abc")
+    return store.submit(jd, kind, {"q": 1}, [{"name": "in0", "filename": "a.png"}]).id
+
+
+def test_claim_runs_oldest_first_and_only_once(tmp_path, storage, clock):
+    store = new_store(tmp_path, storage)
+    first = submit(store)
+    clock.now += 1
+    second = submit(store)
+    job = store.claim("a")
+    assert (job.id, job.state, job.attempts) == (first, "running", 1)
+    assert store.claim("b").id == second
+    assert store.claim("c") is None
+    assert store.pending() == 2
+
+
+def test_finish_keeps_only_the_result(tmp_path, storage, clock):
+    store = new_store(tmp_path, storage)
+    submit(store)
+    job = store.claim("a")
+    with open(job.file("out.pdf"), "wb") as f:
+        f.write(b"%PDF")
+    store.finish(job.id, job.file("out.pdf"), "application/pdf", "a.pdf")
+    done = store.get(job.id)
+    assert (done.state, done.result, done.expires) == ("done", "out.pdf", clock.now + 100)
+    assert os.listdir(done.path) == ["out.pdf"]
+    assert store.pending() == 0
+
+
+def test_expired_lease_is_reclaimed(tmp_path, storage, clock):
+    store = new_store(tmp_path, storage)
+    job_id = submit(store)
+    assert store.claim("a").id == job_id
+    clock.now += LEASE_SECS - 1
+    store.heartbeat("a")                 # el runner vivo lo renueva
+    clock.now += LEASE_SECS - 1
+    assert store.claim("b") is None
+    clock.now += 2                       # "a" se murió: nadie renovó
+    job = store.claim("b")
+    assert (job.id, job.attempts) == (job_id, 2)
+
+
+def test_gives_up_after_max_attempts(tmp_path, storage, clock):
+    store = new_store(tmp_path, storage)
+    job_id = submit(store)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        assert store.claim(f"w{attempt}").attempts == attempt
+        clock.now += LEASE_SECS + 1
+    assert store.claim("last") is None
+    job = store.get(job_id)
+    assert job.state == "error" and job.error
+    assert job.expires == clock.now + 100
+    assert os.listdir(job.path) == []    # sin uploads: no se van a volver a leer
+
+
+def test_release_and_retry_delay(tmp_path, storage, clock):
+    store = new_store(tmp_path, storage)
+    job_id = submit(store)
+    store.claim("a")
+    # pool lleno (JobRetry): vuelve a la cola sin gastar un intento
+    store.release(job_id, delay=5)
+    assert store.get(job_id).state == "queued"
+    assert store.claim("a") is None
+    clock.now += 5
+    job = store.claim("a")
+    assert (job.id, job.attempts) == (job_id, 1)
+    store.release(job_id, count_attempt=True)
+    assert store.claim("a").attempts == 2
+
+
+def test_restart_recovers_running_job(tmp_path, storage, clock):
+    store = new_store(tmp_path, storage)
+    job_id = submit(store)
+    store.claim("old-worker")
+    # otro proceso con otra conexión sobre la misma base
+    again = new_store(tmp_path, Storage(str(tmp_path / "store"), quota_bytes=10 << 20, ram_quota_bytes=0))
+    assert again.claim("new-worker") is None
+    clock.now += LEASE_SECS + 1
+    job = again.claim("new-worker")
+    assert job.id == job_id
+    with open(job.file("in0"), "rb") as f:
+        assert f.read() == b"abc"
+
+
+def test_ttl_sweep_removes_row_and_dir(tmp_path, storage, clock):
+    store = new_store(tmp_path, storage)
+    job_id = submit(store)
+    store.fail(store.claim("a").id, "roto")
+    path = store.get(job_id).path
+    # mientras tiene fila, el janitor de Storage no lo toca (max_age=0)
+    storage.sweep()
+    assert os.path.isdir(path)
+    clock.now += 100
+    assert store.sweep() == 0
+    clock.now += 1
+    assert store.sweep() == 1
+    assert store.get(job_id) is None and not os.path.exists(path)
+
+
+def test_queue_limit(tmp_path, storage, clock):
+    store = new_store(tmp_path, storage, max_queued=2)
+    submit(store)
+    submit(store)
+    with pytest.raises(JobsFull):
+        store.prepare()
+    store.fail(store.claim("a").id, "roto")
+    store.prepare().cleanup()
+
+
+def test_runner_outcomes(tmp_path, storage):
+    store = new_store(tmp_path, storage)
+    ok, bad, retry = submit(store, "ok"), submit(store, "bad"), submit(store, "retry")
+    retried = []
+
+    async def handler(job, progress):
+        await progress(1, 2)
+        if job.kind == "bad":
+            raise ValueError("no")
+        if job.kind == "retry" and not retried:
+            retried.append(job.id)
+            raise JobRetry(0)
+        out = job.file("out.txt")
+        with open(out, "w") as f:
+            f.write(job.kind)
+        return out, "text/plain", f"{job.kind}.txt"
+
+    async def run():
+        runner = JobRunner(store, handler, concurrency=2, poll=0.01)
+        runner.start()
+        for _ in range(500):
+            if store.pending() == 0:
+                break
+            await asyncio.sleep(0.01)
+        await runner.stop()
+
+    asyncio.run(run())
+    assert store.get(ok).state == "done" and store.get(ok).done == 2
+    assert store.get(bad).state == "error"
+    job = store.get(retry)
+    assert (job.state, job.attempts, retried) == ("done", 1, [retry])
@@ -0,0 +1,46 @@
+# test_metrics.py
+"""
+/metrics: solo con ZC_METRICS_TOKEN; sin token configurado o con otro, 404
+como cualquier ruta que no existe.
+"""
+import pytest
+
+main = pytest.importorskip("main")
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def test_not_configured_is_404(client, monkeypatch):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "")
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 404
+
+
+@pytest.mark.parametrize("headers, params", [
+    ({}, {}),
+    ({"Authorization": "Bearer otro"}, {}),
+    ({}, {"token": "otro"}),
+    ({"Authorization": "Basic secreto"}, {}),
+])
+def test_wrong_token_is_404(client, monkeypatch, headers, params):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "secreto")
+    r = client.get("/metrics", headers=headers, params=params)
+    assert r.status_code == 404
+    assert r.json() == client.get("/no-existe").json()
+
+
+@pytest.mark.parametrize("headers, params", [
+    ({"Authorization": "Bearer secreto"}, {}),
+    ({"Authorization": "bearer secreto"}, {}),
+    ({}, {"token": "secreto"}),
+])
+def test_token_gets_metrics(client, monkeypatch, headers, params):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "secreto")
+    r = client.get("/metrics", headers=headers, params=params)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert "# TYPE zc_stage_seconds histogram" in r.text
@@ -0,0 +1,105 @@
+# test_ratelimit.py
+"""
+services/ratelimit.py: los dos backends con el mismo reloj a mano (`now`),
+y el 429 que arma el middleware de main.py.
+"""
+import pytest
+
+from services.ratelimit import Budget, MemoryBackend, RateLimiter, SQLiteBackend
+
+B = Budget(per_min=60, burst=3)     # una ficha por segundo, hasta 3
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / "rl" / "buckets.sqlite3"))
+
+
+def test_burst_then_deny(backend):
+    assert [backend.take("a", B, now=100).allowed for _ in range(3)] == [True] * 3
+    d = backend.take("a", B, now=100)
+    assert not d.allowed and d.retry_after == 1
+
+
+def test_retry_after_rounds_up(backend):
+    slow = Budget(per_min=6, burst=1)   # una ficha cada 10 s
+    assert backend.take("a", slow, now=0).allowed
+    assert backend.take("a", slow, now=2.5).retry_after == 8
+    # el rechazo no gasta: a los 10 s del primero ya hay ficha
+    assert not backend.take("a", slow, now=9.9).allowed
+    assert backend.take("a", slow, now=10).allowed
+
+
+def test_refill_is_capped_at_burst(backend):
+    for _ in range(3):
+        backend.take("a", B, now=0)
+    assert backend.take("a", B, now=1).allowed          # rellenó una
+    assert not backend.take("a", B, now=1).allowed
+    # quieto mucho más que burst / rate: vuelve a `burst`, no a más
+    assert [backend.take("a", B, now=1000).allowed for _ in range(4)] == [True] * 3 + [False]
+
+
+def test_clients_and_budgets_are_separate(backend):
+    other = Budget(per_min=60, burst=1)
+    for _ in range(3):
+        backend.take("heavy:a", B, now=0)
+    assert not backend.take("heavy:a", B, now=0).allowed
+    assert backend.take("heavy:b", B, now=0).allowed
+    assert backend.take("cheap:a", other, now=0).allowed
+
+
+def test_limiter_keys_by_budget_and_disabled_budget():
+    rl = RateLimiter(MemoryBackend(), {"heavy": Budget(60, 1), "cheap": Budget(60, 1),
+                                       "off": Budget(0, 1)})
+    assert rl.check("heavy", "1.2.3.4").allowed
+    assert not rl.check("heavy", "1.2.3.4").allowed
+    assert rl.check("cheap", "1.2.3.4").allowed
+    assert all(rl.check("off", "1.2.3.4").allowed for _ in range(5))
+
+
+def test_memory_backend_drops_full_buckets():
+    mem = MemoryBackend()
+    mem.take("a", B, now=0)
+    mem.take("b", B, now=1)
+    assert len(mem) == 2
+    # pasado el ttl (3 s) "a" ya estaría lleno: se borra sin cambiar nada
+    mem.take("c", B, now=3.5)
+    assert len(mem) == 2
+    assert [mem.take("a", B, now=3.5).allowed for _ in range(4)] == [True] * 3 + [False]
+
+
+def test_memory_backend_key_cap():
+    mem = MemoryBackend(max_keys=2)
+    for i, key in enumerate("abcd"):
+        mem.take(key, B, now=i * 0.01)
+    assert len(mem) == 2
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "buckets.sqlite3")
+    one, two = SQLiteBackend(path), SQLiteBackend(path)
+    for _ in range(3):
+        assert one.take("a", B, now=0).allowed
+    assert not two.take("a", B, now=0).allowed
+
+
+def test_429_headers(monkeypatch):
+    main = pytest.importorskip("main")
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(main, "rate_limiter", RateLimiter(
+        MemoryBackend(), {"heavy": Budget(6, 1), "cheap": Budget(6, 1)}))
+    client = TestClient(main.app)
+    hdrs = {"Origin": "https://example.com"}
+    assert client.get("/no-existe", headers=hdrs).status_code == 404
+    r = client.get("/no-existe", headers=hdrs)
+    assert r.status_code == 429
+    assert r.headers["Retry-After"] == "10"
+    # el 429 sale por adentro de CORS y de los headers de seguridad
+    assert r.headers["Access-Control-Allow-Origin"] == "*"
+    assert r.headers["X-Content-Type-Options"] == "nosniff"
+    # otro presupuesto, otro balde; /healthz no gasta
+    assert client.post("/api/no-existe").status_code != 429
+    assert all(client.get("/healthz").status_code == 200 for _ in range(3))
@@ -0,0 +1,54 @@
+# test_variants.py
+"""
+/api/variants de punta a punta (con el pool del scheduler): el ZIP sale en
+streaming y queda en el caché igual que el JSON.
+"""
+import json
+import zipfile
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+main = pytest.importorskip("main")
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as c:
+        yield c
+
+
+def upload(im: Image.Image) -> dict:
+    buf = BytesIO()
+    im.save(buf, "PNG")
+    return {"file": ("foto.png", buf.getvalue(), "image/png")}
+
+
+OUTPUTS = json.dumps([{"target": "webp", "width": 40}, {"target": "png", "width": 40},
+                      {"target": "jpg", "quality": 80}, {"target": "webp", "width": 40}])
+
+
+def test_zip_streams_and_caches(client, fresh_cache, make_image):
+    files = upload(make_image("RGB", (80, 60)))
+    got = []
+    for cache in ("MISS", "HIT"):
+        r = client.post("/api/variants", data={"outputs": OUTPUTS}, files=files)
+        assert r.status_code == 200 and r.headers["X-Cache"] == cache
+        assert r.headers["content-type"] == "application/zip"
+        with zipfile.ZipFile(BytesIO(r.content)) as zf:
+            assert zf.testzip() is None
+            got.append({n: zf.read(n) for n in zf.namelist()})
+    assert got[0] == got[1]
+    assert list(got[0]) == ["foto-40x30.webp", "foto-40x30.png", "foto.jpg", "foto-40x30 (2).webp"]
+    assert Image.open(BytesIO(got[0]["foto.jpg"])).size == (80, 60)
+
+
+def test_json_manifest(client, fresh_cache, make_image):
+    r = client.post("/api/variants", data={"outputs": OUTPUTS, "format": "json"},
+                    files=upload(make_image("RGB", (80, 60))))
+    assert r.status_code == 200
+    items = r.json()["items"]
+    assert [(i["name"], i["width"], i["height"]) for i in items][:3] == [
+        ("foto-40x30.webp", 40, 30), ("foto-40x30.png", 40, 30), ("foto.jpg", 80, 60)]